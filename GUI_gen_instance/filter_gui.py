@@ -1,6 +1,7 @@
 from typing import Any, Tuple
 import customtkinter as ctk
 from CTkScrollableDropdown import CTkScrollableDropdown
+from definitions import COST_FILTERS
 
 class ArchitectureFilterFrame(ctk.CTkFrame):
     '''Frame that contains the architecture filter widgets, there are three checkboxes for the architectures: 'fullyconnected', 'convolutional', 'residual' '''
@@ -45,16 +46,18 @@ class ArchitectureFilterFrame(ctk.CTkFrame):
         self.residualCheckbox.grid(row=1, column=2, pady=(0,5), padx = 4, sticky="w")
 
 class ParamsFilterFrame(ctk.CTkFrame):
-    '''Frame that contains the parameters filter widgets, there are two entry widgets for the minimum and maximum number of parameters, and a button to apply the filter'''
+    '''Frame that contains the parameters filter widgets, there are two entry widgets for the minimum and maximum number of parameters,
+    and two for the minimum and maximum of each cost column (input and output dimension, nonlinear neurons, MACs and depth), empty for no bound'''
     def __init__(self, master, *args, **kwargs):
         ctk.CTkFrame.__init__(self, master, *args, **kwargs, border_color="#000000", border_width=2)
-        # Configure the frame to handle 4 columns with equal weight and 2 rows with equal weight
+        # Configure the frame to handle 4 columns with equal weight and 2 rows with equal weight for each filter
         self.configure(width=self.winfo_toplevel().winfo_width())
         self.grid_columnconfigure((0, 1, 2, 3), weight=2)
-        self.grid_rowconfigure((0, 1), weight=1)
+        self.grid_rowconfigure(tuple(range(2 * (len(COST_FILTERS) + 1))), weight=1)
         # Variables to store the values of the entry widgets
         self.minParams = ctk.StringVar(value='0')
         self.maxParams = ctk.StringVar(value=f'{int(1e10)}')
+        self.costBounds = {suffix: (ctk.StringVar(value=''), ctk.StringVar(value='')) for suffix in COST_FILTERS}
         self.after_id = None
         self.createWidgets()
 
@@ -62,12 +65,15 @@ class ParamsFilterFrame(ctk.CTkFrame):
         try:
             old_min = self.winfo_toplevel().logic_instance.min_params
             old_max = self.winfo_toplevel().logic_instance.max_params
+            old_cost_bounds = self.winfo_toplevel().logic_instance.cost_bounds
             new_min = int(self.minParams.get())
             new_max = int(self.maxParams.get())
-            if new_min != old_min or new_max != old_max:
-                print(f"Applying params filter button clicked min: {self.minParams.get()} max: {self.maxParams.get()}")
-                self.winfo_toplevel().logic_instance.min_params = int(self.minParams.get())
-                self.winfo_toplevel().logic_instance.max_params = int(self.maxParams.get())
+            new_cost_bounds = {suffix: tuple(int(bound.get()) if bound.get().strip() else -1 for bound in bounds) for suffix, bounds in self.costBounds.items()}
+            if new_min != old_min or new_max != old_max or new_cost_bounds != old_cost_bounds:
+                print(f"Applying params filter button clicked min: {self.minParams.get()} max: {self.maxParams.get()} cost bounds: {new_cost_bounds}")
+                self.winfo_toplevel().logic_instance.min_params = new_min
+                self.winfo_toplevel().logic_instance.max_params = new_max
+                self.winfo_toplevel().logic_instance.cost_bounds = new_cost_bounds
                 self.winfo_toplevel().mainFrame.benchmarkScrollFrame.updateTabview()
             else:
                 print("No changes in the params filter")
@@ -99,6 +105,16 @@ class ParamsFilterFrame(ctk.CTkFrame):
         self.maxParamsEntry = ctk.CTkEntry(self, width=50, textvariable=self.maxParams)
         self.maxParamsEntry.bind('<Key>',self.applyParamsFilter)
         self.maxParamsEntry.grid(row=1, column=3, pady=2, padx=5, sticky="nsew")
+        # Minimum and maximum widgets of each cost column, two rows each:
+        for i, (suffix, text) in enumerate(COST_FILTERS.items(), start=1):
+            label = ctk.CTkLabel(self, text=text, font=("Arial", 14, "bold"))
+            label.grid(row=2 * i, column=0, columnspan = 4, pady=2, padx=2, sticky="nsew")
+            for j, (bound_text, bound) in enumerate(zip(["Min:", "Max:"], self.costBounds[suffix])):
+                bound_label = ctk.CTkLabel(self, text=bound_text)
+                bound_label.grid(row=2 * i + 1, column=2 * j, pady=2, padx=2, sticky="nsew")
+                bound_entry = ctk.CTkEntry(self, width=50, textvariable=bound)
+                bound_entry.bind('<Key>',self.applyParamsFilter)
+                bound_entry.grid(row=2 * i + 1, column=2 * j + 1, pady=2, padx=5, sticky="nsew")
 
 class ListNodesScrollFrame(ctk.CTkScrollableFrame):
     def __init__(self, master, is_include:bool, possible_nodes:list, *args, **kwargs):
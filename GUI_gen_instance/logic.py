@@ -1,4 +1,5 @@
 from definitions import *
+from query import BenchmarkCatalog # Importable once definitions added the repository root to the path
 
 class logic():
     '''
@@ -20,7 +21,8 @@ class logic():
         self.path_to_dataset = path_to_input_dataset
         self.path_to_input_instances = path_to_input_instances
         self.path_to_output_instances = path_to_output_instances
-        self.dataframe = load_nns_dataframe(self.path_to_dataset)
+        self.session = BenchmarkCatalog.load(nns_path=self.path_to_dataset)
+        self.filtered_networks = self.session.networks
         self.all_nodes = get_nodes_types()
 
         self.calculated_instances = []
@@ -30,6 +32,7 @@ class logic():
         self.incuded_benchmarks = sorted(self.possible_origins)
         self.max_params = -1
         self.min_params = -1
+        self.cost_bounds = {suffix: (-1, -1) for suffix in COST_FILTERS} # (min, max) of each cost column, -1 means no bound
     
     def reset_options(self):
         self.path_to_dataset = NEURAL_NETWORKS_FILE
@@ -51,59 +54,46 @@ class logic():
         path_to_output_folder = os.path.dirname(self.path_to_output_instances)
         with open(output_file_path, 'w') as output_file:
             for net_tuple in network_tuples:
-                row = [os.path.relpath(net_tuple['rel_path_to_onnx'], start=path_to_output_folder), os.path.relpath(net_tuple['rel_path_to_property.vnnlib'], start=path_to_output_folder), net_tuple['timeout']] if net_tuple['timeout'] else [net_tuple['rel_path_to_onnx'], net_tuple['rel_path_to_property.vnnlib']]
+                row = [os.path.relpath(net_tuple.rel_path_to_onnx, start=path_to_output_folder), os.path.relpath(net_tuple.rel_path_to_property, start=path_to_output_folder), net_tuple.timeout] if net_tuple.timeout else [net_tuple.rel_path_to_onnx, net_tuple.rel_path_to_property]
                 csv_line = ','.join(row).replace('\\', '/').replace('\n', '')
                 output_file.write(csv_line + '\n')
 
     def prova(self):
-        print(f'Filters are: {self.included_nodes}, {self.excluded_nodes}, {self.included_architectures}, {self.max_params}, {self.min_params}')
+        print(f'Filters are: {self.included_nodes}, {self.excluded_nodes}, {self.included_architectures}, {self.max_params}, {self.min_params}, {self.cost_bounds}')
         self.reset_filters()
-        self.get_filtered_instances(self.included_architectures, self.incuded_benchmarks, self.included_nodes, self.excluded_nodes, self.min_params, self.max_params)
+        self.get_filtered_instances(self.included_architectures, self.incuded_benchmarks, self.included_nodes, self.excluded_nodes, self.min_params, self.max_params, self.cost_bounds)
         self.write_output_file(self.path_to_output_instances, self.calculated_instances)
 
     def get_benchmarks_sample(self):
         self.reset_filters()
-        self.get_filtered_instances(self.included_architectures, self.incuded_benchmarks, self.included_nodes, self.excluded_nodes, self.min_params, self.max_params)
+        self.get_filtered_instances(self.included_architectures, self.incuded_benchmarks, self.included_nodes, self.excluded_nodes, self.min_params, self.max_params, self.cost_bounds)
         dictionaries = []
-        for i, row in self.dataframe.iterrows():
-            #dictionaries.append({'onnx': row['onnx'].replace('.onnx',''), 'architecture': row['architecture'], 'benchmark': row['benchmark'], 'n_params': row['n_params'], 'node_types': row['node_types']})
-            dictionaries.append([row['onnx'].replace('.onnx',''), row['architecture'], row['benchmark'], row['n_params'], ", ".join(row['node_types'])])
+        for net in self.filtered_networks:
+            #dictionaries.append({'onnx': net['onnx'].replace('.onnx',''), 'architecture': net['architecture'], 'benchmark': net['benchmark'], 'n_params': net['n_params'], 'node_types': net['node_types']})
+            dictionaries.append([net['onnx'].replace('.onnx',''), net['architecture'], net['benchmark'], net['n_params'], ", ".join(net['node_types'])])
         #print(f"Benckmarks sample: {dictionaries}")
         return dictionaries
 
     def reset_filters(self):
-        self.dataframe = load_nns_dataframe(self.path_to_dataset)
-    
-    def filter_benchmarks(self, benchmarks):
+        # The session is loaded again only if the dataset changed, the filters are applied to the networks kept in memory
+        if self.session.nns_path != os.path.abspath(self.path_to_dataset):
+            self.session = BenchmarkCatalog.load(nns_path=self.path_to_dataset)
+        self.filtered_networks = self.session.networks
+
+    def get_filtered_instances(self, architectures, benchmarks, inc_nodes, exc_nodes, min_params, max_params, cost_bounds = None):
+        query = {'inarc': architectures, 'inbench': benchmarks, 'innode': inc_nodes, 'exnode': exc_nodes, 'min_par': min_params, 'max_par': max_params}
+        for suffix, (min_value, max_value) in (cost_bounds or {}).items():
+            query[f'min_{suffix}'], query[f'max_{suffix}'] = min_value, max_value
         if(len(benchmarks) == 0):#TODO Remove this workaround
             print(f"Removing ALL benchmarks -> {self.possible_origins}")
-            self.dataframe = remove_benchmarks(self.dataframe, BENCHMARKS)
-        else:
-            self.dataframe = keep_benchmarks(self.dataframe, benchmarks)
-
-    def filter_architectures(self, architectures):
-        self.dataframe = keep_architectures(self.dataframe, architectures)
-    
-    def filter_nodes(self, inc_nodes, exc_nodes):
-        if('all' in exc_nodes):
-            exc_nodes = sorted(set(self.all_nodes) - set(inc_nodes))
-        self.dataframe = remove_nodes(self.dataframe, exc_nodes)
-        self.dataframe = keep_nodes(self.dataframe, inc_nodes)
-    
-    def filter_params(self, min_params, max_params):
-        self.dataframe = param_range_filter(self.dataframe, min_params, max_params)
-    
-    def get_filtered_instances(self, architectures, benchmarks, inc_nodes, exc_nodes, min_params, max_params):
-        self.filter_benchmarks(benchmarks)
-        self.filter_architectures(architectures)
-        self.filter_nodes(inc_nodes, exc_nodes)
-        self.filter_params(min_params, max_params)
-        self.calculated_instances = get_network_tuples(self.dataframe, self.path_to_output_instances)
+            query['exbench'] = BENCHMARKS
+        self.filtered_networks = self.session.select_networks(query)
+        self.calculated_instances = self.session.instances_of(self.filtered_networks, self.path_to_output_instances)
     
     def write_output_instances(self):
         with open(self.path_to_output_instances, 'w') as file:
             for instance in self.calculated_instances:
-                file.write(instance['onnx'] + ',' + instance['vnnlib'] + ',' + instance['timeout']) if instance['timeout'] else file.write(instance['onnx'] + ',' + instance['vnnlib'])
+                file.write(instance.onnx + ',' + instance.vnnlib + ',' + instance.timeout) if instance.timeout else file.write(instance.onnx + ',' + instance.vnnlib)
     
 #def get_benchmarks_sample():
 #    with open('benchmarks_list.csv', 'r') as file:
@@ -120,7 +110,7 @@ class logic():
 #    return dictionaries
 #
 def get_nodes_types(): 
-    return sorted(set([schema.name.lower() for schema in onnx.defs.get_all_schemas()]))
+    return list(ONNX_NODES)
 #
 #def get_node():
 #    return random.choice(get_nodes_types())
\ No newline at end of file
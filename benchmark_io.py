@@ -0,0 +1,70 @@
+import argparse
+import gzip
+import os
+import shutil
+import sys
+
+# Access to the files of the benchmarks (.onnx, .vnnlib, instances...) whether they were extracted or are still compressed with gzip, so that the
+# corpus can be kept compressed: a '.gz' file is decompressed while it is read, a chunk at a time, without writing temporary files.
+# A path can be given with or without the '.gz' extension, if both files exist the uncompressed one is used
+GZ_EXTENSION = '.gz'
+BUFFER_SIZE = 2**20
+
+
+def get_plain_path(path: str) -> str:
+    '''Returns the path without the '.gz' extension, the path of the file once extracted'''
+    return path[:-len(GZ_EXTENSION)] if path.endswith(GZ_EXTENSION) else path
+
+def resolve_path(path: str) -> str:
+    '''Returns the path of the file as it is on disk, the uncompressed one or else the '.gz' one. FileNotFoundError is raised if neither exists'''
+    plain_path = get_plain_path(path)
+    for candidate in (plain_path, plain_path + GZ_EXTENSION):
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"No such file: '{plain_path}' (or '{plain_path}{GZ_EXTENSION}')")
+
+def exists(path: str) -> bool:
+    '''Returns True if the file exists uncompressed or compressed'''
+    try:
+        resolve_path(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def get_size(path: str) -> int:
+    '''Returns the size on disk of the file, compressed if only the '.gz' file exists'''
+    return os.path.getsize(resolve_path(path))
+
+def open_benchmark_file(path: str, mode: str = 'rb'):
+    '''Opens a file of the benchmarks for reading, in binary ('rb') or text ('rt') mode. A '.gz' file is decompressed while it is read'''
+    if mode not in ('rb', 'rt', 'r'):
+        raise ValueError(f"Mode {mode} is not supported, the files of the benchmarks can only be read ('rb' or 'rt')")
+    path = resolve_path(path)
+    if path.endswith(GZ_EXTENSION):
+        return gzip.open(path, 'rt' if mode == 'r' else mode)
+    return open(path, mode)
+
+def read_bytes(path: str) -> bytes:
+    '''Returns the (decompressed) content of a file of the benchmarks'''
+    with open_benchmark_file(path, 'rb') as benchmark_file:
+        return benchmark_file.read()
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the content of files of the benchmarks to the standard output, decompressing them if only the '.gz' file exists\n"
+                                                 "(e.g. 'python benchmark_io.py Benchmarks_fc/acasxu_2023/vnnlib/prop_1.vnnlib | my_verifier')")
+    parser.add_argument('paths', nargs='+', help="Paths of the files, with or without the '.gz' extension")
+    parser.add_argument('--resolve', '-r', action='store_true', help="Flag to only print the path of each file as it is on disk")
+    args = parser.parse_args()
+    for path in args.paths:
+        try:
+            if args.resolve:
+                print(resolve_path(path))
+                continue
+            with open_benchmark_file(path, 'rb') as benchmark_file:
+                shutil.copyfileobj(benchmark_file, sys.stdout.buffer, BUFFER_SIZE)
+        except FileNotFoundError as error:
+            print(error, file=sys.stderr)
+            exit(1)
+
+if __name__ == '__main__':
+    main()
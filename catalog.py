@@ -0,0 +1,356 @@
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import time
+from benchmark_io import resolve_path
+from node_index import encode_node_types
+
+BENCHMARKS_VNNCOMP_DIR = os.path.abspath(os.path.dirname(__file__))
+# Directory (git submodule) holding the benchmarks of each architecture
+ARCHITECTURE_DIRS = {'fullyconnected': 'Benchmarks_fc', 'convolutional': 'Benchmarks_conv', 'residual': 'Benchmarks_residual'}
+EXPECTED_RESULTS_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'expected_results.csv')
+NEURAL_NETWORKS_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'nns.csv')
+CATALOG_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'catalog.sqlite')
+# Binary copies of the properties written by property_sidecars.py, with the same layout of the benchmark directories
+SIDECAR_DIR = 'property_sidecars'
+# Bump this every time the schema below changes, old catalogs will be considered out of date
+CATALOG_VERSION = 4
+# Optional integer columns of nns.csv, NULL when they are empty or missing
+COST_COLUMNS = ['input_dim', 'output_dim', 'n_neurons', 'n_macs', 'depth']
+# Complexity of the properties, computed by vnnlib_parser.py when the catalog is built with '--properties'
+PROPERTY_COLUMNS = ['n_inputs', 'n_disjuncts', 'n_constraints', 'log_volume', 'max_radius']
+
+CATALOG_SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE architectures (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE benchmarks (
+    id INTEGER PRIMARY KEY,
+    architecture_id INTEGER NOT NULL REFERENCES architectures(id),
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    has_instances INTEGER NOT NULL,
+    UNIQUE (architecture_id, name)
+);
+CREATE TABLE networks (
+    id INTEGER PRIMARY KEY,
+    benchmark_id INTEGER NOT NULL REFERENCES benchmarks(id),
+    onnx TEXT NOT NULL,
+    node_types TEXT NOT NULL,
+    n_params INTEGER NOT NULL,
+    input_dim INTEGER,
+    output_dim INTEGER,
+    n_neurons INTEGER,
+    n_macs INTEGER,
+    depth INTEGER
+);
+CREATE TABLE instances (
+    id INTEGER PRIMARY KEY,
+    network_id INTEGER NOT NULL REFERENCES networks(id),
+    onnx TEXT NOT NULL,
+    vnnlib TEXT NOT NULL,
+    timeout TEXT,
+    result TEXT
+);
+CREATE TABLE properties (
+    id INTEGER PRIMARY KEY,
+    benchmark_id INTEGER NOT NULL REFERENCES benchmarks(id),
+    vnnlib TEXT NOT NULL,
+    n_inputs INTEGER,
+    n_disjuncts INTEGER,
+    n_constraints INTEGER,
+    log_volume REAL,
+    max_radius REAL,
+    UNIQUE (benchmark_id, vnnlib)
+);
+CREATE INDEX networks_benchmark_idx ON networks(benchmark_id);
+CREATE INDEX instances_network_idx ON instances(network_id);
+'''
+# Properties of the instances, by benchmark directory and vnnlib path relative to it
+PROPERTY_FILES_QUERY = '''SELECT DISTINCT benchmarks.path, instances.vnnlib FROM instances
+                          JOIN networks ON instances.network_id = networks.id JOIN benchmarks ON networks.benchmark_id = benchmarks.id'''
+
+
+def get_benchmark_dir(architecture: str, benchmark: str) -> str:
+    '''Returns the path of the benchmark directory relative to BENCHMARKS_VNNCOMP_DIR'''
+    if architecture not in ARCHITECTURE_DIRS:
+        raise ValueError(f'Architecture {architecture} is not recognized')
+    return os.path.join(ARCHITECTURE_DIRS[architecture], benchmark)
+
+def get_sidecar_path(benchmark_dir: str, vnnlib: str) -> str:
+    '''Returns the path of the sidecar of a property relative to BENCHMARKS_VNNCOMP_DIR, a directory named as the property without the '.vnnlib(.gz)' extension'''
+    vnnlib = vnnlib[:-3] if vnnlib.endswith('.gz') else vnnlib
+    return os.path.join(SIDECAR_DIR, benchmark_dir, os.path.splitext(vnnlib)[0])
+
+def read_nns_file(file_path: str) -> list:
+    '''Reads the networks CSV file, returns a list of dictionaries with the raw string values of each row'''
+    with open(file_path, newline='') as nns_file:
+        return list(csv.DictReader(nns_file))
+
+def parse_node_types(node_types: str) -> list:
+    '''Parses a 'node_types' cell of nns.csv, formatted as a python list of strings, without evaluating it'''
+    node_types = node_types.strip().lstrip('[').rstrip(']')
+    return [node.strip().strip('\'"') for node in node_types.split(',') if node.strip()]
+
+def match_network(onnx_path: str, networks: dict):
+    '''Returns the value of networks (keyed by the 'onnx' column of nns.csv) referenced by an onnx path of an instances.csv file, None if there is no match.
+    The 'onnx' column is the path of the model relative to its folder in the benchmark, usually just the file name, so whole path suffixes are compared'''
+    parts = onnx_path.replace('\\', '/').split('/')
+    if parts[-1].endswith('.gz'):
+        parts[-1] = parts[-1][:-3]
+    for i in range(len(parts)):
+        network = networks.get('/'.join(parts[i:]))
+        if network is not None:
+            return network
+    return None
+
+def read_instances_file(file_path: str, networks) -> dict:
+    '''Reads an instances.csv file in a single pass, returns a dictionary that maps each network in networks (values of the 'onnx' column of nns.csv)
+    to the list of its (onnx, vnnlib, timeout) tuples, in file order. Lines that do not refer to any of the networks are skipped'''
+    by_name = {name.replace('\\', '/'): name for name in networks}
+    network_instances = {}
+    with open(file_path) as benchmark_instance_file:
+        for line in benchmark_instance_file:
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) < 2:
+                continue
+            name = match_network(fields[0], by_name)
+            if name is None:
+                continue
+            timeout = fields[2] if len(fields) > 2 and fields[2] else None
+            network_instances.setdefault(name, []).append((fields[0], fields[1], timeout))
+    return network_instances
+
+def get_source_files(nns_rows: list, nns_path: str, expected_results_path: str) -> list:
+    '''Returns the list of files the catalog is built from: the networks file, the expected results file and the instances.csv of every benchmark'''
+    benchmark_dirs = sorted(set(get_benchmark_dir(row['architecture'], row['benchmark']) for row in nns_rows))
+    return [nns_path, expected_results_path] + [os.path.join(BENCHMARKS_VNNCOMP_DIR, path, 'instances.csv') for path in benchmark_dirs]
+
+def get_property_files(conn: sqlite3.Connection) -> list:
+    '''Returns the property files of the instances in the catalog, sorted, as they are on disk (extracted or else compressed, see benchmark_io.resolve_path)'''
+    property_files = []
+    for path, vnnlib in conn.execute(PROPERTY_FILES_QUERY):
+        property_file = os.path.join(BENCHMARKS_VNNCOMP_DIR, path, vnnlib)
+        try:
+            property_file = resolve_path(property_file)
+        except FileNotFoundError:
+            pass
+        property_files.append(property_file)
+    return sorted(property_files)
+
+def source_fingerprint(source_files: list) -> str:
+    '''Fingerprints the source files looking at their size and modification time, a missing file is fingerprinted as such'''
+    digest = hashlib.sha1()
+    for path in source_files:
+        try:
+            stat = os.stat(path)
+            digest.update(f'{path}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+        except FileNotFoundError:
+            digest.update(f'{path}|missing\n'.encode())
+    return digest.hexdigest()
+
+def read_expected_results(file_path: str) -> dict:
+    '''Reads the expected results file, returns a dictionary (benchmark, onnx, vnnlib) -> result'''
+    with open(file_path, newline='') as results_file:
+        return {(row['bench'], row['onnx'], row['vnnlib']): row['result'] for row in csv.DictReader(results_file)}
+
+def get_expected_result(expected_results: dict, instance):
+    '''Returns the expected result ('sat' or 'unsat') of an instance with the 'benchmark', 'onnx' and 'vnnlib' attributes, None if it is unknown'''
+    return expected_results.get((instance.benchmark, instance.onnx, instance.vnnlib))
+
+def iter_instances_by_result(network_tuples, expected_result: str, expected_results: dict):
+    '''Yields the instances with the given expected result ('sat', 'unsat', 'known' for any known result or '*' for all).
+    expected_results is the dictionary returned by read_expected_results or load_expected_results'''
+    if expected_result == '*':
+        yield from network_tuples
+    elif expected_result == 'known':
+        yield from (instance for instance in network_tuples if (instance.benchmark, instance.onnx, instance.vnnlib) in expected_results)
+    else:
+        yield from (instance for instance in network_tuples if expected_results.get((instance.benchmark, instance.onnx, instance.vnnlib)) == expected_result)
+
+def filter_instances_by_result(network_tuples, expected_result: str, expected_results: dict) -> list:
+    '''Same as iter_instances_by_result, it returns a new list'''
+    return list(iter_instances_by_result(network_tuples, expected_result, expected_results))
+
+def build_catalog(catalog_path: str = CATALOG_FILE, nns_path: str = NEURAL_NETWORKS_FILE, expected_results_path: str = EXPECTED_RESULTS_FILE,
+                  properties: bool = False, jobs: int = None) -> dict:
+    '''Joins networks, instances and expected results into the catalog file, the file is replaced atomically. With properties, the complexity
+    of every property of the instances is computed too, in a pool of jobs processes. Returns a dictionary with some statistics about the built catalog'''
+    nns_rows = read_nns_file(nns_path)
+    expected_results = read_expected_results(expected_results_path)
+    source_files = get_source_files(nns_rows, nns_path, expected_results_path)
+
+    tmp_path = f'{catalog_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(CATALOG_SCHEMA)
+        architecture_ids, benchmark_ids, network_ids = {}, {}, {}
+        for row in nns_rows:
+            architecture, benchmark = row['architecture'], row['benchmark']
+            if architecture not in architecture_ids:
+                architecture_ids[architecture] = conn.execute('INSERT INTO architectures (name) VALUES (?)', (architecture,)).lastrowid
+            if (architecture, benchmark) not in benchmark_ids:
+                path = get_benchmark_dir(architecture, benchmark)
+                has_instances = os.path.isfile(os.path.join(BENCHMARKS_VNNCOMP_DIR, path, 'instances.csv'))
+                benchmark_ids[(architecture, benchmark)] = conn.execute('INSERT INTO benchmarks (architecture_id, name, path, has_instances) VALUES (?, ?, ?, ?)',
+                                                                         (architecture_ids[architecture], benchmark, path, has_instances)).lastrowid
+                network_ids[(architecture, benchmark)] = {}
+            node_types = ','.join(parse_node_types(row['node_types']))
+            costs = [int(row[column]) if row.get(column) else None for column in COST_COLUMNS]
+            network_ids[(architecture, benchmark)][row['onnx']] = conn.execute(f"INSERT INTO networks (benchmark_id, onnx, node_types, n_params, {', '.join(COST_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                                                               [benchmark_ids[(architecture, benchmark)], row['onnx'], node_types, int(row['n_params'])] + costs).lastrowid
+
+        # Read each instances.csv once, every line is matched to its network through the onnx path
+        n_instances = 0
+        for (architecture, benchmark), networks in network_ids.items():
+            i_path = os.path.join(BENCHMARKS_VNNCOMP_DIR, get_benchmark_dir(architecture, benchmark), 'instances.csv')
+            if not os.path.isfile(i_path):
+                continue
+            rows = [(networks[name], onnx, vnnlib, timeout, expected_results.get((benchmark, onnx, vnnlib)))
+                    for name, instances in read_instances_file(i_path, networks).items() for onnx, vnnlib, timeout in instances]
+            conn.executemany('INSERT INTO instances (network_id, onnx, vnnlib, timeout, result) VALUES (?, ?, ?, ?, ?)', rows)
+            n_instances += len(rows)
+
+        n_properties = 0
+        if properties:
+            from vnnlib_parser import compute_property_metrics # Imported here since it needs numpy
+            property_paths = {os.path.join(BENCHMARKS_VNNCOMP_DIR, path, vnnlib): (benchmark_id, vnnlib) for benchmark_id, path, vnnlib in conn.execute(
+                'SELECT DISTINCT benchmarks.id, benchmarks.path, instances.vnnlib FROM instances JOIN networks ON instances.network_id = networks.id JOIN benchmarks ON networks.benchmark_id = benchmarks.id')}
+            # The complexity columns are out of date as soon as a property changes, so the properties are part of the fingerprint
+            source_files += get_property_files(conn)
+            metrics = compute_property_metrics(list(property_paths), jobs)
+            conn.executemany(f"INSERT INTO properties (benchmark_id, vnnlib, {', '.join(PROPERTY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [list(property_paths[path]) + [property_metrics[column] for column in PROPERTY_COLUMNS] for path, property_metrics in metrics.items()])
+            n_properties = len(metrics)
+
+        conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+            ('version', str(CATALOG_VERSION)),
+            ('fingerprint', source_fingerprint(source_files)),
+            ('nns_path', os.path.abspath(nns_path)),
+            ('expected_results_path', os.path.abspath(expected_results_path)),
+            ('properties', str(int(properties))),
+            ('built_at', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ])
+        conn.commit()
+    except BaseException:
+        # A failed build does not leave its temporary file next to the catalog
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    os.replace(tmp_path, catalog_path)
+    return {'networks': sum(len(networks) for networks in network_ids.values()), 'benchmarks': len(benchmark_ids), 'instances': n_instances, 'properties': n_properties}
+
+def open_catalog(catalog_path: str = CATALOG_FILE, nns_path: str = NEURAL_NETWORKS_FILE, expected_results_path: str = EXPECTED_RESULTS_FILE):
+    '''Opens the catalog file, returns None if it does not exist or if it is out of date with respect to its source files (and its property files if it was built with them)'''
+    if not os.path.isfile(catalog_path):
+        return None
+    conn = sqlite3.connect(f'file:{catalog_path}?mode=ro', uri=True)
+    try:
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+        if meta.get('version') != str(CATALOG_VERSION) or meta.get('nns_path') != os.path.abspath(nns_path) \
+                or meta.get('expected_results_path') != os.path.abspath(expected_results_path):
+            conn.close()
+            return None
+        benchmark_dirs = [path for (path,) in conn.execute('SELECT path FROM benchmarks ORDER BY path')]
+        source_files = [nns_path, expected_results_path] + [os.path.join(BENCHMARKS_VNNCOMP_DIR, path, 'instances.csv') for path in benchmark_dirs]
+        if meta.get('properties') == '1':
+            source_files += get_property_files(conn)
+        if meta.get('fingerprint') != source_fingerprint(source_files):
+            conn.close()
+            return None
+    except sqlite3.DatabaseError:
+        conn.close()
+        return None
+    return conn
+
+def load_networks(conn: sqlite3.Connection) -> list:
+    '''Returns the networks in the catalog as a list of dictionaries with the same columns as nns.csv plus the network 'id' and the 'node_mask' of its node types'''
+    query = f'''SELECT networks.id, architectures.name, benchmarks.name, networks.onnx, networks.node_types, networks.n_params, {', '.join('networks.' + column for column in COST_COLUMNS)}
+               FROM networks JOIN benchmarks ON networks.benchmark_id = benchmarks.id JOIN architectures ON benchmarks.architecture_id = architectures.id
+               ORDER BY networks.id'''
+    networks = []
+    for network_id, architecture, benchmark, onnx, node_types, n_params, *costs in conn.execute(query):
+        node_types = node_types.split(',') if node_types else []
+        networks.append({'id': network_id, 'architecture': architecture, 'benchmark': benchmark, 'onnx': onnx, 'node_types': node_types, 'n_params': n_params,
+                         **dict(zip(COST_COLUMNS, costs)), 'node_mask': encode_node_types(node_types)})
+    return networks
+
+def iter_instances(conn: sqlite3.Connection, network_ids: list):
+    '''Yields the instances of the given networks, in the same order of the networks in the catalog, as dictionaries read one at a time from the database.
+    A ValueError is raised if the instances.csv file of a benchmark was not available when the catalog was built'''
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS selected_networks (network_id INTEGER PRIMARY KEY)')
+    conn.execute('DELETE FROM selected_networks')
+    conn.executemany('INSERT OR IGNORE INTO selected_networks (network_id) VALUES (?)', [(int(network_id),) for network_id in network_ids])
+    missing = conn.execute('''SELECT DISTINCT benchmarks.path FROM selected_networks JOIN networks ON selected_networks.network_id = networks.id
+                              JOIN benchmarks ON networks.benchmark_id = benchmarks.id WHERE NOT benchmarks.has_instances''').fetchall()
+    if missing:
+        raise ValueError(f'Path does not contain instances.csv: {", ".join(path for (path,) in missing)}')
+    query = '''SELECT instances.network_id, benchmarks.name, benchmarks.path, instances.onnx, instances.vnnlib, instances.timeout, instances.result
+               FROM selected_networks JOIN instances ON instances.network_id = selected_networks.network_id
+               JOIN networks ON instances.network_id = networks.id JOIN benchmarks ON networks.benchmark_id = benchmarks.id
+               ORDER BY instances.network_id, instances.id'''
+    for network_id, benchmark, path, onnx, vnnlib, timeout, result in conn.execute(query):
+        yield {'network_id': network_id, 'benchmark': benchmark, 'benchmark_path': path, 'onnx': onnx, 'vnnlib': vnnlib, 'timeout': timeout, 'result': result}
+
+def load_instances(conn: sqlite3.Connection, network_ids: list) -> list:
+    '''Same as iter_instances, it returns a list'''
+    return list(iter_instances(conn, network_ids))
+
+def load_network_instances(conn: sqlite3.Connection) -> tuple:
+    '''Returns all the instances in the catalog as a dictionary (architecture, benchmark, onnx) -> list of (onnx, vnnlib, timeout) tuples,
+    together with the set of (architecture, benchmark) whose instances.csv file was not available when the catalog was built'''
+    query = '''SELECT architectures.name, benchmarks.name, networks.onnx, instances.onnx, instances.vnnlib, instances.timeout
+               FROM instances JOIN networks ON instances.network_id = networks.id JOIN benchmarks ON networks.benchmark_id = benchmarks.id
+               JOIN architectures ON benchmarks.architecture_id = architectures.id ORDER BY instances.network_id, instances.id'''
+    network_instances = {}
+    for architecture, benchmark, network, onnx, vnnlib, timeout in conn.execute(query):
+        network_instances.setdefault((architecture, benchmark, network), []).append((onnx, vnnlib, timeout))
+    missing = set(conn.execute('''SELECT architectures.name, benchmarks.name FROM benchmarks JOIN architectures ON benchmarks.architecture_id = architectures.id
+                                  WHERE NOT benchmarks.has_instances'''))
+    return network_instances, missing
+
+def load_expected_results(conn: sqlite3.Connection) -> dict:
+    '''Returns the expected results of the instances in the catalog, in the same format of read_expected_results'''
+    query = '''SELECT benchmarks.name, instances.onnx, instances.vnnlib, instances.result FROM instances
+               JOIN networks ON instances.network_id = networks.id JOIN benchmarks ON networks.benchmark_id = benchmarks.id
+               WHERE instances.result IS NOT NULL'''
+    return {(bench, onnx, vnnlib): result for bench, onnx, vnnlib, result in conn.execute(query)}
+
+def load_property_metrics(conn: sqlite3.Connection) -> dict:
+    '''Returns the complexity of the properties in the catalog, keyed by (benchmark directory, vnnlib path relative to it). Empty if it was built without '--properties' '''
+    query = f'''SELECT benchmarks.path, properties.vnnlib, {', '.join('properties.' + column for column in PROPERTY_COLUMNS)}
+                FROM properties JOIN benchmarks ON properties.benchmark_id = benchmarks.id'''
+    return {(path, vnnlib): dict(zip(PROPERTY_COLUMNS, metrics)) for path, vnnlib, *metrics in conn.execute(query)}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=
+"""Description:
+    This script builds the catalog used by gen_instances.py and by the GUI: a single indexed SQLite file that joins 'nns.csv',
+    the 'instances.csv' file of every benchmark and 'expected_results.csv'.
+    Run it again every time one of those files changes (e.g. after updating the submodules), an out of date catalog is ignored
+    and the scripts fall back to parsing the CSV files.
+    With '--properties' every property is parsed (this needs numpy) to record its number of inputs, disjuncts and output constraints,
+    the log volume of its input box and its largest radius, used by the property filters and by '--sort' of gen_instances.py.
+    The catalog is then out of date as soon as one of the properties changes too.
+""",
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--output', '-o', type=str, required=False, default=CATALOG_FILE, help="Path of the catalog file, default is 'catalog.sqlite' in the repository root")
+    parser.add_argument('--nns', type=str, required=False, default=NEURAL_NETWORKS_FILE, help="Path of the networks CSV file, default is 'nns.csv'")
+    parser.add_argument('--expected_results', type=str, required=False, default=EXPECTED_RESULTS_FILE, help="Path of the expected results CSV file, default is 'expected_results.csv'")
+    parser.add_argument('--properties', '-p', action='store_true', help="Flag to also record the complexity of every property, parsing them in parallel")
+    parser.add_argument('--jobs', '-j', type=int, required=False, help="Number of worker processes parsing the properties, default is the number of CPUs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = build_catalog(args.output, args.nns, args.expected_results, args.properties, args.jobs)
+    print(f"Catalog written to {args.output}: {stats['networks']} networks from {stats['benchmarks']} benchmarks, {stats['instances']} instances"
+          f"{', ' + str(stats['properties']) + ' properties' if args.properties else ''} ({time.perf_counter() - start:.2f}s)")
+
+if __name__ == '__main__':
+    main()
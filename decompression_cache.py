@@ -0,0 +1,335 @@
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from benchmark_io import resolve_path
+from extract_compress_files_python import BUFFER_SIZE, read_instance_paths
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Cache of the decompressed models and properties on the local scratch of a node, for the verifiers that can only read plain files.
+# A '.gz' file is decompressed the first time it is asked for, into an entry keyed by the sha1 of its content, and the least recently used
+# entries that are not pinned are removed once the cache is larger than its size. The processes of the same host share the cache:
+# 'index.json' (entries, pins and statistics) is only changed while holding the lock on 'lock', once per lookup at most, and every file is written under a
+# temporary name and renamed into place, so a reader never sees a partial file.
+DECOMPRESSION_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'vnncomp_decompression_cache')
+DECOMPRESSION_CACHE_SIZE = 10240 # MB
+DECOMPRESSION_CACHE_VERSION = 1
+STATS_KEYS = ['hits', 'misses', 'evictions', 'bytes_decompressed', 'bytes_evicted']
+# Pins of the runs without a pin name (see get_cached_paths), '.run.<pid>.<thread>': the prefix is reserved
+RUN_PIN_PREFIX = '.run.'
+RUN_PIN_PATTERN = re.compile(r'^\.run\.(\d+)\.')
+
+
+@contextlib.contextmanager
+def lock_file(path: str):
+    '''Holds an exclusive lock on the file while in the context, the other processes asking for it wait'''
+    with open(path, 'a+b') as locked_file:
+        if fcntl is not None:
+            fcntl.flock(locked_file, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(locked_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(locked_file, fcntl.LOCK_UN)
+            else:
+                locked_file.seek(0)
+                msvcrt.locking(locked_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def get_empty_index() -> dict:
+    '''Returns the index of an empty cache'''
+    # entries: key -> {'name', 'size', 'last_used'}, sources: path -> [size, mtime_ns, key], pins: name -> [keys]
+    return {'version': DECOMPRESSION_CACHE_VERSION, 'entries': {}, 'sources': {}, 'pins': {}, 'stats': dict.fromkeys(STATS_KEYS, 0)}
+
+def read_index(cache_dir: str) -> dict:
+    '''Returns the index of the cache, an empty one if it is missing or of another version'''
+    try:
+        with open(os.path.join(cache_dir, 'index.json')) as index_file:
+            index = json.load(index_file)
+        if index.get('version') == DECOMPRESSION_CACHE_VERSION:
+            return index
+    except (FileNotFoundError, ValueError):
+        pass
+    return get_empty_index()
+
+@contextlib.contextmanager
+def update_index(cache_dir: str):
+    '''Yields the index of the cache holding its lock, the changes are written atomically when the context exits'''
+    os.makedirs(cache_dir, exist_ok=True)
+    with lock_file(os.path.join(cache_dir, 'lock')):
+        index = read_index(cache_dir)
+        yield index
+        tmp_path = os.path.join(cache_dir, f'index.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(tmp_path, os.path.join(cache_dir, 'index.json'))
+
+def get_entry_path(cache_dir: str, key: str, name: str) -> str:
+    '''Returns the path of the decompressed file of an entry, it keeps the name of the file so that its extension is still there'''
+    return os.path.join(cache_dir, 'objects', key, name)
+
+def hash_file(path: str) -> str:
+    '''Returns the sha1 of the content of the file'''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_source(path: str, index: dict) -> list:
+    '''Returns the [size, mtime_ns, key] of a compressed file, its key is the hash of its content. The hash is computed again only if the size or the modification time of the file
+    changed since it was stored in the index'''
+    stat = os.stat(path)
+    source = index['sources'].get(path)
+    if source is not None and source[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return source
+    return [stat.st_size, stat.st_mtime_ns, hash_file(path)]
+
+def find_entry(index: dict, cache_dir: str, key: str) -> str:
+    '''Returns the path of the file of an entry, None if the entry or its file is not in the cache'''
+    entry = index['entries'].get(key)
+    if entry is not None and os.path.isfile(get_entry_path(cache_dir, key, entry['name'])):
+        return get_entry_path(cache_dir, key, entry['name'])
+    return None
+
+def lookup_path(path: str, cache_dir: str, index: dict) -> tuple:
+    '''Returns the absolute path of a file of the benchmarks as it is on disk, its source (None if it is not compressed) and the path of its plain copy in the cache,
+    None if it is not there. It only reads the index, which is always replaced atomically, so it does not need its lock'''
+    path = os.path.abspath(resolve_path(path))
+    if not path.endswith('.gz'):
+        return path, None, path
+    source = get_source(path, index)
+    return path, source, find_entry(index, cache_dir, source[2])
+
+def is_process_alive(pid: int) -> bool:
+    '''Tells if a process of the host is running'''
+    if fcntl is None: # Windows, where os.kill would terminate the process
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid) # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.GetLastError() != 87 # ERROR_INVALID_PARAMETER, there is no such process
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def expire_run_pins(index: dict) -> int:
+    '''Removes the pins of the runs (see get_cached_paths) whose process is dead, e.g. it crashed before unpinning its files.
+    Must be called while holding the lock of the index, returns the number of removed pins'''
+    expired = []
+    for pin in index['pins']:
+        match = RUN_PIN_PATTERN.match(pin)
+        if match is not None and not is_process_alive(int(match.group(1))):
+            expired.append(pin)
+    for pin in expired:
+        del index['pins'][pin]
+    return len(expired)
+
+def remove_key_lock(cache_dir: str, key: str) -> None:
+    '''Removes the lock file of a key, if another process is still holding it at worst the file is decompressed twice'''
+    try:
+        os.remove(os.path.join(cache_dir, 'locks', f'{key}.lock'))
+    except OSError:
+        pass
+
+def evict_entries(index: dict, cache_dir: str, max_size: float, keep: set = frozenset()) -> int:
+    '''Removes the least recently used entries that are neither pinned nor in keep until the entries take at most max_size MB, the pins of the dead runs are removed first.
+    Must be called while holding the lock of the index, returns the number of removed entries'''
+    expire_run_pins(index)
+    pinned = set(key for keys in index['pins'].values() for key in keys) | set(keep)
+    total_size = sum(entry['size'] for entry in index['entries'].values())
+    removed = 0
+    for key, entry in sorted(index['entries'].items(), key=lambda item: item[1]['last_used']):
+        if total_size <= max_size * 2**20:
+            break
+        if key in pinned:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, 'objects', key), ignore_errors=True)
+        remove_key_lock(cache_dir, key)
+        del index['entries'][key]
+        total_size -= entry['size']
+        index['stats']['evictions'] += 1
+        index['stats']['bytes_evicted'] += entry['size']
+        removed += 1
+    index['sources'] = {path: source for path, source in index['sources'].items() if source[2] in index['entries']}
+    return removed
+
+def use_entry(index: dict, cache_dir: str, path: str, source: list, pin: str = None) -> str:
+    '''Marks the entry of a compressed file as just used, stores its source and pins the entry under pin (if not None), returns the path of its file.
+    Must be called while holding the lock of the index'''
+    key = source[2]
+    entry = index['entries'][key]
+    entry['last_used'] = time.time()
+    index['sources'][path] = source
+    if pin is not None and key not in index['pins'].setdefault(pin, []):
+        index['pins'][pin].append(key)
+    return get_entry_path(cache_dir, key, entry['name'])
+
+def get_cached_path(path: str, cache_dir: str = DECOMPRESSION_CACHE_DIR, max_size: float = DECOMPRESSION_CACHE_SIZE, pin: str = None) -> str:
+    '''Returns the path of a plain copy of a file of the benchmarks (given with or without the '.gz' extension): the file itself if it is not compressed,
+    else its decompressed copy in the cache, decompressed now if it is not there, pinned under pin if it is not None. Then the cache is shrunk to max_size MB.
+    The index is looked up without its lock and written once per call, to count the hit (or insert the entry) and mark the entry as used'''
+    path, source, cached_path = lookup_path(path, cache_dir, read_index(cache_dir))
+    if source is None:
+        return cached_path
+    key = source[2]
+
+    if cached_path is None:
+        # The lock of the key makes the other processes asking for the same file wait for this decompression, instead of repeating it
+        os.makedirs(os.path.join(cache_dir, 'locks'), exist_ok=True)
+        with lock_file(os.path.join(cache_dir, 'locks', f'{key}.lock')):
+            if find_entry(read_index(cache_dir), cache_dir, key) is None:
+                entry_path = get_entry_path(cache_dir, key, os.path.basename(path)[:-len('.gz')])
+                os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+                tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+                try:
+                    with gzip.open(path, 'rb') as comp_file, open(tmp_path, 'wb') as uncomp_file:
+                        shutil.copyfileobj(comp_file, uncomp_file, BUFFER_SIZE)
+                    os.replace(tmp_path, entry_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                with update_index(cache_dir) as index:
+                    size = os.path.getsize(entry_path)
+                    index['entries'][key] = {'name': os.path.basename(entry_path), 'size': size, 'last_used': time.time()}
+                    index['stats']['misses'] += 1
+                    index['stats']['bytes_decompressed'] += size
+                    evict_entries(index, cache_dir, max_size, keep={key})
+                    return use_entry(index, cache_dir, path, source, pin)
+
+    with update_index(cache_dir) as index:
+        if find_entry(index, cache_dir, key) is not None:
+            index['stats']['hits'] += 1
+            return use_entry(index, cache_dir, path, source, pin)
+    # The entry was evicted since the index was read
+    return get_cached_path(path, cache_dir, max_size, pin)
+
+def get_cached_paths(paths: list, cache_dir: str = DECOMPRESSION_CACHE_DIR, max_size: float = DECOMPRESSION_CACHE_SIZE, pin: str = None, jobs: int = 1) -> dict:
+    '''Decompresses the files into the cache, jobs at a time, and pins them under pin if it is not None (e.g. the name of the current suite):
+    pinned files are not removed until they are unpinned. Without a pin the files are pinned until all of them are in the cache, so that they do not
+    evict each other, the cache can then be larger than max_size MB until the next file is decompressed. Returns a dictionary path -> path of its plain copy.
+    The files already in the cache are looked up reading the index, then they are counted and pinned with a single write of it'''
+    run_pin = pin if pin is not None else f'{RUN_PIN_PREFIX}{os.getpid()}.{threading.get_ident()}'
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            index = read_index(cache_dir)
+            lookups = dict(zip(paths, executor.map(lambda path: lookup_path(path, cache_dir, index), paths)))
+            cached_paths = {path: cached_path for path, (_, source, cached_path) in lookups.items() if source is None}
+            hits = {path: lookup for path, lookup in lookups.items() if lookup[1] is not None and lookup[2] is not None}
+            if len(hits) > 0:
+                with update_index(cache_dir) as index:
+                    for path, (disk_path, source, _) in hits.items():
+                        if find_entry(index, cache_dir, source[2]) is not None: # Else it was evicted since the index was read
+                            index['stats']['hits'] += 1
+                            cached_paths[path] = use_entry(index, cache_dir, disk_path, source, run_pin)
+            misses = [path for path in paths if path not in cached_paths]
+            cached_paths.update(zip(misses, executor.map(lambda path: get_cached_path(path, cache_dir, max_size, run_pin), misses)))
+            return {path: cached_paths[path] for path in paths}
+    finally:
+        if pin is None:
+            unpin_files(run_pin, cache_dir, None)
+
+def unpin_files(pin: str, cache_dir: str = DECOMPRESSION_CACHE_DIR, max_size: float = DECOMPRESSION_CACHE_SIZE) -> int:
+    '''Removes the pin, its files can be removed again, and shrinks the cache to max_size MB (unless it is None). Returns the number of files it pinned'''
+    with update_index(cache_dir) as index:
+        keys = index['pins'].pop(pin, [])
+        if max_size is not None:
+            evict_entries(index, cache_dir, max_size)
+    return len(keys)
+
+def get_cache_stats(cache_dir: str = DECOMPRESSION_CACHE_DIR) -> dict:
+    '''Returns the statistics of the cache (hits, misses, evictions, bytes decompressed and evicted) with its number of entries, size in bytes and pins'''
+    index = read_index(cache_dir)
+    return {**index['stats'], 'entries': len(index['entries']), 'size': sum(entry['size'] for entry in index['entries'].values()),
+            'pins': {pin: len(keys) for pin, keys in index['pins'].items()}}
+
+def clear_cache(cache_dir: str = DECOMPRESSION_CACHE_DIR) -> int:
+    '''Removes all the entries of the cache, pinned or not, their lock files and its statistics. Returns the number of removed entries'''
+    with update_index(cache_dir) as index:
+        removed = len(index['entries'])
+        shutil.rmtree(os.path.join(cache_dir, 'objects'), ignore_errors=True)
+        shutil.rmtree(os.path.join(cache_dir, 'locks'), ignore_errors=True)
+        index.clear()
+        index.update(get_empty_index())
+    return removed
+
+def write_cached_instances(instances_file: str, output_file: str, cached_paths: dict) -> int:
+    '''Writes a copy of the instances file with the paths of the models and properties replaced by the absolute paths of their plain copies, returns the number of lines'''
+    folder = os.path.dirname(os.path.abspath(instances_file))
+    n_lines = 0
+    with (gzip.open(instances_file, 'rt', newline='') if instances_file.endswith('.gz') else open(instances_file, newline='')) as instances, open(output_file, 'w', newline='') as output:
+        writer = csv.writer(output, lineterminator='\n')
+        for row in csv.reader(instances):
+            for i in range(min(len(row), 2)):
+                path = os.path.normpath(os.path.join(folder, row[i].strip()))
+                row[i] = cached_paths.get(path[:-len('.gz')] if path.endswith('.gz') else path, row[i])
+            writer.writerow(row)
+            n_lines += 1
+    return n_lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Decompresses the models and properties of an instances file into a cache on the local scratch, shared by the processes of the host,\n"
+                                                 "and writes the instances file of their plain copies. Also shows the statistics of the cache, unpins suites and clears it")
+    parser.add_argument('--from-instances', '-i', type=str, required=False, help="Instances file generated by gen_instances.py whose .onnx and .vnnlib files are decompressed into the cache")
+    parser.add_argument('--output', '-o', type=str, required=False, help="Path of the copy of the instances file with the paths of the plain copies, default is '<instances>_cached.csv'")
+    parser.add_argument('--pin', '-p', type=str, required=False, help="Name under which the files of the instances are pinned, they are not removed from the cache until '--unpin' is run")
+    parser.add_argument('--unpin', '-u', type=str, required=False, help="Name of the pin to remove")
+    parser.add_argument('--cache_dir', '-cd', type=str, required=False, default=DECOMPRESSION_CACHE_DIR, help=f"Path to the cache, default is {DECOMPRESSION_CACHE_DIR}")
+    parser.add_argument('--size', '-s', type=float, required=False, default=DECOMPRESSION_CACHE_SIZE, help=f"Maximum size of the cache in MB, the least recently used files that are not pinned are removed first, default is {DECOMPRESSION_CACHE_SIZE}")
+    parser.add_argument('--jobs', '-j', type=int, required=False, default=1, help="Number of files decompressed at the same time, default is 1")
+    parser.add_argument('--stats', action='store_true', help="Flag to print the statistics of the cache")
+    parser.add_argument('--clear', action='store_true', help="Remove all the entries of the cache, even the pinned ones")
+    args = parser.parse_args()
+    if args.pin is not None and args.pin.startswith(RUN_PIN_PREFIX):
+        parser.error(f"argument --pin/-p: the names starting with '{RUN_PIN_PREFIX}' are reserved for the runs without a pin")
+
+    if args.clear:
+        print(f"Removed {clear_cache(args.cache_dir)} entries from {args.cache_dir}")
+    if args.unpin:
+        print(f"Unpinned {unpin_files(args.unpin, args.cache_dir, args.size)} files of '{args.unpin}'")
+    if args.from_instances:
+        start = time.perf_counter()
+        paths = read_instance_paths(args.from_instances)
+        try:
+            cached_paths = get_cached_paths(paths, args.cache_dir, args.size, args.pin, args.jobs)
+        except FileNotFoundError as error:
+            print(error)
+            exit(1)
+        output_file = args.output or os.path.splitext(args.from_instances[:-3] if args.from_instances.endswith('.gz') else args.from_instances)[0] + '_cached.csv'
+        n_lines = write_cached_instances(args.from_instances, output_file, cached_paths)
+        print(f"{len(paths)} files ready in {time.perf_counter() - start:.2f}s, {n_lines} instances written to {output_file}")
+    if args.stats or not (args.clear or args.unpin or args.from_instances):
+        stats = get_cache_stats(args.cache_dir)
+        lookups = stats['hits'] + stats['misses']
+        print(f"The cache {args.cache_dir} has {stats['entries']} files, {stats['size'] / 2**20:.1f} MB (maximum {args.size:g} MB)")
+        print(f"{stats['hits']} hits and {stats['misses']} misses ({stats['hits'] / max(lookups, 1):.0%} hit rate), {stats['bytes_decompressed'] / 2**20:.1f} MB decompressed, "
+              f"{stats['evictions']} files evicted ({stats['bytes_evicted'] / 2**20:.1f} MB)")
+        for pin, n_files in stats['pins'].items():
+            print(f"Pinned '{pin}': {n_files} files")
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,108 @@
 import os
+import csv
 import gzip
 import sys
+import time
 import shutil
 import argparse
+import concurrent.futures
+from benchmark_io import get_plain_path
 
-def extract_files(folder):
+BUFFER_SIZE = 2**20
+
+def extract_file(path, buffer_size=BUFFER_SIZE):
+    '''Extracts a .gz file next to it and removes it, returns the size of the compressed and of the extracted file.
+    The file is extracted under a temporary name and then renamed, so an interrupted extraction never leaves a truncated file'''
+    tmp_path = f"{path[:-len('.gz')]}.{os.getpid()}.tmp"
+    try:
+        with gzip.open(path, "rb") as comp_file:
+            with open(tmp_path, 'wb') as uncomp_file:
+                shutil.copyfileobj(comp_file, uncomp_file, buffer_size)
+        os.replace(tmp_path, path[:-len(".gz")])
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    sizes = (os.path.getsize(path), os.path.getsize(path[:-len(".gz")]))
+    os.remove(path)
+    return sizes
+
+def compress_file(path, level=9, buffer_size=BUFFER_SIZE):
+    '''Compresses a file to a .gz file next to it and removes it, returns the size of the original and of the compressed file.
+    The file is compressed under a temporary name and then renamed, so an interrupted compression never leaves a truncated archive'''
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(path, 'rb') as uncomp_file, open(tmp_path, 'wb') as raw_file:
+            # The name stored in the archive is the one of the file, not the temporary one
+            with gzip.GzipFile(os.path.basename(path), "wb", compresslevel=level, fileobj=raw_file) as comp_file:
+                shutil.copyfileobj(uncomp_file, comp_file, buffer_size)
+        os.replace(tmp_path, path + ".gz")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    sizes = (os.path.getsize(path), os.path.getsize(path + ".gz"))
+    os.remove(path)
+    return sizes
+
+def find_files(folder, extensions):
+    '''Returns the files in the specified directory with one of the extensions, the largest first'''
+    paths = [os.path.join(root, file) for root, dirs, files in os.walk(folder) for file in files if file.endswith(extensions)]
+    return sorted(paths, key=os.path.getsize, reverse=True)
+
+def process_files(function, paths, jobs=1, **kwargs):
+    '''Runs the function on every file in a pool of jobs processes, submitted in the given order, or in this process if jobs is 1.
+    Prints the aggregate throughput and returns the total bytes read and written and the number of files that could not be processed'''
+    start = time.perf_counter()
+    bytes_in, bytes_out, failures = 0, 0, 0
+    def add_result(path, get_sizes):
+        nonlocal bytes_in, bytes_out, failures
+        try:
+            size_in, size_out = get_sizes()
+        except Exception as error:
+            print(f"Could not process {path}: {type(error).__name__}: {error}")
+            failures += 1
+            return
+        bytes_in += size_in
+        bytes_out += size_out
+    if jobs == 1:
+        for path in paths:
+            add_result(path, lambda: function(path, **kwargs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(function, path, **kwargs): path for path in paths}
+            for future in concurrent.futures.as_completed(futures):
+                add_result(futures[future], future.result)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"{len(paths)} files in {elapsed:.1f}s: {bytes_in / 2**20:.1f} MB in ({bytes_in / 2**20 / elapsed:.1f} MB/s), {bytes_out / 2**20:.1f} MB out ({bytes_out / 2**20 / elapsed:.1f} MB/s)"
+          + (f", {failures} failed" if failures else ""))
+    return bytes_in, bytes_out, failures
+
+def extract_files(folder, jobs=1, buffer_size=BUFFER_SIZE):
     '''Extracts all .gz files in the specified directory'''
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.endswith(".gz"):
-                with gzip.open(os.path.join(root, file), "rb") as comp_file:
-                    with open(os.path.join(root, file).replace(".gz", ""), 'wb') as uncomp_file:
-                        shutil.copyfileobj(comp_file, uncomp_file)
-                os.remove(os.path.join(root, file))
+    return process_files(extract_file, find_files(folder, ".gz"), jobs, buffer_size=buffer_size)
 
-def compress_files(folder):
+def compress_files(folder, jobs=1, level=9, buffer_size=BUFFER_SIZE):
     '''Compresses all .vnnlib and .onnx files in the specified directory'''
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.endswith(".vnnlib") or file.endswith(".onnx"):
-                with open(os.path.join(root, file), 'rb') as uncomp_file:
-                    with gzip.open(os.path.join(root, file) + ".gz", "wb") as comp_file:
-                        shutil.copyfileobj(uncomp_file, comp_file)
-                os.remove(os.path.join(root, file))
+    return process_files(compress_file, find_files(folder, (".vnnlib", ".onnx")), jobs, level=level, buffer_size=buffer_size)
+
+def read_instance_paths(instances_file):
+    '''Returns the paths of the .onnx and .vnnlib files referenced by an instances file (.csv or .csv.gz), without duplicates and in order.
+    The paths in the file are relative to its directory, the '.gz' extension is removed (see 'gen_instances.py --on_disk_paths')'''
+    folder = os.path.dirname(os.path.abspath(instances_file))
+    paths = {}
+    with (gzip.open(instances_file, 'rt', newline='') if instances_file.endswith(".gz") else open(instances_file, newline='')) as instances:
+        for row in csv.reader(instances):
+            for path in row[:2]:
+                paths[get_plain_path(os.path.normpath(os.path.join(folder, path.strip())))] = None
+    return list(paths)
+
+def extract_instance_files(instances_file, jobs=1, buffer_size=BUFFER_SIZE):
+    '''Extracts only the .gz files of the .onnx and .vnnlib files referenced by an instances file, the ones already extracted are skipped'''
+    paths = read_instance_paths(instances_file)
+    extracted = [path for path in paths if os.path.isfile(path)]
+    to_extract = sorted((path + ".gz" for path in paths if not os.path.isfile(path) and os.path.isfile(path + ".gz")), key=os.path.getsize, reverse=True)
+    missing = len(paths) - len(extracted) - len(to_extract)
+    print(f"{len(paths)} files referenced: {len(extracted)} already extracted, {len(to_extract)} to extract" + (f", {missing} not found" if missing else ""))
+    return process_files(extract_file, to_extract, jobs, buffer_size=buffer_size)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -40,6 +120,8 @@ To compress .vnnlib and .onnx files, use the compress mode.
 examples:
     python extract_compress_files_python.py --mode extract --architectures conv
     python extract_compress_files_python.py --mode compress 
+    python extract_compress_files_python.py --mode extract --jobs 8
+    python extract_compress_files_python.py --from-instances my_inst.csv
 
 or using the short versions:
     python extract_compress_files_python.py -m e -a conv
@@ -51,9 +133,23 @@ or using the short versions:
     formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
-    parser.add_argument('-m', '--mode', choices=['c', 'e'], type=str, help='Mode: c -> compress .onnx and .vnnlib files or e -> extract .gz files', required=True)
+    parser.add_argument('-m', '--mode', choices=['c', 'e'], type=str, help='Mode: c -> compress .onnx and .vnnlib files or e -> extract .gz files', required=False)
     parser.add_argument('-a', '--architectures', type=str, choices=["conv", "fc", "res"], help='Architecture to extract/compress, if not provided all architectures will be extracted/compressed', required=False)
+    parser.add_argument('-i', '--from-instances', type=str, help='Instances file generated by gen_instances.py, only the .onnx and .vnnlib files it references are extracted', required=False)
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes extracting/compressing the files, the largest files first, default is 1', required=False)
+    parser.add_argument('-l', '--level', type=int, choices=range(1, 10), default=9, metavar='{1..9}', help='Compression level of gzip, 1 is the fastest and 9 (the default) the smallest', required=False)
+    parser.add_argument('-b', '--buffer_size', type=int, default=BUFFER_SIZE // 1024, help=f'Size in KB of the buffer used to copy the files, default is {BUFFER_SIZE // 1024}', required=False)
     args = parser.parse_args()
+    buffer_size = args.buffer_size * 1024
+    if args.from_instances:
+        if args.mode == "c" or args.architectures:
+            parser.error("--from-instances only extracts files and can not be used with --mode c or --architectures")
+        print(f"Extracting the files referenced by {args.from_instances}")
+        if extract_instance_files(args.from_instances, args.jobs, buffer_size)[2] > 0:
+            sys.exit(1)
+        return
+    if not args.mode:
+        parser.error("the following arguments are required: -m/--mode (or -i/--from-instances)")
     folder = os.getcwd()
     if not "benchmarks_vnncomp" in folder:
         print("Are you sure you are in the correct folder? You should be in the benchmarks_vnncomp folder...")
@@ -62,12 +158,16 @@ or using the short versions:
         folder = os.path.join(folder, to_folder[args.architectures])
     if args.mode == "compress" or args.mode == "c":
         print(f"Compressing .vnnlib and .onnx files in {folder}")
-        compress_files(folder)
+        failures = compress_files(folder, args.jobs, args.level, buffer_size)[2]
     elif args.mode == "extract" or args.mode == "e":
         print(f"Extracting .gz files in {folder}")
-        extract_files(folder)
+        failures = extract_files(folder, args.jobs, buffer_size)[2]
     else:
         parser.print_help()
+        return
+    # The files that could not be processed were already printed, the exit code tells the callers (e.g. CI) that some failed
+    if failures > 0:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,15 @@
 import argparse
-import ast
+import contextlib
+import functools
+import gzip
+import itertools
 import os
-import random
-import pandas as pd
-import onnx
+import sys
+from catalog import ARCHITECTURE_DIRS, CATALOG_FILE, PROPERTY_COLUMNS, read_expected_results, get_expected_result, iter_instances_by_result, open_catalog, load_networks, load_expected_results, \
+    load_property_metrics
+from query_cache import QUERY_CACHE_DIR, QUERY_CACHE_SIZE, get_query_cache_key, read_cached_instances, cache_instances
+from query import SPEC_KEYS, BenchmarkCatalog, clean_outname, read_spec_file, write_suites, normalize_query, set_verbosity, verbose_print, load_nns_file, write_networks_file, filter_networks, iter_network_tuples, iter_catalog_network_tuples, \
+    iter_sample_instances, select_by_budget, shard_instances, uses_property_metrics, complete_property_metrics, filter_by_properties, sort_by_property, get_shard_file_path, count_items, write_instances, write_output_file
 
 
 def init_parser() -> argparse.ArgumentParser:
@@ -14,6 +20,8 @@ def init_parser() -> argparse.ArgumentParser:
     This script generates a CSV file with lines formatted as 'rel_path_to_net.onnx,rel_path_to_property.vnnlib,timeout', containing networks that match the specified criteria.
     
     To function properly, the script requires a CSV file named 'nns.csv' with the following columns: 'architecture', 'benchmark', 'onnx', 'node_types', 'n_params'.
+    The optional columns 'input_dim', 'output_dim', 'n_neurons', 'n_macs' and 'depth' (written by nns_indexer.py) estimate the cost of verifying each network,
+    a network with an empty value is removed by the filters on that column.
     You can substitute 'nns.csv' with any other CSV file that contains the same columns to use your own dataset.
     
     If the 'debug' flag is set, the script will create a file named 'filtered_nns.csv' containing the filtered dataset, allowing you to verify if the filtering based on architecture, benchmark and nodes is working as expected.
@@ -35,6 +43,12 @@ Generates a file containing networks that are NOT from the 'fullyconnected' arch
     
     py gen_instances.py --inarc "residual, fullyconnected" --exbench "cifar10, acasxu_2023"
 Generates a file containing networks that are from the 'residual' or 'fullyconnected' architectures, are NOT from the 'cifar10' or 'acasxu_2023' benchmarks and will be saved in the current directory as 'instances.csv'.
+
+    py gen_instances.py --max_disj 1 --max_radius 0.01 --sort n_inputs
+Generates a file containing the instances whose property has a single disjunct and an input box of radius at most 0.01, the properties with fewer inputs first, e.g. for a quick smoke suite.
+
+    py gen_instances.py --max_neu 5000 --max_macs 1000000
+Generates a file containing networks with at most 5000 nonlinear neurons and at most one million multiply-accumulate operations, e.g. to route them to the small verifier nodes.
     """
     )
     parser.add_argument('--innode', '-in', type=str, required=False, help="List of nodes that must be included in the dataset")
@@ -48,14 +62,57 @@ Generates a file containing networks that are from the 'residual' or 'fullyconne
 
     parser.add_argument('--max_par', '-Mp', type=int, required=False, default=-1, help="Maximum number of parameters for network")
     parser.add_argument('--min_par', '-mp', type=int, required=False, default=-1, help="Minimum number of parameters for network")
-
-    parser.add_argument('--maxprop', '-Mprop', type=int, required=False, default=50, help="Maximum number of properties for each network, default is 50 (maximum)")
+    parser.add_argument('--max_in', '-Mi', type=int, required=False, default=-1, help="Maximum input dimension (number of input elements) for network")
+    parser.add_argument('--min_in', '-mi', type=int, required=False, default=-1, help="Minimum input dimension (number of input elements) for network")
+    parser.add_argument('--max_out', '-Mo', type=int, required=False, default=-1, help="Maximum output dimension (number of output elements) for network")
+    parser.add_argument('--min_out', '-mo', type=int, required=False, default=-1, help="Minimum output dimension (number of output elements) for network")
+    parser.add_argument('--max_neu', '-Mn', type=int, required=False, default=-1, help="Maximum number of neurons of nonlinear nodes (ReLU, Sigmoid, MaxPool...) for network")
+    parser.add_argument('--min_neu', '-mn', type=int, required=False, default=-1, help="Minimum number of neurons of nonlinear nodes (ReLU, Sigmoid, MaxPool...) for network")
+    parser.add_argument('--max_macs', '-Mm', type=int, required=False, default=-1, help="Maximum number of multiply-accumulate operations (FLOPs / 2) of MatMul, Gemm and Conv nodes for network")
+    parser.add_argument('--min_macs', '-mm', type=int, required=False, default=-1, help="Minimum number of multiply-accumulate operations (FLOPs / 2) of MatMul, Gemm and Conv nodes for network")
+    parser.add_argument('--max_depth', '-Md', type=int, required=False, default=-1, help="Maximum depth (nodes on the longest path) for network")
+    parser.add_argument('--min_depth', '-md', type=int, required=False, default=-1, help="Minimum depth (nodes on the longest path) for network")
+
+    parser.add_argument('--max_vars', '-Mv', type=float, required=False, help="Maximum number of input variables of the property")
+    parser.add_argument('--min_vars', '-mv', type=float, required=False, help="Minimum number of input variables of the property")
+    parser.add_argument('--max_disj', '-Mdj', type=float, required=False, help="Maximum number of disjuncts of the property, 1 keeps only the single-disjunct properties")
+    parser.add_argument('--min_disj', '-mdj', type=float, required=False, help="Minimum number of disjuncts of the property")
+    parser.add_argument('--max_cons', '-Mc', type=float, required=False, help="Maximum number of output constraints of the property")
+    parser.add_argument('--min_cons', '-mc', type=float, required=False, help="Minimum number of output constraints of the property")
+    parser.add_argument('--max_logvol', '-Mlv', type=float, required=False, help="Maximum natural log of the volume of the input box of the property (over the inputs that are not fixed)")
+    parser.add_argument('--min_logvol', '-mlv', type=float, required=False, help="Minimum natural log of the volume of the input box of the property (over the inputs that are not fixed)")
+    parser.add_argument('--max_radius', '-Mr', type=float, required=False, help="Maximum radius (half-width) of the input box of the property, e.g. the epsilon of a robustness property")
+    parser.add_argument('--min_radius', '-mr', type=float, required=False, help="Minimum radius (half-width) of the input box of the property, e.g. the epsilon of a robustness property")
+    parser.add_argument('--sort', '-so', type=str, required=False, choices=PROPERTY_COLUMNS + ['-' + column for column in PROPERTY_COLUMNS], metavar='COLUMN',
+                        help=f"Sort the instances by a property column ({', '.join(PROPERTY_COLUMNS)}), prefix it with '-' for descending order (e.g. --sort=-max_radius).\n"
+                             "The property filters and the sort use the complexity recorded by 'catalog.py --properties', the missing ones are computed on the fly (this needs numpy)")
+
+    parser.add_argument('--maxprop', '-Mprop', type=int, required=False, default=-1, help="Maximum number of properties for each network, sampled at random, default is -1 (all of them)")
+    parser.add_argument('--seed', '-s', type=int, required=False, help="Seed of the '--maxprop' sampling, the same seed always generates the same instances")
+    parser.add_argument('--stratify', '-st', action='store_true', help="Flag to sample '--maxprop' instances for each expected result (sat, unsat and unknown) of each network")
+
+    parser.add_argument('--budget', '-b', type=float, required=False, default=-1, help="Maximum sum of the timeouts of the instances in seconds, the instances are picked to cover as many architectures, benchmarks, networks and node types as possible, default is -1 (no budget)")
+    parser.add_argument('--default_timeout', '-dt', type=float, required=False, default=300, help="Timeout in seconds of the instances without one, used by '--budget' and '--shards', default is 300")
+
+    parser.add_argument('--shards', '-k', type=int, required=False, default=1, help="Number of output files ('instances_1.csv', 'instances_2.csv', ...) to split the instances in, balanced by the sum of their timeouts, default is 1")
+    parser.add_argument('--keep_models_together', '-kmt', action='store_true', help="Flag to write all the instances of a network in the same shard")
 
     parser.add_argument('--result', '-r', type=str, required=False, choices=RESULTS, default='*', help="Filter the instances based on the expected result")
 
-    parser.add_argument('--outdir', '-od', type=str, required=False, default="./", help="Path to the desired output directory, default is the current directory (from where the script is executed)")
-    parser.add_argument('--outname', '-on', type=str, required=False, default="instances", help="Name of the output file, default is 'instances', the extension will always be '.csv'")
+    parser.add_argument('--outdir', '-od', type=str, required=False, default="./", help="Path to the desired output directory, default is the current directory (from where the script is executed).\nUse '-' to write the instances to the standard output, with paths relative to the current directory")
+    parser.add_argument('--outname', '-on', type=str, required=False, default="instances", help="Name of the output file, default is 'instances', the extension will always be '.csv' ('.csv.gz' with --gzip)")
+    parser.add_argument('--gzip', '-z', action='store_true', help="Flag to compress the output with gzip")
+    parser.add_argument('--sidecars', '-sc', action='store_true', help="Flag to add a fourth column with the path of the binary sidecar of each property, exported by 'property_sidecars.py'\n(empty if it was not exported), the timeout column is then always written")
+    parser.add_argument('--on_disk_paths', '-odp', action='store_true', help="Flag to write the path of each model and property as it is on disk, with the '.gz' extension if only the compressed file exists.\n"
+                                                                              "The paths work with the tools that read '.gz' files directly and with benchmark_io.py, which also opens the paths without '.gz'")
+
+    parser.add_argument('--spec', '-sp', type=str, required=False, help="Path to a JSON (or YAML) file with a list of suites to generate in one run, each suite is a dictionary with the same filters\nof the arguments (e.g. \"inarc\", \"maxprop\"), an \"outname\" and optionally an \"outdir\". The filters given as arguments apply to all the suites")
+    parser.add_argument('--catalog', '-c', type=str, required=False, default=CATALOG_FILE, help="Path to the catalog built by 'catalog.py', if it is missing or out of date the CSV files are parsed instead")
 
+    parser.add_argument('--explain', '-x', action='store_true', help="Flag to print the order in which the network filters are applied, with the number of networks before and after each filter and its elapsed time")
+    parser.add_argument('--cache_dir', '-cd', type=str, required=False, default=QUERY_CACHE_DIR, help="Path to the cache of the query results, a query repeated on the same data is read from it, default is '.query_cache' in the repository root")
+    parser.add_argument('--cache_size', '-cs', type=float, required=False, default=QUERY_CACHE_SIZE, help=f"Maximum size of the cache in MB, the least recently used results are removed first, default is {QUERY_CACHE_SIZE}")
+    parser.add_argument('--no_cache', '-nc', action='store_true', help="Flag to neither read nor write the cache. Queries sampling with '--maxprop' and no '--seed',\nor with bounds on the properties or '--sort', are never cached")
     parser.add_argument('--debug', '-d', action='store_true', help="Flag to enable debug mode, a file 'filtered_nns.csv' will be created with the filtered dataset")
     parser.add_argument('--verbosity', '-v', action='store_true', help="Flag to enable verbosity mode, the script will print more information")
     # TODO(AndyVale):
@@ -65,246 +122,15 @@ Generates a file containing networks that are from the 'residual' or 'fullyconne
 def get_args_as_dict(parser) -> dict:
     '''Parses the arguments and cast them to a proper datatype and then returns the arguments as a dictionary with the argument name as the key'''
     args = parser.parse_args()
-    dict_args = vars(args)
-    
-    # Split the strings, remove the whitespaces and cast them to lowercase
-    if dict_args['innode']:
-        dict_args['innode'] = dict_args['innode'].split(",")
-        dict_args['innode'] = [dict_args['innode'][i].strip().lower()  for i in range(len(dict_args['innode']))]
-    if dict_args['inbench']:
-        dict_args['inbench'] = dict_args['inbench'].split(",")
-        dict_args['inbench'] = [dict_args['inbench'][i].strip().lower()  for i in range(len(dict_args['inbench']))]
-    if dict_args['inarc']:
-        dict_args['inarc'] = dict_args['inarc'].split(",")
-        dict_args['inarc'] = [dict_args['inarc'][i].strip().lower()  for i in range(len(dict_args['inarc']))]
-
-    if dict_args['exnode']:
-        # With 'all' (*) keyword, the script will exclude all the nodes that are not in the 'innode' list
-        if(dict_args['exnode'].lower() == 'all' or dict_args['exnode'] == '*'):
-            dict_args['exnode'] = list(set(ONNX_NODES) - set(dict_args['innode']))# With 'all' keyword, the script will exclude all the nodes that are not in the 'innode' list
-        else:
-            dict_args['exnode'] = dict_args['exnode'].split(",")
-            dict_args['exnode'] = [dict_args['exnode'][i].strip().lower()  for i in range(len(dict_args['exnode']))]
-    if dict_args['exbench']:
-        dict_args['exbench'] = dict_args['exbench'].split(",")
-        dict_args['exbench'] = [dict_args['exbench'][i].strip().lower()  for i in range(len(dict_args['exbench']))]
-    if dict_args['exarc']:
-        dict_args['exarc'] = dict_args['exarc'].split(",")
-        dict_args['exarc'] = [dict_args['exarc'][i].strip().lower()  for i in range(len(dict_args['exarc']))]
-
-    # Cast the 'max_par' and 'min_par' is not needed since they are already in the correct datatype
-
-    return dict_args
-
-def check_emptiness (df: pd.DataFrame, lst: list, list_name:str, is_a_removal:bool) -> bool:
-    '''Check if the dataframe is empty or the list is empty, a verbose message is printed if so'''
-    if df.empty:
-        verbose_print('\tDataframe is already empty...')
-        return True
-    if lst is None or len(lst) == 0:
-        verbose_print(f'\t{list_name} to remove list is empty') if is_a_removal else verbose_print(f'\t{list_name} to keep list is empty')
-        return True
-    return False
-
-def keep_generalized(df: pd.DataFrame, lst: list, col_name: str) -> pd.DataFrame:
-    '''Keep only the rows in the DataFrame where the values in col_name are in lst'''
-    if check_emptiness(df, lst, col_name.capitalize(), False):
-        return df
-    verbose_print(f"\tKeeping only models with {col_name.lower()} in: ", lst)
-    
-    if col_name == 'node_types':
-        mask = df[col_name].apply(lambda nodes: all(node in [node.lower() for node in nodes] for node in lst))
-    else:
-        mask = df[col_name].str.lower().isin(lst)
-    return df[mask]
-
-def remove_generalized(df: pd.DataFrame, lst: list, col_name: str) -> pd.DataFrame:
-    '''Remove the rows in the DataFrame where the values in col_name are in lst'''
-    if check_emptiness(df, lst, col_name.capitalize(), True):
-        return df
-    verbose_print(f"\tRemoving models with {col_name.lower()} in: ", lst)
-    
-    if col_name == 'node_types':
-        mask = df[col_name].apply(lambda nodes: not any(node in [node.lower() for node in nodes] for node in lst))
-    else:
-        mask = ~df[col_name].str.lower().isin(lst)
-        
-    return df[mask]
-
-def keep_architectures(df: pd.DataFrame, arc_list: list) -> pd.DataFrame:
-    return keep_generalized(df, arc_list, 'architecture')
-
-def remove_architectures(df: pd.DataFrame, arc_list: list) -> pd.DataFrame:
-    return remove_generalized(df, arc_list, 'architecture')
-
-def keep_benchmarks(df: pd.DataFrame, bench_list: list) -> pd.DataFrame:
-    return keep_generalized(df, bench_list, 'benchmark')
-
-def remove_benchmarks(df: pd.DataFrame, bench_list: list) -> pd.DataFrame:
-    return remove_generalized(df, bench_list, 'benchmark')
-
-def keep_nodes(df: pd.DataFrame, node_list: list) -> pd.DataFrame:
-    return keep_generalized(df, node_list, 'node_types')
-
-def remove_nodes(df: pd.DataFrame, node_list: list) -> pd.DataFrame:
-    return remove_generalized(df, node_list, 'node_types')
-
-def param_range_filter(df: pd.DataFrame, min_par: int, max_par: int) -> pd.DataFrame:
-    '''Filter the dataframe based on the minimum and maximum number of parameters'''
-    if(min_par == -1 and max_par == -1):
-        verbose_print('\tNo n.param bounds needed...')
-        return df
-    if df.empty:
-        verbose_print('\tDataframe is empty, skipping parameter filter...')
-        return df
-    if(min_par > max_par):
-        verbose_print('\tError in n.parameter filter, min_par > max_par...')
-        return df
-    if min_par != -1:
-        verbose_print(f"\tRemoving networks with less than {min_par} parameters...")
-        df = df[df['n_params'] >= min_par]
-    if max_par != -1:
-        verbose_print(f"\tRemoving networks with more than {max_par} parameters...")
-        df = df[df['n_params'] <= max_par]
-    return df
-
-def filter_dataframe(df: pd.DataFrame, args: dict) -> pd.DataFrame:
-    '''Filter the dataset based on the arguments, it only consider 'inarc', 'exarc', 'inbench', 'exbench', 'innode', 'exnode', 'min_par', 'max_par' '''
-    verbose_print("\n-Filtering on architectures:\n")
-    df = keep_architectures(df, args['inarc']) #architecture_filter(df, 'inc', args['inarc'])
-    df = remove_architectures(df, args['exarc']) #architecture_filter(df, 'exc', args['exarc'])
-    verbose_print("\n-Filtering on benchmarks:\n")
-    df = keep_benchmarks(df, args['inbench']) #benchmode_filter(df, 'inc', args['inbench'])
-    df = remove_benchmarks(df, args['exbench']) #benchmode_filter(df, 'exc', args['exbench'])
-    verbose_print("\n-Filtering on nodes:\n")
-    df = keep_nodes(df, args['innode']) #nodemode_filter(df, 'inc', args['innode'])
-    df = remove_nodes(df, args['exnode']) #nodemode_filter(df, 'exc', args['exnode'])
-    verbose_print("\n-Filtering on parameters number:\n")
-    df = param_range_filter(df, args['min_par'], args['max_par'])
-    verbose_print("\n")
-    return df
-
-def load_nns_dataframe(file_path: str) -> pd.DataFrame:
-    '''Reads the CSV file and converts the 'node_types' column to a list of strings'''
-    df = pd.read_csv(file_path)
-    df['node_types'] = df['node_types'].apply(ast.literal_eval)
-    return df
-
-def get_instances_path(ser: pd.Series) -> str:
-    '''Convert the series to "instances.csv" file's path in the associated repository with the parametr, this can be done looking at architecture and benchmark columns'''
-    path = ''
-    if ser.empty:
-        raise ValueError('Series is empty')
-
-    if(ser['architecture'] is None or ser['benchmark'] is None):
-        raise ValueError('One of the columns is empty')
-    
-    if(ser['architecture'] == 'fullyconnected'):
-        path = os.path.join(path, 'fullyconnected_benchmarks_vnncomp')
-    elif(ser['architecture'] == 'convolutional'):
-        path = os.path.join(path, 'convolutional_benchmarks_vnncomp')
-    elif(ser['architecture'] == 'residual'):
-        path = os.path.join(path, 'residual_benchmarks_vnncomp')
-    else:
-        raise ValueError('Architecture is not recognized')
-    
-    path = os.path.join(path, ser['benchmark'])
-    if os.path.exists(path):
-        path = os.path.join(path, 'instances.csv')
-        if(os.path.isfile(path)):
-            return path
-        else:
-            raise ValueError('Path does not contain instances.csv')
-    else:
-        raise ValueError('Path does not exist')
-
-def get_network_tuples(nets_df: pd.Series, dict_args:dict) -> list:
-    '''Get all tuples for the network in the series from the instances.csv files.
-    The tuples are a dictionary with the following keys: 'rel_path_to_onnx', 'rel_path_to_property.vnnlib', 'onnx', 'vnnlib', 'timeout' '''
-    network_tuples = []
-    for _, net in nets_df.iterrows():#For each neural network in the filtered dataframe
-        i_path = get_instances_path(net)
-        with open(i_path) as benchmark_instance_file:
-            # Get all tuples foreach neural network
-            lines = benchmark_instance_file.readlines()
-        for line in lines:
-            if net['onnx'] in line:
-                benchmark_name = os.path.dirname(i_path)
-                from_bench_to_onnx_path, from_bench_to_vnnlib_path, timeout = line.split(',') if len(line.split(',')) == 3 else line.split(',') + [None]
-                fields = {'rel_path_to_onnx': None, 'rel_path_to_property.vnnlib': None, 'onnx': None, 'vnnlib': None, 'timeout': None}
-                #relative path to get in benchmarks_vnncomp + benchmark + path to onnx
-                fields['rel_path_to_onnx'] = os.path.join(os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=dict_args['outdir']), benchmark_name, from_bench_to_onnx_path)
-                #relative path to get in benchmarks_vnncomp + benchmark + path to vnnlib
-                fields['rel_path_to_property.vnnlib'] = os.path.join(os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=dict_args['outdir']), benchmark_name, from_bench_to_vnnlib_path)
-                fields['onnx'] = from_bench_to_onnx_path
-                fields['vnnlib'] = from_bench_to_vnnlib_path
-                fields['timeout'] = timeout
-                network_tuples.append(fields)
-    return network_tuples
-
-def filter_instances_by_result(network_tuples: list, expected_result: str) -> list:
-    ''''Filter the instances based on the expected result looking at the expected_results.csv file, it returns a new list'''
-    if expected_result == '*':
-        return network_tuples
-    
-    expected_results_df = pd.read_csv(EXPECTED_RESULTS_FILE)
-    if arg_dict['result'] == 'known':
-        verbose_print(f"Keeping only instances with known results")
-        local_network_tuples = [line for line in network_tuples if not expected_results_df[(expected_results_df['onnx'] == line['onnx']) & (expected_results_df['vnnlib'] == line['vnnlib'])].empty]
-    else:
-        verbose_print(f"Keeping instances with expected result {arg_dict['result']}")
-        local_network_tuples = [line for line in network_tuples if not expected_results_df[(expected_results_df['onnx'] == line['onnx']) & (expected_results_df['vnnlib'] == line['vnnlib']) & (expected_results_df['result'] == arg_dict['result'])].empty]
-
-    return local_network_tuples
-
-def sample_instances(network_tuples: list, max_properties: int) -> list:
-    '''Sample the instances based on the maximum number of properties for each network, it returns a new list'''
-    # After filtering the instances, take only the first 'maxprop' instances for each networks: this can be done efficiently because the instances are ordered by the onnx name
-    if max_properties == 50:
-        verbose_print(f"Keeping all instances for each network")
-        return network_tuples
-    
-    tmp_network_tuples_list = [] # TODO : reafactor this part
-    tmp_instance_list = [network_tuples[0]] if len(network_tuples) > 0 else []
-    for i in range(1, len(network_tuples)):
-        #if the name of the network is different from the previous one get a random sample
-        if network_tuples[i]['onnx'] != network_tuples[i-1]['onnx']:
-            verbose_print(f"Adding a sample of {min(len(tmp_instance_list), max_properties)} instances for network {network_tuples[i-1]['onnx']}")
-            tmp_network_tuples_list += random.sample(tmp_instance_list, min(len(tmp_instance_list), max_properties))
-            tmp_instance_list = []
-        tmp_instance_list.append(network_tuples[i])
-    # Add the last network
-    if len(tmp_instance_list) > 0:
-        tmp_network_tuples_list += random.sample(tmp_instance_list, min(len(tmp_instance_list), max_properties))
-        verbose_print(f"Adding a sample of {min(len(tmp_instance_list), max_properties)} instances for network {network_tuples[i-1]['onnx']}")
-    return tmp_network_tuples_list
-
-def write_output_file(dict_args: dict, network_tuples: list) -> None:
-    '''Writes the list of network tuples to the output file in the format 'rel_path_to_onnx,rel_path_to_property.vnnlib,timeout(not mandatory)' '''
-    # Remove the output file if it already exists
-    output_file_path = os.path.join(dict_args['outdir'], dict_args['outname'])
-    if(os.path.isfile(output_file_path)):
-        verbose_print(f"Removing the existing output file {output_file_path}")
-        os.remove(output_file_path)
-
-    # if the outdir does not exist, create it
-    if not os.path.exists(dict_args['outdir']):
-        verbose_print(f"Creating the output directory {dict_args['outdir']}")
-        os.makedirs(dict_args['outdir'])
-    
-    # Finally write the filtered instances to the output file
-    with open(output_file_path, 'w') as output_file:
-        for net_tuple in network_tuples:
-            row = [net_tuple['rel_path_to_onnx'], net_tuple['rel_path_to_property.vnnlib'], net_tuple['timeout']] if net_tuple['timeout'] else [net_tuple['rel_path_to_onnx'], net_tuple['rel_path_to_property.vnnlib']]
-            csv_line = ','.join(row).replace('\\', '/').replace('\n', '')
-            output_file.write(csv_line + '\n')
+    # Split the strings, remove the whitespaces and cast them to lowercase, with 'all' (*) in 'exnode' all the nodes that are not in 'innode' are excluded
+    return normalize_query(vars(args))
 
 if __name__ == '__main__':
     # Define a bunch of constants
     BENCHMARKS_VNNCOMP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    FULLYCONNECTED_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'fullyconnected_benchmarks_vnncomp')
-    CONVOLUTIONAL_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'convolutional_benchmarks_vnncomp')
-    RESIDUAL_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'residual_benchmarks_vnncomp')
+    FULLYCONNECTED_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS['fullyconnected'])
+    CONVOLUTIONAL_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS['convolutional'])
+    RESIDUAL_BENCHMARKS_VNNCOMP_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS['residual'])
     EXPECTED_RESULTS_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'expected_results.csv')
     NEURAL_NETWORKS_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'nns.csv')
     DEBUG_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, 'filtered_nns.csv')
@@ -319,12 +145,11 @@ if __name__ == '__main__':
         exit(1)
 
     if not os.path.isdir(FULLYCONNECTED_BENCHMARKS_VNNCOMP_DIR) or not os.path.isdir(CONVOLUTIONAL_BENCHMARKS_VNNCOMP_DIR) or not os.path.isdir(RESIDUAL_BENCHMARKS_VNNCOMP_DIR):
-        print(f"This script requires the directories 'fullyconnected_benchmarks_vnncomp', 'convolutional_benchmarks_vnncomp' and 'residual_benchmarks_vnncomp' to be in the same directory as the script")
+        print(f"This script requires the directories '{ARCHITECTURE_DIRS['fullyconnected']}', '{ARCHITECTURE_DIRS['convolutional']}' and '{ARCHITECTURE_DIRS['residual']}' to be in the same directory as the script")
         exit(1)
 
     # Define some lists 
     ARCHITECTURES = ['convolutional', 'fullyconnected', 'residual']
-    ONNX_NODES = sorted([schema.name.lower() for schema in onnx.defs.get_all_schemas()]) # Get all the ONNX nodes and convert them to lowercase
     BENCHMARKS = sorted(set(net.lower() for path in [FULLYCONNECTED_BENCHMARKS_VNNCOMP_DIR, CONVOLUTIONAL_BENCHMARKS_VNNCOMP_DIR, RESIDUAL_BENCHMARKS_VNNCOMP_DIR]
                             for net in os.listdir(path) if os.path.isdir(os.path.join(path, net))))# Get all the benchmarks and convert them to lowercase
     RESULTS = ['sat', 'unsat', 'known', '*']
@@ -332,48 +157,155 @@ if __name__ == '__main__':
     # Parser setup
     parser = init_parser()
     arg_dict = get_args_as_dict(parser)
-    arg_dict['outdir'] = os.path.abspath(arg_dict['outdir'])
-    print(f"Output directory: {arg_dict['outdir']}")
-    # Remove extension
-    arg_dict['outname'] = os.path.splitext(arg_dict['outname'])[0]
-    arg_dict['outname'] = arg_dict['outname'].replace('/','').replace('\\','').replace('.','').replace('..','').replace(':','').replace(' ','_').replace('<','').replace('>','').replace('"','').replace('|','').replace('?','').replace('*','').strip()
-    arg_dict['outname'] = arg_dict['outname'] + '.csv'
-    print(f"Output file name: {arg_dict['outname']}")
-    os.chdir(os.path.dirname(__file__))
-    if arg_dict['verbosity']:
-        def verbose_print(*args):
-            print(*args)
+    to_stdout = arg_dict['outdir'] == '-'
+    if arg_dict['shards'] < 1 or (arg_dict['shards'] > 1 and (to_stdout or arg_dict['spec'])):
+        print("'--shards' must be at least 1 and it can not be used with '--spec' or with the standard output")
+        exit(1)
+    if arg_dict['spec']:
+        if to_stdout:
+            print("The suites of '--spec' can not be written to the standard output")
+            exit(1)
+        try:
+            suites = read_spec_file(arg_dict['spec'])
+        except (OSError, ValueError) as error:
+            print(f"Invalid spec file: {error}")
+            exit(1)
+        # Output directories in the spec file are relative to the current directory, as '--outdir'
+        for suite in suites:
+            if 'outdir' in suite:
+                suite['outdir'] = os.path.abspath(suite['outdir'])
+    if to_stdout:
+        # The standard output only gets the instances, all the messages go to the standard error
+        output_stream = sys.stdout
+        sys.stdout = sys.stderr
+    arg_dict['outdir'] = os.path.abspath('./' if to_stdout else arg_dict['outdir'])
+    arg_dict['catalog'] = os.path.abspath(arg_dict['catalog'])
+    arg_dict['cache_dir'] = os.path.abspath(arg_dict['cache_dir'])
+    if to_stdout:
+        print(f"Output: standard output, paths relative to {arg_dict['outdir']}")
     else:
-        verbose_print = lambda *a: None
-
-    # Initialize the neural networks dataframe
-    nns_df = load_nns_dataframe(NEURAL_NETWORKS_FILE)
-
-    # Filter the neural networks dataframe based on the dictionary containing the arguments
-    filtered_nn_df = filter_dataframe(nns_df, arg_dict)
-    if(arg_dict['debug']):
-        verbose_print(f"Writing the filtered dataset to {DEBUG_FILE}")
-        filtered_nn_df.to_csv(DEBUG_FILE, index=False)
-
-    # Get the instances for the filtered networks
-    network_tuples = get_network_tuples(filtered_nn_df, arg_dict) 
-    if len(network_tuples) == 0:
+        print(f"Output directory: {arg_dict['outdir']}")
+        # Remove extension
+        arg_dict['outname'] = clean_outname(arg_dict['outname'], arg_dict['gzip'])
+        if not arg_dict['spec']:
+            print(f"Output file name: {arg_dict['outname']}")
+        output_file_path = os.path.join(arg_dict['outdir'], arg_dict['outname'])
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    set_verbosity(arg_dict['verbosity'])
+
+    # Batch mode: all the suites are answered from the same session
+    if arg_dict['spec']:
+        catalog_conn = open_catalog(arg_dict['catalog'], NEURAL_NETWORKS_FILE, EXPECTED_RESULTS_FILE)
+        if catalog_conn is None and os.path.isfile(arg_dict['catalog']):
+            print(f"The catalog {arg_dict['catalog']} is out of date, run 'python catalog.py' to rebuild it: parsing the CSV files instead")
+        elif catalog_conn is not None:
+            catalog_conn.close()
+        session = BenchmarkCatalog.load(arg_dict['catalog'], NEURAL_NETWORKS_FILE, EXPECTED_RESULTS_FILE)
+        defaults = {key: arg_dict[key] for key in SPEC_KEYS if key != 'outname'}
+        try:
+            results = write_suites(session, suites, defaults)
+        except ValueError as error:
+            print(error)
+            exit(1)
+        for output_file_path, n_written in results.items():
+            if isinstance(n_written, Exception):
+                print(f"{output_file_path}: failed, {n_written}")
+            else:
+                print(f"{output_file_path}: {n_written} instances" if n_written > 0 else f"{output_file_path}: no instances found, not written")
+        exit(1 if any(isinstance(n_written, Exception) for n_written in results.values()) else 0)
+
+    # Repeated queries on the same data are read from the cache, filtering is skipped entirely
+    counts = None
+    cache_key = None if arg_dict['no_cache'] or arg_dict['debug'] or arg_dict['explain'] else get_query_cache_key(arg_dict, NEURAL_NETWORKS_FILE, EXPECTED_RESULTS_FILE)
+    cached_tuples = read_cached_instances(cache_key, arg_dict['outdir'], arg_dict['cache_dir']) if cache_key else None
+    if cached_tuples is not None:
+        verbose_print(f"Reading the instances from the query cache {arg_dict['cache_dir']}")
+        network_tuples = iter(cached_tuples)
+    else:
+        counts = {}
+        # Initialize the neural networks list, from the catalog if it is available
+        catalog_conn = open_catalog(arg_dict['catalog'], NEURAL_NETWORKS_FILE, EXPECTED_RESULTS_FILE)
+        if catalog_conn is None:
+            if os.path.isfile(arg_dict['catalog']):
+                print(f"The catalog {arg_dict['catalog']} is out of date, run 'python catalog.py' to rebuild it: parsing the CSV files instead")
+            networks = load_nns_file(NEURAL_NETWORKS_FILE)
+        else:
+            verbose_print(f"Reading the networks from the catalog {arg_dict['catalog']}")
+            networks = load_networks(catalog_conn)
+
+        # Filter the neural networks based on the dictionary containing the arguments
+        filtered_networks = filter_networks(networks, arg_dict, explain=arg_dict['explain'])
+        if(arg_dict['debug']):
+            verbose_print(f"Writing the filtered dataset to {DEBUG_FILE}")
+            write_networks_file(DEBUG_FILE, filtered_networks)
+
+        # Build the pipeline: the instances of the filtered networks are read, filtered on the expected result and sampled one at a time while the output is written
+        if arg_dict['result'] != '*' or arg_dict['stratify']:
+            expected_results = read_expected_results(EXPECTED_RESULTS_FILE) if catalog_conn is None else load_expected_results(catalog_conn)
+        network_tuples = iter_network_tuples(filtered_networks, arg_dict['outdir']) if catalog_conn is None else iter_catalog_network_tuples(catalog_conn, filtered_networks, arg_dict['outdir'])
+        network_tuples = count_items(network_tuples, counts, 'found')
+        if uses_property_metrics(arg_dict):
+            # The complexity of the properties missing from the catalog is computed for all the candidates at once, so the pipeline is materialized here
+            property_metrics = load_property_metrics(catalog_conn) if catalog_conn is not None else {}
+            network_tuples = list(network_tuples)
+            complete_property_metrics(network_tuples, property_metrics)
+            network_tuples = count_items(filter_by_properties(network_tuples, arg_dict, property_metrics), counts, 'property')
+        if arg_dict['result'] != '*':
+            verbose_print(f"Keeping only instances with known results") if arg_dict['result'] == 'known' else verbose_print(f"Keeping instances with expected result {arg_dict['result']}")
+            network_tuples = count_items(iter_instances_by_result(network_tuples, arg_dict['result'], expected_results), counts, 'result')
+        stratum = None
+        if arg_dict['stratify']:
+            verbose_print(f"Sampling at most {arg_dict['maxprop']} instances for each expected result of each network")
+            stratum = functools.partial(get_expected_result, expected_results)
+        network_tuples = iter_sample_instances(network_tuples, arg_dict['maxprop'], arg_dict['seed'], stratum)
+        if arg_dict['budget'] != -1:
+            # The selection needs all the candidates, so the pipeline is materialized here
+            network_tuples = count_items(network_tuples, counts, 'sampled')
+            network_tuples = iter(select_by_budget(network_tuples, arg_dict['budget'], arg_dict['default_timeout']))
+        if arg_dict['sort']:
+            network_tuples = iter(sort_by_property(list(network_tuples), arg_dict['sort'], property_metrics))
+
+        if cache_key:
+            network_tuples = cache_instances(network_tuples, cache_key, arg_dict['cache_dir'], arg_dict['cache_size'])
+
+    # Nothing is written if no instance matches the filters
+    first_tuple = next(network_tuples, None)
+    if first_tuple is None and (counts is None or counts['found'] == 0):
         print(f"No instances found for given filters")
         exit(0)
-    print(f"A total of {len(network_tuples)} instances were found for the given filters")
-
-    # Filter them based on the expected result
-    network_tuples = filter_instances_by_result(network_tuples, arg_dict['result'])
-    if len(network_tuples) == 0:
+    if first_tuple is None and counts.get('property') == 0:
+        print(f"A total of {counts['found']} instances were found for the given filters")
+        print(f"No instances found for given property bounds")
+        exit(0)
+    if first_tuple is None and arg_dict['result'] != '*' and counts['result'] == 0:
+        print(f"A total of {counts['found']} instances were found for the given filters")
         print(f"No instances found for given expected result")
         exit(0)
-    if(arg_dict['result'] != '*'):
-        print(f"A total of {len(network_tuples)} instances were found for the given expected result")
-
-    # Filter the instances based on the maximum number of properties
-    network_tuples = sample_instances(network_tuples, arg_dict['maxprop'])
-    if(arg_dict['maxprop'] != 50):
-        print(f"A total of {len(network_tuples)} instances were found limited by {arg_dict['maxprop']} number of properties for each network")
 
     # Write the output file
-    write_output_file(arg_dict, network_tuples)
\ No newline at end of file
+    network_tuples = itertools.chain([first_tuple], network_tuples) if first_tuple is not None else network_tuples
+    if to_stdout:
+        with gzip.open(output_stream.buffer, 'wt', newline='') if arg_dict['gzip'] else contextlib.nullcontext(output_stream) as output_file:
+            n_written = write_instances(output_file, network_tuples, arg_dict['sidecars'], arg_dict['on_disk_paths'])
+        output_stream.flush()
+    elif arg_dict['shards'] > 1:
+        shards = shard_instances(network_tuples, arg_dict['shards'], arg_dict['default_timeout'], arg_dict['keep_models_together'])
+        n_written = 0
+        for i, (total_timeout, shard) in enumerate(shards):
+            n_written += write_output_file(get_shard_file_path(output_file_path, i), shard, arg_dict['sidecars'], arg_dict['on_disk_paths'])
+            print(f"Shard {i + 1}: {len(shard)} instances, estimated makespan {total_timeout:g} seconds")
+        print(f"Estimated makespan {max(total for total, _ in shards):g} seconds, the lower bound is {sum(total for total, _ in shards) / len(shards):g} seconds")
+    else:
+        n_written = write_output_file(output_file_path, network_tuples, arg_dict['sidecars'], arg_dict['on_disk_paths'])
+    if counts is None:
+        print(f"A total of {n_written} instances were read from the query cache")
+        exit(0)
+    print(f"A total of {counts['found']} instances were found for the given filters")
+    if 'property' in counts:
+        print(f"A total of {counts['property']} instances were found for the given property bounds")
+    if(arg_dict['result'] != '*'):
+        print(f"A total of {counts['result']} instances were found for the given expected result")
+    if(arg_dict['maxprop'] != -1):
+        print(f"A total of {n_written if arg_dict['budget'] == -1 else counts['sampled']} instances were found limited by {arg_dict['maxprop']} number of properties for each network")
+    if(arg_dict['budget'] != -1):
+        print(f"A total of {n_written} instances were picked for the budget of {arg_dict['budget']:g} seconds")
@@ -0,0 +1,228 @@
+import argparse
+import concurrent.futures
+import hashlib
+import importlib.util
+import json
+import os
+from catalog import BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS, COST_COLUMNS, NEURAL_NETWORKS_FILE
+from onnx_scanner import scan_onnx, read_skeleton
+from query import write_networks_file
+
+# State of the last run: for each model file its size, modification time, hash, node types and number of parameters
+INDEX_STATE_FILE = os.path.join(BENCHMARKS_VNNCOMP_DIR, '.nns_index.json')
+INDEX_STATE_VERSION = 2
+# Operators whose outputs are counted as neurons in 'n_neurons', the ones a verifier has to relax or split on
+NONLINEAR_NODES = {'Relu', 'LeakyRelu', 'PRelu', 'Elu', 'Selu', 'Celu', 'Sigmoid', 'HardSigmoid', 'HardSwish', 'Tanh', 'Softplus', 'Softsign', 'Gelu', 'Mish',
+                   'Clip', 'Sign', 'Softmax', 'LogSoftmax', 'MaxPool', 'Sin', 'Cos', 'Exp', 'Log', 'Pow'}
+
+
+def find_models(benchmarks_dir: str = BENCHMARKS_VNNCOMP_DIR) -> list:
+    '''Returns (architecture, benchmark, onnx, path) for every model in the 'onnx' directory of every benchmark, onnx is the path relative to that directory
+    without the '.gz' extension. If a model is there both compressed and not, the uncompressed file is used'''
+    models = {}
+    for architecture, architecture_dir in sorted(ARCHITECTURE_DIRS.items()):
+        architecture_path = os.path.join(benchmarks_dir, architecture_dir)
+        if not os.path.isdir(architecture_path):
+            continue
+        for benchmark in sorted(os.listdir(architecture_path)):
+            onnx_dir = os.path.join(architecture_path, benchmark, 'onnx')
+            for root, _, files in os.walk(onnx_dir):
+                for file_name in files:
+                    if not file_name.endswith(('.onnx', '.onnx.gz')):
+                        continue
+                    path = os.path.join(root, file_name)
+                    onnx = os.path.relpath(path, onnx_dir).replace('\\', '/').removesuffix('.gz')
+                    if (architecture, benchmark, onnx) not in models or not file_name.endswith('.gz'):
+                        models[(architecture, benchmark, onnx)] = path
+    return [(architecture, benchmark, onnx, path) for (architecture, benchmark, onnx), path in sorted(models.items())]
+
+def hash_file(path: str) -> str:
+    '''Returns the sha1 of the content of the file'''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as model_file:
+        for chunk in iter(lambda: model_file.read(2**20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def count_elements(shape) -> int:
+    '''Returns the number of elements of a shape, the unknown dimensions (e.g. the batch size) count as 1. None if the shape is unknown'''
+    if shape is None:
+        return None
+    size = 1
+    for dim in shape:
+        size *= dim if dim is not None and dim > 0 else 1
+    return size
+
+def get_cost_metrics(model) -> dict:
+    '''Returns the cost columns of a model after shape inference: the number of elements of its inputs ('input_dim') and outputs ('output_dim'),
+    the outputs of its nonlinear nodes ('n_neurons'), the multiply-accumulate operations of its MatMul, Gemm, Conv and ConvTranspose nodes ('n_macs')
+    and the number of nodes on its longest path ('depth'). Only the main graph is considered, the tensors whose shape could not be inferred are skipped'''
+    graph = model.graph
+    shapes = {}
+    for value_info in list(graph.input) + list(graph.value_info) + list(graph.output):
+        tensor_type = value_info.type.tensor_type
+        if tensor_type.HasField('shape'):
+            shapes[value_info.name] = [dim.dim_value if dim.HasField('dim_value') else None for dim in tensor_type.shape.dim]
+    initializers = set()
+    for initializer in graph.initializer:
+        shapes[initializer.name] = list(initializer.dims)
+        initializers.add(initializer.name)
+
+    metrics = {'input_dim': sum(count_elements(shapes.get(value_info.name)) or 0 for value_info in graph.input if value_info.name not in initializers),
+               'output_dim': sum(count_elements(shapes.get(value_info.name)) or 0 for value_info in graph.output),
+               'n_neurons': 0, 'n_macs': 0}
+    depths = {}
+    for node in graph.node:
+        outputs = [count_elements(shapes.get(output)) for output in node.output if output]
+        inputs = [shapes.get(name) for name in node.input]
+        if node.op_type in NONLINEAR_NODES and outputs and outputs[0] is not None:
+            metrics['n_neurons'] += outputs[0]
+        if node.op_type in ('MatMul', 'Gemm') and outputs and outputs[0] is not None and inputs and inputs[0]:
+            trans_a = any(attribute.name == 'transA' and attribute.i for attribute in node.attribute)
+            inner = inputs[0][0 if node.op_type == 'Gemm' and trans_a else -1]
+            metrics['n_macs'] += outputs[0] * (inner or 1)
+        elif node.op_type in ('Conv', 'ConvTranspose') and len(inputs) > 1 and inputs[1] and outputs and outputs[0] is not None:
+            # Weights [M, C/group, k1, k2, ...] for Conv and [C, M/group, k1, k2, ...] for ConvTranspose, each output (input) element takes C/group * k1 * k2 * ... MACs
+            kernel = count_elements(inputs[1][1:])
+            metrics['n_macs'] += (outputs[0] if node.op_type == 'Conv' else count_elements(inputs[0]) or 0) * kernel
+        depth = 0 if node.op_type == 'Constant' else 1 + max((depths.get(name, 0) for name in node.input), default=0)
+        for output in node.output:
+            depths[output] = depth
+    metrics['depth'] = max((depths.get(value_info.name, 0) for value_info in graph.output), default=0)
+    return metrics
+
+def read_cost_metrics(path: str) -> dict:
+    '''Runs the ONNX shape inference on the model without its weights and returns its cost columns, see get_cost_metrics.
+    The symbolic dimensions of the inputs (e.g. the batch size) are set to 1, as in a verification query, so that shapes like the ones of a flatten can be inferred'''
+    import onnx # Imported here since only the worker processes need it
+    model = onnx.load_from_string(read_skeleton(path))
+    for value_info in model.graph.input:
+        for dim in value_info.type.tensor_type.shape.dim:
+            if not dim.HasField('dim_value'):
+                dim.dim_value = 1
+    return get_cost_metrics(onnx.shape_inference.infer_shapes(model, data_prop=True))
+
+def index_model(path: str, known_hash: str, with_costs: bool) -> dict:
+    '''Hashes the model and parses it only if the hash is not known_hash, runs in a worker process. Returns a dictionary with the 'hash' and,
+    if the model was parsed, its 'node_types', 'n_params' and, with with_costs, the cost columns (or the 'error' raised parsing it).
+    If only the shape inference fails, the model is kept with None cost columns and the 'cost_error' raised by it'''
+    entry = {'hash': hash_file(path)}
+    if entry['hash'] != known_hash:
+        try:
+            model = scan_onnx(path)
+            entry['node_types'], entry['n_params'] = model['node_types'], model['n_params']
+        except Exception as error:
+            entry['error'] = f'{type(error).__name__}: {error}'
+            return entry
+        if with_costs:
+            try:
+                entry.update(read_cost_metrics(path))
+            except Exception as error:
+                entry.update(dict.fromkeys(COST_COLUMNS))
+                entry['cost_error'] = f'{type(error).__name__}: {error}'
+    return entry
+
+def read_state(state_path: str) -> dict:
+    '''Returns the entries of the state file, an empty dictionary if it is missing or from another version'''
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return state['models'] if state.get('version') == INDEX_STATE_VERSION else {}
+
+def write_json_atomically(path: str, content: dict) -> None:
+    '''Writes the content to a temporary file, then replaces path with it'''
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as tmp_file:
+        json.dump(content, tmp_file)
+    os.replace(tmp_path, path)
+
+def index_models(output_path: str = NEURAL_NETWORKS_FILE, state_path: str = INDEX_STATE_FILE, jobs: int = None, full: bool = False) -> dict:
+    '''Regenerates the networks file from the models in the benchmark directories. Only the models whose size or modification time changed since the
+    last run are hashed, and only the ones whose hash changed are parsed, in a pool of jobs processes. The cost columns need the onnx package for the
+    shape inference, without it they are left empty (and computed by the first run with it). Returns some statistics about the run'''
+    previous_state = read_state(state_path)
+    state = {} if full else previous_state
+    with_costs = importlib.util.find_spec('onnx') is not None
+    if not with_costs:
+        print("The onnx package is not installed, the cost columns (" + ', '.join(COST_COLUMNS) + ") are left empty")
+    # Without the cost columns the entries are parsed again, unless they can not be computed anyway
+    state = {key: entry for key, entry in state.items() if not with_costs or 'n_macs' in entry}
+    models = [(os.path.relpath(path, BENCHMARKS_VNNCOMP_DIR).replace('\\', '/'), architecture, benchmark, onnx, path) for architecture, benchmark, onnx, path in find_models()]
+    if len(models) == 0:
+        raise ValueError(f"No models found in {', '.join(ARCHITECTURE_DIRS.values())}, are the submodules checked out?")
+    new_state, to_index = {}, []
+    for key, _, _, _, path in models:
+        stat = os.stat(path)
+        entry = state.get(key)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            new_state[key] = entry
+        else:
+            to_index.append((key, path, stat))
+
+    stats = {'models': len(models), 'unchanged': len(models) - len(to_index), 'rehashed': 0, 'parsed': 0, 'failed': 0, 'removed': len(set(state) - {key for key, *_ in models})}
+    # The largest models first, so that they do not end up alone at the end of the run
+    to_index.sort(key=lambda item: item[2].st_size, reverse=True)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(index_model, path, state.get(key, {}).get('hash'), with_costs): (key, path, stat) for key, path, stat in to_index}
+        for future in concurrent.futures.as_completed(futures):
+            key, path, stat = futures[future]
+            entry = future.result()
+            if 'error' in entry:
+                # The entry of the previous run, if any, is kept so that a transient failure does not remove the network from the networks file.
+                # Its size and modification time no longer match, so the model is parsed again by the next run
+                print(f"Could not parse {path}: {entry['error']}" + (", keeping its previous entry" if key in previous_state else ""))
+                stats['failed'] += 1
+                if key in previous_state:
+                    new_state[key] = previous_state[key]
+                continue
+            if 'cost_error' in entry:
+                print(f"Could not infer the shapes of {path}, its cost columns are left empty: {entry.pop('cost_error')}")
+            if 'node_types' not in entry:
+                # Same content, only the modification time changed
+                entry = {**state[key], **entry}
+                stats['rehashed'] += 1
+            else:
+                stats['parsed'] += 1
+            new_state[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **entry}
+
+    networks = []
+    for key, architecture, benchmark, onnx, _ in models:
+        entry = new_state.get(key)
+        if entry is not None:
+            networks.append({'architecture': architecture, 'benchmark': benchmark, 'onnx': onnx, 'node_types': entry['node_types'], 'n_params': entry['n_params'],
+                             **{column: entry.get(column) for column in COST_COLUMNS}})
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    write_networks_file(tmp_path, networks)
+    os.replace(tmp_path, output_path)
+    write_json_atomically(state_path, {'version': INDEX_STATE_VERSION, 'models': new_state})
+    stats['networks'] = len(networks)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=
+"""Description:
+    This script regenerates 'nns.csv' from the ONNX models (.onnx or .onnx.gz) in the 'onnx' directory of every benchmark of the submodules,
+    reading their node types and number of parameters straight from the protobuf encoding (the weights are never loaded).
+    The cost columns (input and output dimension, nonlinear neurons, MACs and depth) come from the ONNX shape inference and need the onnx package.
+    The runs are incremental: '.nns_index.json' records the models indexed by the previous run, and only the models that changed since then are parsed again.
+""",
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--output', '-o', type=str, required=False, default=NEURAL_NETWORKS_FILE, help="Path of the networks file to write, default is 'nns.csv' in the repository root")
+    parser.add_argument('--state', '-s', type=str, required=False, default=INDEX_STATE_FILE, help="Path of the state of the previous run, default is '.nns_index.json' in the repository root")
+    parser.add_argument('--jobs', '-j', type=int, required=False, help="Number of worker processes, default is the number of CPUs")
+    parser.add_argument('--full', '-f', action='store_true', help="Flag to parse all the models again, ignoring the state of the previous run")
+    args = parser.parse_args()
+
+    try:
+        stats = index_models(os.path.abspath(args.output), os.path.abspath(args.state), args.jobs, args.full)
+    except ValueError as error:
+        print(error)
+        exit(1)
+    print(f"{args.output} written with {stats['networks']} networks: {stats['parsed']} models parsed, {stats['unchanged']} unchanged, "
+          f"{stats['rehashed']} with the same content, {stats['removed']} removed, {stats['failed']} failed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import functools
+import json
+import os
+import threading
+
+ONNX_NODES_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'onnx_nodes.json')
+
+# Bit assigned to each node type (lowercase ONNX operator name). A node type gets the next free bit the first time it is seen,
+# so the masks are only meaningful inside the process that computed them.
+NODE_BITS = {}
+NODE_BITS_LOCK = threading.Lock()
+
+
+def encode_node_types(nodes) -> int:
+    '''Encodes a list of node types (case-insensitive) as an integer bitmask'''
+    mask = 0
+    for node in nodes:
+        node = node.lower()
+        bit = NODE_BITS.get(node)
+        if bit is None:
+            with NODE_BITS_LOCK:
+                bit = NODE_BITS.get(node)
+                if bit is None:
+                    bit = NODE_BITS[node] = 1 << len(NODE_BITS)
+        mask |= bit
+    return mask
+
+def has_all_nodes(masks, nodes) -> list:
+    '''For each network bitmask in masks, tells if the network contains all the node types in nodes'''
+    query = encode_node_types(nodes)
+    return [mask & query == query for mask in masks]
+
+def has_no_nodes(masks, nodes) -> list:
+    '''For each network bitmask in masks, tells if the network contains none of the node types in nodes'''
+    query = encode_node_types(nodes)
+    return [mask & query == 0 for mask in masks]
+
+def has_only_nodes(masks, nodes) -> list:
+    '''For each network bitmask in masks, tells if all the node types of the network are in nodes'''
+    query = encode_node_types(nodes)
+    return [mask & ~query == 0 for mask in masks]
+
+def get_onnx_schemas_snapshot() -> dict:
+    '''Scans the schemas of the installed onnx package, returns the snapshot of the operator vocabulary stored in ONNX_NODES_FILE'''
+    import onnx # Imported here since loading onnx is slow and it is only needed to refresh the snapshot
+    return {
+        'onnx_version': onnx.__version__,
+        'opset_version': onnx.defs.onnx_opset_version(),
+        'nodes': sorted(set(schema.name.lower() for schema in onnx.defs.get_all_schemas())),
+    }
+
+@functools.lru_cache(maxsize=None)
+def load_onnx_nodes(file_path: str = ONNX_NODES_FILE) -> list:
+    '''Returns all the ONNX operator names (lowercase, sorted) from the snapshot file, the installed onnx package is scanned only if the snapshot is missing'''
+    if not os.path.isfile(file_path):
+        return get_onnx_schemas_snapshot()['nodes']
+    with open(file_path) as snapshot_file:
+        return json.load(snapshot_file)['nodes']
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=
+"""Description:
+    This script manages 'onnx_nodes.json', the snapshot of the ONNX operator names used by gen_instances.py and by the GUI,
+    so that they do not have to import onnx at every start.
+    Use --refresh after updating the onnx package to regenerate it from the installed version.
+""",
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--refresh', '-r', action='store_true', help="Regenerate the snapshot from the installed onnx package")
+    parser.add_argument('--file', '-f', type=str, required=False, default=ONNX_NODES_FILE, help="Path of the snapshot file, default is 'onnx_nodes.json' in the repository root")
+    args = parser.parse_args()
+
+    if args.refresh:
+        snapshot = get_onnx_schemas_snapshot()
+        with open(args.file, 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file, indent=1)
+            snapshot_file.write('\n')
+        print(f"Snapshot written to {args.file}: {len(snapshot['nodes'])} operators from onnx {snapshot['onnx_version']} (opset {snapshot['opset_version']})")
+    else:
+        with open(args.file) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        print(f"Snapshot {args.file}: {len(snapshot['nodes'])} operators from onnx {snapshot['onnx_version']} (opset {snapshot['opset_version']})")
+
+if __name__ == '__main__':
+    main()
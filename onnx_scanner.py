@@ -0,0 +1,258 @@
+import argparse
+import io
+import json
+from benchmark_io import open_benchmark_file
+
+# Reads the metadata of an ONNX model straight from the protobuf wire format, without the onnx package. The tensors are skipped with seeks,
+# so the weights are never loaded in memory and a '.gz' model is decompressed on the fly a chunk at a time.
+# Field numbers are the ones of onnx.proto (https://github.com/onnx/onnx/blob/main/onnx/onnx.proto).
+VARINT, I64, LEN, I32 = 0, 1, 2, 5
+
+MODEL_GRAPH = 7
+GRAPH_NODE, GRAPH_INITIALIZER, GRAPH_INPUT, GRAPH_OUTPUT = 1, 5, 11, 12
+NODE_OP_TYPE, NODE_ATTRIBUTE = 4, 5
+ATTRIBUTE_T, ATTRIBUTE_G, ATTRIBUTE_TENSORS, ATTRIBUTE_GRAPHS = 5, 6, 10, 11
+TENSOR_DIMS, TENSOR_DATA_TYPE, TENSOR_NAME = 1, 2, 8
+# float_data, int32_data, string_data, int64_data, raw_data, double_data and uint64_data
+TENSOR_DATA_FIELDS = {4, 5, 6, 7, 9, 10, 11}
+VALUE_INFO_NAME, VALUE_INFO_TYPE = 1, 2
+TYPE_TENSOR_TYPE = 1
+TENSOR_TYPE_ELEM_TYPE, TENSOR_TYPE_SHAPE = 1, 2
+SHAPE_DIM = 1
+DIM_VALUE, DIM_PARAM = 1, 2
+# Messages that contain tensors, by the field that holds each submessage, used by read_skeleton
+SKELETON_FIELDS = {
+    'model': {MODEL_GRAPH: 'graph'},
+    'graph': {GRAPH_NODE: 'node', GRAPH_INITIALIZER: 'tensor'},
+    'node': {NODE_ATTRIBUTE: 'attribute'},
+    'attribute': {ATTRIBUTE_T: 'tensor', ATTRIBUTE_G: 'graph', ATTRIBUTE_TENSORS: 'tensor', ATTRIBUTE_GRAPHS: 'graph'},
+}
+
+
+class WireReader:
+    '''Reads the protobuf wire format from a binary stream, keeping track of the position to know where each message ends'''
+    def __init__(self, stream):
+        self.stream = stream
+        self.pos = 0
+
+    def read(self, size: int) -> bytes:
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise ValueError('Truncated protobuf message')
+        self.pos += size
+        return data
+
+    def skip(self, size: int) -> None:
+        self.stream.seek(size, io.SEEK_CUR)
+        self.pos += size
+
+    def varint(self, allow_end: bool = False):
+        '''Reads a varint, if allow_end is set returns None when the stream ends before it'''
+        result, shift = 0, 0
+        while True:
+            byte = self.stream.read(1)
+            if not byte:
+                if allow_end and shift == 0:
+                    return None
+                raise ValueError('Truncated protobuf message')
+            self.pos += 1
+            result |= (byte[0] & 0x7f) << shift
+            if byte[0] < 0x80:
+                return result
+            shift += 7
+
+    def fields(self, end: int):
+        '''Yields (field number, wire type) until the position end (None for the end of the stream), the caller must read or skip each field'''
+        while end is None or self.pos < end:
+            key = self.varint(allow_end=end is None)
+            if key is None:
+                return
+            yield key >> 3, key & 7
+
+    def skip_field(self, wire_type: int) -> None:
+        if wire_type == VARINT:
+            self.varint()
+        elif wire_type == I64:
+            self.skip(8)
+        elif wire_type == LEN:
+            self.skip(self.varint())
+        elif wire_type == I32:
+            self.skip(4)
+        else:
+            raise ValueError(f'Unsupported protobuf wire type {wire_type}')
+
+    def message_end(self) -> int:
+        '''Reads the length of a length-delimited field and returns the position where it ends'''
+        size = self.varint()
+        return self.pos + size
+
+    def string(self) -> str:
+        return self.read(self.varint()).decode('utf-8')
+
+    def repeated_varint(self, wire_type: int) -> list:
+        '''Reads a repeated integer field, packed or not'''
+        if wire_type == VARINT:
+            return [self.varint()]
+        end = self.message_end()
+        values = []
+        while self.pos < end:
+            values.append(self.varint())
+        return values
+
+def encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+def to_int64(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def scan_tensor(reader: WireReader, end: int) -> dict:
+    '''Reads the name, data type and dims of a TensorProto, its data is skipped'''
+    tensor = {'name': '', 'data_type': 0, 'dims': []}
+    for field, wire_type in reader.fields(end):
+        if field == TENSOR_DIMS and wire_type in (VARINT, LEN):
+            tensor['dims'] += [to_int64(dim) for dim in reader.repeated_varint(wire_type)]
+        elif field == TENSOR_DATA_TYPE and wire_type == VARINT:
+            tensor['data_type'] = reader.varint()
+        elif field == TENSOR_NAME and wire_type == LEN:
+            tensor['name'] = reader.string()
+        else:
+            reader.skip_field(wire_type)
+    return tensor
+
+def scan_value_info(reader: WireReader, end: int) -> dict:
+    '''Reads the name, element type and shape of a ValueInfoProto, unknown dimensions are their symbolic name or None'''
+    value_info = {'name': '', 'elem_type': 0, 'shape': None}
+    for field, wire_type in reader.fields(end):
+        if field == VALUE_INFO_NAME and wire_type == LEN:
+            value_info['name'] = reader.string()
+        elif field == VALUE_INFO_TYPE and wire_type == LEN:
+            type_end = reader.message_end()
+            for type_field, type_wire_type in reader.fields(type_end):
+                if type_field != TYPE_TENSOR_TYPE or type_wire_type != LEN:
+                    reader.skip_field(type_wire_type)
+                    continue
+                tensor_type_end = reader.message_end()
+                for tensor_field, tensor_wire_type in reader.fields(tensor_type_end):
+                    if tensor_field == TENSOR_TYPE_ELEM_TYPE and tensor_wire_type == VARINT:
+                        value_info['elem_type'] = reader.varint()
+                    elif tensor_field == TENSOR_TYPE_SHAPE and tensor_wire_type == LEN:
+                        value_info['shape'] = []
+                        shape_end = reader.message_end()
+                        for shape_field, shape_wire_type in reader.fields(shape_end):
+                            if shape_field != SHAPE_DIM or shape_wire_type != LEN:
+                                reader.skip_field(shape_wire_type)
+                                continue
+                            dim, dim_end = None, reader.message_end()
+                            for dim_field, dim_wire_type in reader.fields(dim_end):
+                                if dim_field == DIM_VALUE and dim_wire_type == VARINT:
+                                    dim = to_int64(reader.varint())
+                                elif dim_field == DIM_PARAM and dim_wire_type == LEN:
+                                    dim = reader.string()
+                                else:
+                                    reader.skip_field(dim_wire_type)
+                            value_info['shape'].append(dim)
+                    else:
+                        reader.skip_field(tensor_wire_type)
+        else:
+            reader.skip_field(wire_type)
+    return value_info
+
+def scan_graph(reader: WireReader, end: int, model: dict, is_subgraph: bool = False) -> None:
+    '''Reads the nodes, initializers, inputs and outputs of a GraphProto into model, only the node types are read from subgraphs'''
+    for field, wire_type in reader.fields(end):
+        if field == GRAPH_NODE and wire_type == LEN:
+            scan_node(reader, reader.message_end(), model)
+        elif field == GRAPH_INITIALIZER and wire_type == LEN and not is_subgraph:
+            model['initializers'].append(scan_tensor(reader, reader.message_end()))
+        elif field in (GRAPH_INPUT, GRAPH_OUTPUT) and wire_type == LEN and not is_subgraph:
+            model['inputs' if field == GRAPH_INPUT else 'outputs'].append(scan_value_info(reader, reader.message_end()))
+        else:
+            reader.skip_field(wire_type)
+
+def scan_node(reader: WireReader, end: int, model: dict) -> None:
+    '''Reads the operator type of a NodeProto into model, and the nodes of its subgraphs (e.g. the branches of an If)'''
+    for field, wire_type in reader.fields(end):
+        if field == NODE_OP_TYPE and wire_type == LEN:
+            model['node_types'].add(reader.string())
+        elif field == NODE_ATTRIBUTE and wire_type == LEN:
+            attribute_end = reader.message_end()
+            for attribute_field, attribute_wire_type in reader.fields(attribute_end):
+                if attribute_field in (ATTRIBUTE_G, ATTRIBUTE_GRAPHS) and attribute_wire_type == LEN:
+                    scan_graph(reader, reader.message_end(), model, is_subgraph=True)
+                else:
+                    reader.skip_field(attribute_wire_type)
+        else:
+            reader.skip_field(wire_type)
+
+def scan_onnx_stream(stream) -> dict:
+    '''Scans a serialized ModelProto from a seekable binary stream, see scan_onnx'''
+    reader = WireReader(stream)
+    model = {'node_types': set(), 'initializers': [], 'inputs': [], 'outputs': []}
+    for field, wire_type in reader.fields(None):
+        if field == MODEL_GRAPH and wire_type == LEN:
+            scan_graph(reader, reader.message_end(), model)
+        else:
+            reader.skip_field(wire_type)
+    # The initializers can be listed as inputs too (IR version < 4), they are not inputs of the network
+    initializer_names = set(initializer['name'] for initializer in model['initializers'])
+    model['inputs'] = [value_info for value_info in model['inputs'] if value_info['name'] not in initializer_names]
+    model['node_types'] = sorted(model['node_types'])
+    model['n_params'] = sum(count_elements(initializer['dims']) for initializer in model['initializers'])
+    return model
+
+def count_elements(dims: list) -> int:
+    size = 1
+    for dim in dims:
+        size *= dim
+    return size
+
+def scan_onnx(path: str) -> dict:
+    '''Returns the metadata of an ONNX model (a '.gz' file is decompressed while reading) without loading its weights:
+    'node_types' (sorted, including the nodes of subgraphs), 'n_params' (the elements of the initializers),
+    'initializers' (name, data_type and dims of each one) and the 'inputs' and 'outputs' of the graph (name, elem_type and shape)'''
+    with open_benchmark_file(path, 'rb') as stream:
+        return scan_onnx_stream(stream)
+
+def copy_without_weights(reader: WireReader, end: int, message: str, max_tensor_size: int) -> bytes:
+    '''Returns the fields of a message until the position end re-encoded, without the data of the tensors longer than max_tensor_size bytes'''
+    copy = bytearray()
+    for field, wire_type in reader.fields(end):
+        key = encode_varint(field << 3 | wire_type)
+        if wire_type == LEN and field in SKELETON_FIELDS.get(message, {}):
+            submessage = copy_without_weights(reader, reader.message_end(), SKELETON_FIELDS[message][field], max_tensor_size)
+            copy += key + encode_varint(len(submessage)) + submessage
+        elif wire_type == LEN:
+            size = reader.varint()
+            if message == 'tensor' and field in TENSOR_DATA_FIELDS and size > max_tensor_size:
+                reader.skip(size)
+            else:
+                copy += key + encode_varint(size) + reader.read(size)
+        elif wire_type == VARINT:
+            copy += key + encode_varint(reader.varint())
+        elif wire_type in (I64, I32):
+            copy += key + reader.read(8 if wire_type == I64 else 4)
+        else:
+            raise ValueError(f'Unsupported protobuf wire type {wire_type}')
+    return bytes(copy)
+
+def read_skeleton(path: str, max_tensor_size: int = 1024) -> bytes:
+    '''Returns the serialized model (a '.gz' file is decompressed while reading) without the data of its tensors longer than max_tensor_size bytes,
+    the weights are dropped but their dims and data types are kept. The small tensors, like the target shape of a Reshape, are kept since shape inference reads them'''
+    with open_benchmark_file(path, 'rb') as stream:
+        return copy_without_weights(WireReader(stream), None, 'model', max_tensor_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints the node types, the number of parameters and the inputs and outputs of ONNX models (.onnx or .onnx.gz) without loading their weights")
+    parser.add_argument('models', nargs='+', help="Paths of the models")
+    args = parser.parse_args()
+    for path in args.models:
+        model = scan_onnx(path)
+        print(json.dumps({'path': path, 'node_types': model['node_types'], 'n_params': model['n_params'], 'inputs': model['inputs'], 'outputs': model['outputs']}))
+
+if __name__ == '__main__':
+    main()
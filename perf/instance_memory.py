@@ -0,0 +1,61 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BENCHMARKS_VNNCOMP_DIR)
+from query import make_network_tuple
+
+BENCHMARKS = [('Benchmarks_fc', 'acasxu_2023'), ('Benchmarks_conv', 'cifar_biasfield'), ('Benchmarks_residual', 'nn4sys_2023'), ('Benchmarks_conv', 'traffic_signs_recognition_2023')]
+
+
+def make_dict_tuple(to_benchmarks_dir: str, benchmark_dir: str, benchmark: str, onnx: str, vnnlib: str, timeout: str) -> dict:
+    '''The five-key dictionary used for the instances before the Instance record'''
+    return {
+        'rel_path_to_onnx': os.path.join(to_benchmarks_dir, benchmark_dir, onnx),
+        'rel_path_to_property.vnnlib': os.path.join(to_benchmarks_dir, benchmark_dir, vnnlib),
+        'benchmark': benchmark,
+        'onnx': onnx,
+        'vnnlib': vnnlib,
+        'timeout': timeout,
+    }
+
+def iter_rows(n_instances: int, instances_per_network: int):
+    '''Yields synthetic instances.csv lines split in fields, every field is a new string as if it was read from the file'''
+    for i in range(n_instances):
+        architecture_dir, benchmark = BENCHMARKS[i // instances_per_network % len(BENCHMARKS)]
+        network = i // instances_per_network
+        yield (f'{architecture_dir}/{benchmark}', f'{benchmark}', f'onnx/{benchmark}_network_{network}.onnx', f'vnnlib/{benchmark}_prop_{i % 1000}_eps_0.0{i % 7}.vnnlib', f'{300}')
+
+def measure(make, n_instances: int, instances_per_network: int) -> tuple:
+    '''Builds the list of instances with make, returns the memory it takes in bytes and the elapsed time in seconds (measured on a separate, untraced run)'''
+    gc.collect()
+    start = time.perf_counter()
+    instances = [make('..', benchmark_dir, benchmark, onnx, vnnlib, timeout) for benchmark_dir, benchmark, onnx, vnnlib, timeout in iter_rows(n_instances, instances_per_network)]
+    elapsed = time.perf_counter() - start
+    del instances
+    gc.collect()
+    tracemalloc.start()
+    instances = [make('..', benchmark_dir, benchmark, onnx, vnnlib, timeout) for benchmark_dir, benchmark, onnx, vnnlib, timeout in iter_rows(n_instances, instances_per_network)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return size, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the memory taken by the instances as five-key dictionaries and as Instance records")
+    parser.add_argument('--sizes', '-s', type=str, required=False, default='10000,100000,1000000', help="Comma-separated numbers of instances, default is '10000,100000,1000000'")
+    parser.add_argument('--per_network', '-p', type=int, required=False, default=20, help="Number of instances of each network, default is 20")
+    args = parser.parse_args()
+
+    print(f"{'instances':>10}{'representation':>16}{'memory (MB)':>14}{'bytes/inst.':>13}{'build (s)':>11}")
+    for n_instances in [int(size) for size in args.sizes.split(',')]:
+        for name, make in [('dict', make_dict_tuple), ('Instance', make_network_tuple)]:
+            size, elapsed = measure(make, n_instances, args.per_network)
+            print(f"{n_instances:>10}{name:>16}{size / 2**20:>14.1f}{size / n_instances:>13.0f}{elapsed:>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BENCHMARKS_VNNCOMP_DIR)
+from nns_indexer import find_models
+from benchmark_io import open_benchmark_file
+from onnx_scanner import scan_onnx
+
+METHODS = ['scan', 'onnx.load']
+
+
+def load_with_onnx(path: str) -> None:
+    import onnx
+    with open_benchmark_file(path, 'rb') as model_file:
+        onnx.load(model_file)
+
+def run_method(method: str, path: str) -> dict:
+    '''Reads the model with the method in this process, returns the elapsed time and the growth of the peak resident memory in bytes'''
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    scan_onnx(path) if method == 'scan' else load_with_onnx(path)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {'elapsed': elapsed, 'peak': (peak_rss - start_rss) * scale}
+
+def measure(method: str, path: str) -> dict:
+    '''Runs the method in a new interpreter, so that the peak memory of a run is not hidden by the previous ones'''
+    result = subprocess.run([sys.executable, __file__, '--worker', method, path], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the peak memory and the throughput of onnx_scanner.py and onnx.load on the largest models of the benchmarks")
+    parser.add_argument('models', nargs='*', help="Paths of the models, default is the largest models found in the benchmark directories")
+    parser.add_argument('--top', '-t', type=int, required=False, default=5, help="Number of models to measure when no path is given, default is 5")
+    parser.add_argument('--worker', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_method(*args.worker)))
+        return
+    paths = args.models or sorted((path for *_, path in find_models()), key=os.path.getsize, reverse=True)[:args.top]
+    if len(paths) == 0:
+        print("No models found, are the submodules checked out?")
+        exit(1)
+
+    print(f"{'model':<50}{'size (MB)':>11}{'method':>11}{'time (s)':>10}{'MB/s':>9}{'peak (MB)':>11}")
+    for path in paths:
+        size = os.path.getsize(path)
+        for method in METHODS:
+            result = measure(method, path)
+            if 'error' in result:
+                print(f"{os.path.basename(path)[-50:]:<50}{size / 2**20:>11.1f}{method:>11}   {result['error']}")
+                continue
+            print(f"{os.path.basename(path)[-50:]:<50}{size / 2**20:>11.1f}{method:>11}{result['elapsed']:>10.3f}"
+                  f"{size / 2**20 / max(result['elapsed'], 1e-9):>9.0f}{result['peak'] / 2**20:>11.1f}")
+
+if __name__ == '__main__':
+    main()
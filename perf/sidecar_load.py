@@ -0,0 +1,59 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BENCHMARKS_VNNCOMP_DIR)
+from property_sidecars import load_sidecar, write_sidecar
+from vnnlib_parser import find_properties, parse_vnnlib
+
+METHODS = ['text', 'sidecar', 'sidecar (mmap)']
+
+
+def load(method: str, path: str, sidecar_path: str) -> float:
+    '''Loads a property with the method and reads all its arrays (a memory-mapped array is only read when it is used), returns the elapsed time'''
+    start = time.perf_counter()
+    if method == 'text':
+        property_arrays = parse_vnnlib(path)
+    else:
+        property_arrays = load_sidecar(sidecar_path, 'r' if method == 'sidecar (mmap)' else None)
+    for array in property_arrays.values():
+        np.sum(array)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the time to load the largest properties of the benchmarks from their text (.vnnlib or .vnnlib.gz)\n"
+                                                 "and from their binary sidecar (see property_sidecars.py), read or memory-mapped")
+    parser.add_argument('properties', nargs='*', help="Paths of the properties, default is the largest properties found in the benchmark directories")
+    parser.add_argument('--top', '-t', type=int, required=False, default=20, help="Number of properties to measure when no path is given, default is 20")
+    parser.add_argument('--repeat', '-r', type=int, required=False, default=3, help="Number of loads of each property, the fastest one is reported, default is 3")
+    args = parser.parse_args()
+
+    paths = args.properties or sorted(find_properties(), key=os.path.getsize, reverse=True)[:args.top]
+    if len(paths) == 0:
+        print("No properties found, are the submodules checked out?")
+        exit(1)
+
+    # The sidecars are written to a temporary directory, so that the exported ones are neither needed nor changed
+    sidecar_dir = tempfile.mkdtemp(prefix='property_sidecars_')
+    try:
+        totals = dict.fromkeys(METHODS, 0.0)
+        print(f"{'property':<50}{'size (MB)':>11}" + ''.join(f"{method + ' (ms)':>21}" for method in METHODS))
+        for i, path in enumerate(paths):
+            sidecar_path = os.path.join(sidecar_dir, str(i))
+            write_sidecar(parse_vnnlib(path), sidecar_path)
+            elapsed = {method: min(load(method, path, sidecar_path) for _ in range(args.repeat)) for method in METHODS}
+            for method in METHODS:
+                totals[method] += elapsed[method]
+            print(f"{os.path.basename(path)[-50:]:<50}{os.path.getsize(path) / 2**20:>11.2f}" + ''.join(f"{elapsed[method] * 1000:>21.2f}" for method in METHODS))
+    finally:
+        shutil.rmtree(sidecar_dir)
+    print(f"{'total':<50}{'':>11}" + ''.join(f"{totals[method] * 1000:>21.2f}" for method in METHODS))
+    print(', '.join(f"{method} is {totals['text'] / max(totals[method], 1e-9):.1f}x faster than text" for method in METHODS[1:]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_command(command: list, runs: int) -> list:
+    '''Runs the command the given number of times in a fresh interpreter, returns the wall times in seconds (None if the command fails)'''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=BENCHMARKS_VNNCOMP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            return None
+        times.append(time.perf_counter() - start)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the start-up time of loading the ONNX operator vocabulary (onnx schema scan vs snapshot) and of a plain gen_instances.py query")
+    parser.add_argument('--runs', '-n', type=int, required=False, default=10, help="Number of runs for each command, default is 10")
+    parser.add_argument('--query', '-q', type=str, required=False, default='--inarc fullyconnected', help="Arguments of the gen_instances.py query to time, default is '--inarc fullyconnected'")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        commands = {
+            'python interpreter': [sys.executable, '-c', 'pass'],
+            'onnx schema scan': [sys.executable, '-c', 'import onnx; sorted(set(schema.name.lower() for schema in onnx.defs.get_all_schemas()))'],
+            'onnx_nodes.json snapshot': [sys.executable, '-c', 'from node_index import load_onnx_nodes; load_onnx_nodes()'],
+            'gen_instances.py query': [sys.executable, 'gen_instances.py'] + args.query.split() + ['--outdir', outdir],
+        }
+        print(f"{'command':<28}{'median (ms)':>14}{'min (ms)':>12}")
+        for name, command in commands.items():
+            times = time_command(command, args.runs)
+            if times is None:
+                print(f"{name:<28}{'failed':>14}")
+            else:
+                print(f"{name:<28}{statistics.median(times) * 1000:>14.1f}{min(times) * 1000:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BENCHMARKS_VNNCOMP_DIR)
+from vnnlib_parser import find_properties, load_vnnlib
+
+
+def measure(paths: list, cache_dir: str, use_cache: bool) -> tuple:
+    '''Loads all the properties, returns the elapsed time and the paths that could not be parsed with their error'''
+    failed = []
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            load_vnnlib(path, cache_dir, use_cache)
+        except Exception as error:
+            failed.append((path, f'{type(error).__name__}: {error}'))
+    return time.perf_counter() - start, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the throughput of vnnlib_parser.py over the properties of the benchmarks (.vnnlib and .vnnlib.gz, read directly):\n"
+                                                 "parsing, parsing and writing the compiled cache, and loading from the cache")
+    parser.add_argument('properties', nargs='*', help="Paths of the properties, default is all the properties found in the benchmark directories")
+    parser.add_argument('--limit', '-l', type=int, required=False, default=-1, help="Maximum number of properties to measure, default is -1 (all of them)")
+    args = parser.parse_args()
+
+    paths = args.properties or find_properties()
+    paths = paths[:args.limit] if args.limit != -1 else paths
+    if len(paths) == 0:
+        print("No properties found, are the submodules checked out?")
+        exit(1)
+    size = sum(os.path.getsize(path) for path in paths) / 2**20
+    print(f"{len(paths)} properties, {size:.1f} MB on disk ({sum(path.endswith('.gz') for path in paths)} compressed)")
+
+    cache_dir = tempfile.mkdtemp(prefix='vnnlib_cache_')
+    try:
+        print(f"{'run':<24}{'time (s)':>10}{'files/s':>10}{'MB/s':>9}")
+        for name, use_cache in [('parse', False), ('parse + write cache', True), ('read cache', True)]:
+            elapsed, failed = measure(paths, cache_dir, use_cache)
+            print(f"{name:<24}{elapsed:>10.2f}{len(paths) / max(elapsed, 1e-9):>10.0f}{size / max(elapsed, 1e-9):>9.1f}")
+    finally:
+        shutil.rmtree(cache_dir)
+    for path, error in failed:
+        print(f"Could not parse {path}: {error}")
+
+if __name__ == '__main__':
+    main()
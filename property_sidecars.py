@@ -0,0 +1,97 @@
+import argparse
+import concurrent.futures
+import os
+import shutil
+import time
+import numpy as np
+from benchmark_io import exists, get_size, resolve_path
+from catalog import BENCHMARKS_VNNCOMP_DIR, CATALOG_FILE, SIDECAR_DIR, get_sidecar_path
+from query import BenchmarkCatalog
+from vnnlib_parser import load_vnnlib
+
+# A sidecar is a directory with one '.npy' file for each array of a parsed property (see vnnlib_parser.parse_vnnlib), so that every array
+# can be memory-mapped with np.load(mmap_mode='r') and a verifier only reads the pages it uses, instead of parsing the text of the property
+SIDECAR_ARRAYS = ['lower', 'upper', 'in_mat', 'in_rhs', 'in_offsets', 'out_mat', 'out_rhs', 'out_offsets']
+
+
+def write_sidecar(property_arrays: dict, sidecar_path: str) -> None:
+    '''Writes the arrays of a property to a sidecar directory, atomically: the arrays are written to a temporary directory that then replaces the old sidecar.
+    The old sidecar is renamed aside before the replace and only removed afterwards, since a directory cannot replace a non-empty one'''
+    tmp_path = f'{sidecar_path}.{os.getpid()}.tmp'
+    old_path = f'{sidecar_path}.{os.getpid()}.old'
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in SIDECAR_ARRAYS:
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(property_arrays[name]))
+    if os.path.isdir(sidecar_path):
+        os.replace(sidecar_path, old_path)
+    os.replace(tmp_path, sidecar_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def load_sidecar(sidecar_path: str, mmap_mode: str = 'r') -> dict:
+    '''Returns the arrays of a property from its sidecar, with the same keys of vnnlib_parser.parse_vnnlib. The arrays are memory-mapped
+    (read only) unless mmap_mode is None'''
+    return {name: np.load(os.path.join(sidecar_path, f'{name}.npy'), mmap_mode=mmap_mode) for name in SIDECAR_ARRAYS}
+
+def is_sidecar_up_to_date(property_path: str, sidecar_path: str) -> bool:
+    '''Returns True if the sidecar exists and was written after the last change of the property'''
+    try:
+        return os.path.getmtime(os.path.join(sidecar_path, f'{SIDECAR_ARRAYS[-1]}.npy')) >= os.path.getmtime(property_path)
+    except OSError:
+        return False
+
+def export_sidecar(property_path: str, sidecar_path: str, force: bool = False) -> int:
+    '''Writes the sidecar of a property unless it is up to date (or force), returns the number of bytes written'''
+    property_path = resolve_path(property_path)
+    if not force and is_sidecar_up_to_date(property_path, sidecar_path):
+        return 0
+    write_sidecar(load_vnnlib(property_path), sidecar_path)
+    return sum(os.path.getsize(os.path.join(sidecar_path, f'{name}.npy')) for name in SIDECAR_ARRAYS)
+
+def export_sidecars(paths: dict, jobs: int = None, force: bool = False) -> dict:
+    '''Exports the sidecars of the properties, a dictionary property path -> sidecar path, in a pool of jobs processes, the largest files first.
+    Returns the number of sidecars written, up to date, missing and failed and the bytes written'''
+    stats = {'written': 0, 'up_to_date': 0, 'missing': 0, 'failed': 0, 'bytes': 0}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(export_sidecar, path, paths[path], force): path for path in sorted(paths, key=lambda path: get_size(path) if exists(path) else 0, reverse=True)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                n_bytes = future.result()
+            except FileNotFoundError:
+                stats['missing'] += 1
+                continue
+            except Exception as error:
+                print(f"Could not export {futures[future]}: {type(error).__name__}: {error}")
+                stats['failed'] += 1
+                continue
+            stats['written' if n_bytes > 0 else 'up_to_date'] += 1
+            stats['bytes'] += n_bytes
+    return stats
+
+def get_referenced_properties(catalog_path: str = CATALOG_FILE, query: dict = None) -> dict:
+    '''Returns the properties of the instances selected by the query (all of them by default), read from the catalog or from the CSV files,
+    as a dictionary absolute property path -> absolute sidecar path'''
+    session = BenchmarkCatalog.load(catalog_path)
+    paths = {}
+    for instance in session.iter_instances(query or {}):
+        paths[os.path.join(BENCHMARKS_VNNCOMP_DIR, instance.benchmark_dir, instance.vnnlib)] = os.path.join(BENCHMARKS_VNNCOMP_DIR, get_sidecar_path(instance.benchmark_dir, instance.vnnlib))
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Exports the properties of the instances in the catalog to binary sidecars in '{SIDECAR_DIR}', one directory of memory-mappable '.npy' arrays\n"
+                                                 "for each property (see load_sidecar). Sidecars newer than their property are kept")
+    parser.add_argument('--catalog', '-c', type=str, required=False, default=CATALOG_FILE, help="Path to the catalog built by 'catalog.py', if it is missing or out of date the CSV files are parsed instead")
+    parser.add_argument('--inbench', '-ib', type=str, required=False, help="Comma separated benchmarks whose properties are exported (e.g. 'cifar2020,vit_2023'), default is all of them")
+    parser.add_argument('--jobs', '-j', type=int, required=False, help="Number of processes exporting the properties, default is the number of CPUs")
+    parser.add_argument('--force', '-f', action='store_true', help="Flag to export all the properties again, even the ones whose sidecar is up to date")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = get_referenced_properties(os.path.abspath(args.catalog), {'inbench': args.inbench})
+    stats = export_sidecars(paths, args.jobs, args.force)
+    print(f"{stats['written']} sidecars written ({stats['bytes'] / 2**20:.1f} MB), {stats['up_to_date']} up to date, {stats['failed']} failed "
+          f"({time.perf_counter() - start:.2f}s)")
+    if stats['missing'] > 0:
+        print(f"{stats['missing']} properties were not found, are the submodules checked out?")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,689 @@
+import bisect
+import concurrent.futures
+import csv
+import functools
+import gzip
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from catalog import BENCHMARKS_VNNCOMP_DIR, CATALOG_FILE, COST_COLUMNS, PROPERTY_COLUMNS, EXPECTED_RESULTS_FILE, NEURAL_NETWORKS_FILE, get_benchmark_dir, parse_node_types, read_instances_file, \
+    read_expected_results, get_expected_result, iter_instances_by_result, open_catalog, load_networks, iter_instances, load_network_instances, load_expected_results, \
+    load_property_metrics, get_sidecar_path
+from benchmark_io import resolve_path
+from node_index import encode_node_types, has_all_nodes, has_no_nodes, has_only_nodes
+
+# Filters on the networks and instances used by gen_instances.py. They work on plain lists of dictionaries and only need the
+# standard library, so that a query does not pay for importing pandas.
+VERBOSE = False
+NETWORK_COLUMNS = ['architecture', 'benchmark', 'onnx', 'node_types', 'n_params'] + COST_COLUMNS
+# Numeric columns filtered by the 'min_<suffix>' and 'max_<suffix>' keys of a query, by suffix
+RANGE_FILTERS = {'par': 'n_params', 'in': 'input_dim', 'out': 'output_dim', 'neu': 'n_neurons', 'macs': 'n_macs', 'depth': 'depth'}
+# Property columns filtered by the 'min_<suffix>' and 'max_<suffix>' keys of a query, by suffix. None means no bound, since the log volume can be negative
+PROPERTY_FILTERS = {'vars': 'n_inputs', 'disj': 'n_disjuncts', 'cons': 'n_constraints', 'logvol': 'log_volume', 'radius': 'max_radius'}
+# Filters of a query and their default value (no filter)
+QUERY_DEFAULTS = {'inarc': None, 'exarc': None, 'inbench': None, 'exbench': None, 'innode': None, 'exnode': None,
+                  **{f'{bound}_{suffix}': -1 for suffix in RANGE_FILTERS for bound in ('min', 'max')},
+                  **{f'{bound}_{suffix}': None for suffix in PROPERTY_FILTERS for bound in ('min', 'max')}, 'sort': None, 'result': '*', 'maxprop': -1,
+                  'seed': None, 'stratify': False, 'budget': -1, 'default_timeout': 300}
+# Keys of a suite in a spec file
+SPEC_KEYS = list(QUERY_DEFAULTS) + ['outname', 'outdir', 'gzip', 'sidecars', 'on_disk_paths']
+LIST_FILTERS = ['inarc', 'exarc', 'inbench', 'exbench', 'innode', 'exnode']
+# Relative cost per network of the filters on each column, used by plan_filters together with the estimated selectivity
+PREDICATE_COSTS = {'architecture': 1.0, 'benchmark': 1.0, 'node_types': 2.0, **{column: 1.0 for column in RANGE_FILTERS.values()}}
+
+
+def set_verbosity(verbose: bool) -> None:
+    global VERBOSE
+    VERBOSE = verbose
+
+def verbose_print(*args):
+    if VERBOSE:
+        print(*args)
+
+def normalize_query(query: dict) -> dict:
+    '''Returns a copy of the query with the default value for the missing filters and the list filters (lists or comma-separated strings) split, stripped and lowercase.
+    With 'all' (or '*') in 'exnode', 'exnode' becomes ['*']: all the nodes that are not in 'innode' are excluded, even the ones missing from the ONNX snapshot'''
+    query = {**QUERY_DEFAULTS, **query}
+    for key in LIST_FILTERS:
+        if query[key]:
+            values = query[key].split(',') if isinstance(query[key], str) else query[key]
+            query[key] = [value.strip().lower() for value in values]
+    if query['exnode'] and ('all' in query['exnode'] or '*' in query['exnode']):
+        query['exnode'] = ['*']
+    return query
+
+def load_nns_file(file_path: str) -> list:
+    '''Reads the networks CSV file, returns a list of dictionaries with the 'node_types' column as a list of strings, 'n_params' as an integer and the 'node_mask' of the node types.
+    The cost columns are integers too, None if they are empty or missing from the file'''
+    networks = []
+    with open(file_path, newline='') as nns_file:
+        for row in csv.DictReader(nns_file):
+            row['node_types'] = parse_node_types(row['node_types'])
+            row['n_params'] = int(row['n_params'])
+            for column in COST_COLUMNS:
+                row[column] = int(row[column]) if row.get(column) else None
+            row['node_mask'] = encode_node_types(row['node_types'])
+            networks.append(row)
+    return networks
+
+def write_networks_file(file_path: str, networks: list) -> None:
+    '''Writes the networks to a CSV file with the same columns as nns.csv'''
+    with open(file_path, 'w', newline='') as nns_file:
+        writer = csv.writer(nns_file, lineterminator='\n')
+        writer.writerow(NETWORK_COLUMNS)
+        for net in networks:
+            writer.writerow([net['architecture'], net['benchmark'], net['onnx'], str(net['node_types']), net['n_params']] + [net.get(column) for column in COST_COLUMNS])
+
+def check_emptiness(networks: list, lst: list, list_name: str, is_a_removal: bool) -> bool:
+    '''Check if the list of networks is empty or the list is empty, a verbose message is printed if so'''
+    if len(networks) == 0:
+        verbose_print('\tDataframe is already empty...')
+        return True
+    if lst is None or len(lst) == 0:
+        verbose_print(f'\t{list_name} to remove list is empty') if is_a_removal else verbose_print(f'\t{list_name} to keep list is empty')
+        return True
+    return False
+
+def keep_generalized(networks: list, lst: list, col_name: str) -> list:
+    '''Keep only the networks where the values in col_name are in lst'''
+    if check_emptiness(networks, lst, col_name.capitalize(), False):
+        return networks
+    verbose_print(f"\tKeeping only models with {col_name.lower()} in: ", lst)
+
+    if col_name == 'node_types':
+        mask = has_all_nodes([net['node_mask'] for net in networks], lst)
+    else:
+        values = set(lst)
+        mask = [net[col_name].lower() in values for net in networks]
+    return [net for net, keep in zip(networks, mask) if keep]
+
+def remove_generalized(networks: list, lst: list, col_name: str) -> list:
+    '''Remove the networks where the values in col_name are in lst'''
+    if check_emptiness(networks, lst, col_name.capitalize(), True):
+        return networks
+    verbose_print(f"\tRemoving models with {col_name.lower()} in: ", lst)
+
+    if col_name == 'node_types':
+        mask = has_no_nodes([net['node_mask'] for net in networks], lst)
+    else:
+        values = set(lst)
+        mask = [net[col_name].lower() not in values for net in networks]
+    return [net for net, keep in zip(networks, mask) if keep]
+
+def keep_architectures(networks: list, arc_list: list) -> list:
+    return keep_generalized(networks, arc_list, 'architecture')
+
+def remove_architectures(networks: list, arc_list: list) -> list:
+    return remove_generalized(networks, arc_list, 'architecture')
+
+def keep_benchmarks(networks: list, bench_list: list) -> list:
+    return keep_generalized(networks, bench_list, 'benchmark')
+
+def remove_benchmarks(networks: list, bench_list: list) -> list:
+    return remove_generalized(networks, bench_list, 'benchmark')
+
+def keep_nodes(networks: list, node_list: list) -> list:
+    return keep_generalized(networks, node_list, 'node_types')
+
+def remove_nodes(networks: list, node_list: list) -> list:
+    return remove_generalized(networks, node_list, 'node_types')
+
+def keep_only_nodes(networks: list, node_list: list) -> list:
+    '''Keep only the networks whose node types are all in node_list, used by 'exnode' all'''
+    verbose_print("\tKeeping only models with node types in: ", node_list)
+    mask = has_only_nodes([net['node_mask'] for net in networks], node_list or [])
+    return [net for net, keep in zip(networks, mask) if keep]
+
+def range_filter(networks: list, col_name: str, min_value: int, max_value: int) -> list:
+    '''Filter the networks based on the minimum and maximum value of a numeric column, -1 means no bound.
+    With a bound, the networks whose value is unknown (None) are removed'''
+    if(min_value == -1 and max_value == -1):
+        verbose_print(f'\tNo {col_name} bounds needed...')
+        return networks
+    if len(networks) == 0:
+        verbose_print(f'\tDataframe is empty, skipping {col_name} filter...')
+        return networks
+    if(min_value > max_value and max_value != -1):
+        verbose_print(f'\tError in {col_name} filter, minimum > maximum...')
+        return networks
+    networks = [net for net in networks if net[col_name] is not None]
+    if min_value != -1:
+        verbose_print(f"\tRemoving networks with {col_name} less than {min_value}...")
+        networks = [net for net in networks if net[col_name] >= min_value]
+    if max_value != -1:
+        verbose_print(f"\tRemoving networks with {col_name} more than {max_value}...")
+        networks = [net for net in networks if net[col_name] <= max_value]
+    return networks
+
+def param_range_filter(networks: list, min_par: int, max_par: int) -> list:
+    '''Filter the networks based on the minimum and maximum number of parameters'''
+    return range_filter(networks, 'n_params', min_par, max_par)
+
+def network_statistics(networks: list) -> dict:
+    '''Counts the networks per architecture, benchmark and node type and sorts the known values of their numeric columns, used to estimate the selectivity of the filters'''
+    stats = {'total': len(networks), 'architecture': Counter(), 'benchmark': Counter(), 'node_types': Counter(),
+             **{column: sorted(net[column] for net in networks if net.get(column) is not None) for column in RANGE_FILTERS.values()}}
+    for net in networks:
+        stats['architecture'][net['architecture'].lower()] += 1
+        stats['benchmark'][net['benchmark'].lower()] += 1
+        stats['node_types'].update(set(node.lower() for node in net['node_types']))
+    return stats
+
+def estimate_selectivity(stats: dict, col_name: str, lst: list, is_a_removal: bool) -> float:
+    '''Estimates the fraction of networks kept by a keep/remove filter on col_name, the node types are assumed to be independent'''
+    if stats['total'] == 0:
+        return 1.0
+    fractions = [stats[col_name][value] / stats['total'] for value in set(lst)]
+    if col_name == 'node_types':
+        selectivity = 1.0
+        for fraction in fractions:
+            selectivity *= (1 - fraction) if is_a_removal else fraction
+        return selectivity
+    selectivity = min(sum(fractions), 1.0)
+    return 1 - selectivity if is_a_removal else selectivity
+
+def estimate_range_selectivity(stats: dict, col_name: str, min_value: int, max_value: int) -> float:
+    '''Estimates the fraction of networks kept by the range filter on col_name, the networks with an unknown value are not kept'''
+    if stats['total'] == 0 or (min_value > max_value and max_value != -1):
+        return 1.0
+    low = bisect.bisect_left(stats[col_name], min_value) if min_value != -1 else 0
+    high = bisect.bisect_right(stats[col_name], max_value) if max_value != -1 else len(stats[col_name])
+    return max(high - low, 0) / stats['total']
+
+def plan_filters(args: dict, stats: dict) -> list:
+    '''Returns the filters requested in args as (description, estimated selectivity, function) tuples,
+    ordered so that cheap filters that remove many networks are applied first'''
+    plan = []
+    for key, col_name, keep in [('inarc', 'architecture', True), ('exarc', 'architecture', False), ('inbench', 'benchmark', True),
+                                ('exbench', 'benchmark', False), ('innode', 'node_types', True), ('exnode', 'node_types', False)]:
+        if key == 'exnode' and args[key] == ['*']:
+            innode = set(args['innode'] or [])
+            function = functools.partial(keep_only_nodes, node_list=args['innode'])
+            plan.append(("exnode all", estimate_selectivity(stats, col_name, [node for node in stats[col_name] if node not in innode], True), PREDICATE_COSTS[col_name], function))
+        elif args[key]:
+            function = functools.partial(keep_generalized if keep else remove_generalized, lst=args[key], col_name=col_name)
+            plan.append((f"{key} {','.join(args[key])}", estimate_selectivity(stats, col_name, args[key], not keep), PREDICATE_COSTS[col_name], function))
+    for suffix, col_name in RANGE_FILTERS.items():
+        min_value, max_value = args[f'min_{suffix}'], args[f'max_{suffix}']
+        if min_value != -1 or max_value != -1:
+            function = functools.partial(range_filter, col_name=col_name, min_value=min_value, max_value=max_value)
+            plan.append((f"{col_name} [{min_value}, {max_value}]", estimate_range_selectivity(stats, col_name, min_value, max_value), PREDICATE_COSTS[col_name], function))
+    # Rank of a filter: cost paid per network over the fraction of networks it removes
+    plan.sort(key=lambda predicate: predicate[2] / (1 - predicate[1]) if predicate[1] < 1 else float('inf'))
+    return [(description, selectivity, function) for description, selectivity, _, function in plan]
+
+def filter_networks(networks: list, args: dict, stats: dict = None, explain: bool = False) -> list:
+    '''Filter the networks based on the arguments, it only consider 'inarc', 'exarc', 'inbench', 'exbench', 'innode', 'exnode' and the 'min_' and 'max_' bounds (e.g. 'min_par', 'max_macs').
+    The filters are applied in the order chosen by plan_filters and stop as soon as no network is left, with explain the plan is printed with the cardinalities and the elapsed time of each filter'''
+    plan = plan_filters(args, network_statistics(networks) if stats is None else stats)
+    if explain:
+        print(f"Filter plan for {len(networks)} networks:")
+        print(f"\t{'filter':<40} {'est. sel.':>9} {'in':>7} {'out':>7} {'time (ms)':>10}")
+    for i, (description, selectivity, function) in enumerate(plan):
+        if len(networks) == 0:
+            verbose_print(f"\tNo networks left, skipping {len(plan) - i} filters...")
+            if explain:
+                for description, selectivity, _ in plan[i:]:
+                    print(f"\t{description[:40]:<40} {selectivity:>9.3f} {'skipped':>7}")
+            break
+        start = time.perf_counter()
+        filtered = function(networks)
+        elapsed = (time.perf_counter() - start) * 1000
+        if explain:
+            print(f"\t{description[:40]:<40} {selectivity:>9.3f} {len(networks):>7} {len(filtered):>7} {elapsed:>10.3f}")
+        networks = filtered
+    verbose_print("\n")
+    return networks
+
+def get_instances_path(net: dict) -> str:
+    '''Returns the path of the "instances.csv" file of the benchmark of the network, looking at its architecture and benchmark'''
+    if(net['architecture'] is None or net['benchmark'] is None):
+        raise ValueError('One of the columns is empty')
+
+    path = os.path.join(BENCHMARKS_VNNCOMP_DIR, get_benchmark_dir(net['architecture'], net['benchmark']))
+    if os.path.exists(path):
+        path = os.path.join(path, 'instances.csv')
+        if(os.path.isfile(path)):
+            return path
+        else:
+            raise ValueError('Path does not contain instances.csv')
+    else:
+        raise ValueError('Path does not exist')
+
+class Instance:
+    '''An instance of a benchmark. The strings repeated by many instances are interned and the paths relative to the output directory
+    are rebuilt on demand, so that large result sets take little memory. network is the dictionary of the network, shared by all its instances'''
+    __slots__ = ('to_benchmarks_dir', 'benchmark_dir', 'benchmark', 'onnx', 'vnnlib', 'timeout', 'network')
+
+    def __init__(self, to_benchmarks_dir: str, benchmark_dir: str, benchmark: str, onnx: str, vnnlib: str, timeout: str, network: dict = None):
+        self.to_benchmarks_dir = sys.intern(to_benchmarks_dir)
+        self.benchmark_dir = sys.intern(benchmark_dir)
+        self.benchmark = sys.intern(benchmark)
+        self.onnx = sys.intern(onnx)
+        self.vnnlib = sys.intern(vnnlib)
+        self.timeout = sys.intern(timeout) if timeout else timeout
+        self.network = network
+
+    @property
+    def rel_path_to_onnx(self) -> str:
+        return os.path.join(self.to_benchmarks_dir, self.benchmark_dir, self.onnx)
+
+    @property
+    def rel_path_to_property(self) -> str:
+        return os.path.join(self.to_benchmarks_dir, self.benchmark_dir, self.vnnlib)
+
+    def on_disk_path(self, file: str) -> str:
+        '''Path of a file of the benchmark (e.g. self.onnx) relative to the output directory as it is on disk, with the '.gz' extension if only the compressed file exists'''
+        path = os.path.join(self.benchmark_dir, file)
+        try:
+            path = os.path.relpath(resolve_path(os.path.join(BENCHMARKS_VNNCOMP_DIR, path)), BENCHMARKS_VNNCOMP_DIR)
+        except FileNotFoundError:
+            pass
+        return os.path.join(self.to_benchmarks_dir, path)
+
+    @property
+    def rel_path_to_sidecar(self) -> str:
+        '''Path of the binary sidecar of the property written by property_sidecars.py, an empty string if it was not exported'''
+        sidecar_path = get_sidecar_path(self.benchmark_dir, self.vnnlib)
+        return os.path.join(self.to_benchmarks_dir, sidecar_path) if os.path.isdir(os.path.join(BENCHMARKS_VNNCOMP_DIR, sidecar_path)) else ''
+
+    def __repr__(self) -> str:
+        return f"Instance({self.rel_path_to_onnx!r}, {self.rel_path_to_property!r}, {self.timeout!r})"
+
+def make_network_tuple(to_benchmarks_dir: str, benchmark_dir: str, benchmark: str, onnx: str, vnnlib: str, timeout: str, network: dict = None) -> Instance:
+    '''Returns the record describing an instance, paths are relative to the output directory'''
+    return Instance(to_benchmarks_dir, benchmark_dir, benchmark, onnx, vnnlib, timeout, network)
+
+def iter_network_tuples(networks: list, outdir: str):
+    '''Yields the tuples of the networks from the instances.csv files, in the same order of the networks.
+    Each file is read once, when the first of its networks is reached, and dropped after the last one'''
+    to_benchmarks_dir = os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=outdir)
+    benchmark_networks = {}
+    last_network = {}
+    for i, net in enumerate(networks):
+        benchmark_networks.setdefault((net['architecture'], net['benchmark']), []).append(net['onnx'])
+        last_network[(net['architecture'], net['benchmark'])] = i
+    benchmark_instances = {}
+    for i, net in enumerate(networks):
+        key = (net['architecture'], net['benchmark'])
+        if key not in benchmark_instances:
+            benchmark_instances[key] = read_instances_file(get_instances_path(net), benchmark_networks[key])
+        benchmark_dir = get_benchmark_dir(net['architecture'], net['benchmark'])
+        for onnx, vnnlib, timeout in benchmark_instances[key].get(net['onnx'], []):
+            yield make_network_tuple(to_benchmarks_dir, benchmark_dir, net['benchmark'], onnx, vnnlib, timeout, net)
+        if last_network[key] == i:
+            del benchmark_instances[key]
+
+def get_network_tuples(networks: list, outdir: str) -> list:
+    '''Get all tuples for the networks from the instances.csv files, each file is read once.
+    The tuples are Instance records with the attributes 'benchmark', 'onnx', 'vnnlib', 'timeout' and the paths 'rel_path_to_onnx', 'rel_path_to_property' '''
+    return list(iter_network_tuples(networks, outdir))
+
+def iter_catalog_network_tuples(conn, networks: list, outdir: str):
+    '''Same as iter_network_tuples, but the instances are read from the catalog instead of the instances.csv files'''
+    to_benchmarks_dir = os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=outdir)
+    networks_by_id = {net['id']: net for net in networks}
+    for instance in iter_instances(conn, list(networks_by_id)):
+        yield make_network_tuple(to_benchmarks_dir, instance['benchmark_path'], instance['benchmark'], instance['onnx'], instance['vnnlib'], instance['timeout'], networks_by_id[instance['network_id']])
+
+def get_catalog_network_tuples(conn, networks: list, outdir: str) -> list:
+    '''Same as get_network_tuples, but the instances are read from the catalog instead of the instances.csv files'''
+    return list(iter_catalog_network_tuples(conn, networks, outdir))
+
+def uses_property_metrics(query: dict) -> bool:
+    '''Returns True if the query filters or sorts the instances on the complexity of their properties'''
+    return query['sort'] is not None or any(query[f'{bound}_{suffix}'] is not None for suffix in PROPERTY_FILTERS for bound in ('min', 'max'))
+
+def complete_property_metrics(network_tuples: list, property_metrics: dict, jobs: int = None) -> dict:
+    '''Adds to property_metrics, keyed by (benchmark directory, vnnlib), the complexity of the properties of the instances that are not in it yet.
+    They are parsed in parallel through the cache of vnnlib_parser.py, the properties that can not be parsed get None'''
+    missing = set((instance.benchmark_dir, instance.vnnlib) for instance in network_tuples) - set(property_metrics)
+    if missing:
+        from vnnlib_parser import compute_property_metrics # Imported here since it needs numpy
+        verbose_print(f"Parsing {len(missing)} properties to compute their complexity...")
+        paths = {os.path.join(BENCHMARKS_VNNCOMP_DIR, benchmark_dir, vnnlib): (benchmark_dir, vnnlib) for benchmark_dir, vnnlib in missing}
+        metrics = compute_property_metrics(list(paths), jobs)
+        for path, key in paths.items():
+            property_metrics[key] = metrics.get(path)
+    return property_metrics
+
+def filter_by_properties(network_tuples: list, query: dict, property_metrics: dict) -> list:
+    '''Returns the instances whose property is within the 'min_' and 'max_' bounds of the query on the property columns (e.g. 'max_disj', 'min_radius').
+    With a bound, the instances whose property complexity is unknown are removed'''
+    bounds = [(column, query[f'min_{suffix}'], query[f'max_{suffix}']) for suffix, column in PROPERTY_FILTERS.items()
+              if query[f'min_{suffix}'] is not None or query[f'max_{suffix}'] is not None]
+    if not bounds:
+        return network_tuples
+    filtered = []
+    for instance in network_tuples:
+        metrics = property_metrics.get((instance.benchmark_dir, instance.vnnlib))
+        if metrics is None:
+            continue
+        if all(metrics[column] is not None and (min_value is None or metrics[column] >= min_value) and (max_value is None or metrics[column] <= max_value)
+               for column, min_value, max_value in bounds):
+            filtered.append(instance)
+    return filtered
+
+def sort_by_property(network_tuples, sort: str, property_metrics: dict) -> list:
+    '''Returns the instances sorted by a property column, descending if it starts with '-' (e.g. '-max_radius'). The sort is stable
+    and the instances whose value is unknown go last'''
+    column, descending = sort.lstrip('-'), sort.startswith('-')
+    if column not in PROPERTY_COLUMNS:
+        raise ValueError(f"Can not sort on {column}, the columns are: {', '.join(PROPERTY_COLUMNS)}")
+    def get_value(instance):
+        metrics = property_metrics.get((instance.benchmark_dir, instance.vnnlib))
+        return metrics[column] if metrics is not None else None
+    known = [instance for instance in network_tuples if get_value(instance) is not None]
+    unknown = [instance for instance in network_tuples if get_value(instance) is None]
+    return sorted(known, key=get_value, reverse=descending) + unknown
+
+def iter_sample_instances(network_tuples, max_properties: int, seed: int = None, stratum = None):
+    '''Yields a uniform random sample of at most max_properties instances for each network (-1 keeps all of them), in the order they have in network_tuples.
+    The instances can come in any order: a reservoir for each network is filled in a single pass, so only the sampled instances are kept in memory.
+    With a stratum function (e.g. the expected result of the instance) at most max_properties instances are sampled for each stratum of each network.
+    The same seed and the same input always give the same sample'''
+    if max_properties == -1:
+        verbose_print("Keeping all instances for each network")
+        yield from network_tuples
+        return
+
+    rng = random.Random(seed)
+    reservoirs = {} # (benchmark_dir, onnx[, stratum]) -> [number of instances seen, sampled (position, instance) pairs]
+    for position, net_tuple in enumerate(network_tuples):
+        key = (net_tuple.benchmark_dir, net_tuple.onnx) if stratum is None else (net_tuple.benchmark_dir, net_tuple.onnx, stratum(net_tuple))
+        reservoir = reservoirs.get(key)
+        if reservoir is None:
+            reservoir = reservoirs[key] = [0, []]
+        reservoir[0] += 1
+        if len(reservoir[1]) < max_properties:
+            reservoir[1].append((position, net_tuple))
+        else:
+            # Replace a sampled instance with probability max_properties / seen
+            i = rng.randrange(reservoir[0])
+            if i < max_properties:
+                reservoir[1][i] = (position, net_tuple)
+    sampled = sorted((pair for _, pairs in reservoirs.values() for pair in pairs), key=lambda pair: pair[0])
+    verbose_print(f"Sampled {len(sampled)} instances from {len(reservoirs)} {'networks' if stratum is None else 'network strata'}")
+    for _, net_tuple in sampled:
+        yield net_tuple
+
+def sample_instances(network_tuples: list, max_properties: int, seed: int = None, stratum = None) -> list:
+    '''Sample the instances based on the maximum number of properties for each network, it returns a new list'''
+    return list(iter_sample_instances(network_tuples, max_properties, seed, stratum))
+
+def instance_timeout(instance, default_timeout: float) -> float:
+    '''Returns the timeout of the instance in seconds, default_timeout if it has none'''
+    return float(instance.timeout) if instance.timeout else default_timeout
+
+def instance_features(instance) -> set:
+    '''Returns what an instance covers for select_by_budget: its architecture, benchmark, network and node types'''
+    features = {('benchmark', instance.benchmark_dir), ('network', instance.benchmark_dir, instance.onnx)}
+    if instance.network is not None:
+        features.add(('architecture', instance.network['architecture']))
+        features.update(('node', node.lower()) for node in instance.network['node_types'])
+    return features
+
+def select_by_budget(network_tuples, budget: float, default_timeout: float) -> list:
+    '''Picks instances whose timeouts sum to at most budget seconds, in the order they have in network_tuples.
+    First a lazy greedy maximizes the number of architectures, benchmarks, networks and node types covered, picking the instance that covers
+    the most new features per second, then the remaining budget is filled with the cheapest instance of the network with the fewest instances picked'''
+    instances = [(instance, instance_timeout(instance, default_timeout)) for instance in network_tuples]
+    instances = [(instance, timeout) for instance, timeout in instances if timeout <= budget]
+    features = [instance_features(instance) for instance, _ in instances]
+    covered, selected = set(), set()
+
+    # Max-heap on new features per second, the gains can only decrease so a stale entry is re-evaluated when it reaches the top
+    heap = [(-len(features[i]) / max(timeout, 1e-9), i) for i, (_, timeout) in enumerate(instances)]
+    heapq.heapify(heap)
+    while heap and budget > 0:
+        _, i = heapq.heappop(heap)
+        timeout = instances[i][1]
+        if timeout > budget:
+            continue
+        gain = len(features[i] - covered)
+        if gain == 0:
+            continue
+        ratio = gain / max(timeout, 1e-9)
+        if heap and ratio < -heap[0][0]:
+            heapq.heappush(heap, (-ratio, i))
+            continue
+        selected.add(i)
+        covered |= features[i]
+        budget -= timeout
+    verbose_print(f"Coverage: {len(covered)} features with {len(selected)} instances")
+
+    # Round-robin on the networks, cheapest instances first
+    network_instances = {}
+    for i, (instance, timeout) in enumerate(instances):
+        if i not in selected:
+            network_instances.setdefault((instance.benchmark_dir, instance.onnx), []).append((timeout, i))
+    counts = Counter((instances[i][0].benchmark_dir, instances[i][0].onnx) for i in selected)
+    heap = []
+    for network, candidates in network_instances.items():
+        candidates.sort(reverse=True)
+        heap.append((counts[network], candidates[-1][0], network))
+    heapq.heapify(heap)
+    while heap:
+        count, _, network = heapq.heappop(heap)
+        candidates = network_instances[network]
+        timeout, i = candidates.pop()
+        if timeout > budget:
+            # The other instances of the network cost at least as much
+            continue
+        selected.add(i)
+        budget -= timeout
+        if candidates:
+            heapq.heappush(heap, (count + 1, candidates[-1][0], network))
+    return [instances[i][0] for i in sorted(selected)]
+
+def shard_instances(network_tuples, n_shards: int, default_timeout: float, keep_models_together: bool = False) -> list:
+    '''Splits the instances in n_shards lists balanced by the sum of their timeouts, with the longest-processing-time-first rule:
+    from the longest to the shortest, each instance goes to the shard with the smallest total so far.
+    With keep_models_together all the instances of a network are assigned together, so each network is loaded by one shard only.
+    Returns a list of (total timeout, instances) pairs, the instances of each shard keep the order they have in network_tuples'''
+    jobs = {}
+    for position, instance in enumerate(network_tuples):
+        key = (instance.benchmark_dir, instance.onnx) if keep_models_together else position
+        job = jobs.setdefault(key, [0.0, []])
+        job[0] += instance_timeout(instance, default_timeout)
+        job[1].append((position, instance))
+
+    loads = [(0.0, i) for i in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    totals = [0.0] * n_shards
+    for total, instances in sorted(jobs.values(), key=lambda job: job[0], reverse=True):
+        load, i = heapq.heappop(loads)
+        shards[i] += instances
+        totals[i] = load + total
+        heapq.heappush(loads, (totals[i], i))
+    return [(totals[i], [instance for _, instance in sorted(shards[i], key=lambda pair: pair[0])]) for i in range(n_shards)]
+
+def get_shard_file_path(output_file_path: str, shard: int) -> str:
+    '''Returns the path of a shard of the output file: 'instances.csv' becomes 'instances_1.csv' for the first shard'''
+    base, extension = (output_file_path[:-len('.csv.gz')], '.csv.gz') if output_file_path.endswith('.csv.gz') else os.path.splitext(output_file_path)
+    return f"{base}_{shard + 1}{extension}"
+
+def count_items(iterable, counts: dict, key: str):
+    '''Yields the items of iterable, counting them in counts[key]'''
+    counts[key] = 0
+    for item in iterable:
+        counts[key] += 1
+        yield item
+
+def write_instances(output_file, network_tuples, sidecars: bool = False, on_disk_paths: bool = False) -> int:
+    '''Writes the network tuples to an open text file in the format 'rel_path_to_onnx,rel_path_to_property.vnnlib,timeout(not mandatory)', one at a time.
+    With sidecars a fourth column holds the path of the binary sidecar of the property (empty if it was not exported), the timeout is then always written, even if empty.
+    With on_disk_paths the models and properties that are only there compressed get the '.gz' extension. Returns the number of lines written'''
+    n_lines = 0
+    for net_tuple in network_tuples:
+        if on_disk_paths:
+            row = [net_tuple.on_disk_path(net_tuple.onnx), net_tuple.on_disk_path(net_tuple.vnnlib)]
+        else:
+            row = [net_tuple.rel_path_to_onnx, net_tuple.rel_path_to_property]
+        if sidecars:
+            row += [net_tuple.timeout or '', net_tuple.rel_path_to_sidecar]
+        elif net_tuple.timeout:
+            row.append(net_tuple.timeout)
+        csv_line = ','.join(row).replace('\\', '/').replace('\n', '')
+        output_file.write(csv_line + '\n')
+        n_lines += 1
+    return n_lines
+
+def write_output_file(output_file_path: str, network_tuples, sidecars: bool = False, on_disk_paths: bool = False) -> int:
+    '''Writes the network tuples to the output file with write_instances, a '.gz' extension compresses the file with gzip. Returns the number of lines written'''
+    # Remove the output file if it already exists
+    if(os.path.isfile(output_file_path)):
+        verbose_print(f"Removing the existing output file {output_file_path}")
+        os.remove(output_file_path)
+
+    # if the outdir does not exist, create it (suites written concurrently can share a new outdir)
+    outdir = os.path.dirname(output_file_path)
+    if not os.path.exists(outdir):
+        verbose_print(f"Creating the output directory {outdir}")
+        os.makedirs(outdir, exist_ok=True)
+
+    # Finally write the filtered instances to the output file
+    with gzip.open(output_file_path, 'wt', newline='') if output_file_path.endswith('.gz') else open(output_file_path, 'w') as output_file:
+        return write_instances(output_file, network_tuples, sidecars, on_disk_paths)
+
+def clean_outname(outname: str, compress: bool = False) -> str:
+    '''Removes the extension and the characters that are not allowed from the name of an output file, then adds the '.csv' extension ('.csv.gz' if compress)'''
+    outname = os.path.splitext(outname[:-3] if outname.endswith('.gz') else outname)[0]
+    outname = outname.replace('/','').replace('\\','').replace('.','').replace('..','').replace(':','').replace(' ','_').replace('<','').replace('>','').replace('"','').replace('|','').replace('?','').replace('*','').strip()
+    return outname + ('.csv.gz' if compress else '.csv')
+
+def read_spec_file(file_path: str) -> list:
+    '''Reads the suites of a spec file, a JSON or YAML (requires PyYAML) list of dictionaries with the same filters of gen_instances.py,
+    the 'outname' of the suite and optionally its 'outdir', 'gzip', 'sidecars' and 'on_disk_paths'. A ValueError is raised if the file is not valid'''
+    with open(file_path) as spec_file:
+        if file_path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml # Imported here since it is only needed for YAML spec files
+            except ImportError:
+                raise ValueError(f"PyYAML is required to read {file_path}: install it with 'pip install pyyaml' or use a JSON spec file")
+            suites = yaml.safe_load(spec_file)
+        else:
+            suites = json.load(spec_file)
+    if not isinstance(suites, list):
+        raise ValueError(f"{file_path} must contain a list of suites")
+    for i, suite in enumerate(suites):
+        if not isinstance(suite, dict) or 'outname' not in suite:
+            raise ValueError(f"Suite {i} of {file_path} must be a dictionary with an 'outname'")
+        unknown = set(suite) - set(SPEC_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown keys in suite '{suite['outname']}' of {file_path}: {', '.join(sorted(unknown))}")
+    return suites
+
+def write_suites(session, suites: list, defaults: dict) -> dict:
+    '''Writes the instances of each suite to its own output file, the suites are answered from the same session and written concurrently.
+    defaults holds the filters, 'outdir', 'gzip', 'sidecars' and 'on_disk_paths' of the suites that do not set them.
+    Returns a dictionary output file path -> number of instances written, or the exception raised while writing it.
+    As with a single query, the file of a suite without instances is not written'''
+    suites = [{**defaults, **suite} for suite in suites]
+    output_file_paths = [os.path.join(os.path.abspath(suite['outdir']), clean_outname(suite['outname'], suite['gzip'])) for suite in suites]
+    duplicates = [path for path, count in Counter(output_file_paths).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"More than one suite is written to {', '.join(duplicates)}")
+
+    def write_suite(suite: dict, output_file_path: str) -> int:
+        network_tuples = iter(session.iter_instances(suite, os.path.dirname(output_file_path)))
+        first_tuple = next(network_tuples, None)
+        if first_tuple is None:
+            return 0
+        return write_output_file(output_file_path, itertools.chain([first_tuple], network_tuples), suite['sidecars'], suite['on_disk_paths'])
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = {executor.submit(write_suite, suite, path): path for suite, path in zip(suites, output_file_paths)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                results[futures[future]] = error
+    return {path: results[path] for path in output_file_paths}
+
+class BenchmarkCatalog:
+    '''Networks, instances and expected results loaded once, to answer many queries from memory.
+    A query is a dictionary with the same keys as the arguments of gen_instances.py, see normalize_query and QUERY_DEFAULTS'''
+    def __init__(self, networks: list, network_instances: dict, missing_benchmarks: set, expected_results: dict, nns_path: str = NEURAL_NETWORKS_FILE,
+                 property_metrics: dict = None):
+        self.networks = networks
+        self.network_instances = network_instances # (architecture, benchmark, onnx) -> list of (onnx, vnnlib, timeout)
+        self.missing_benchmarks = missing_benchmarks # (architecture, benchmark) without an instances.csv file
+        self.expected_results = expected_results # (benchmark, onnx, vnnlib) -> result
+        self.nns_path = os.path.abspath(nns_path)
+        self.property_metrics = property_metrics if property_metrics is not None else {} # (benchmark directory, vnnlib) -> complexity, filled on demand
+        self.stats = network_statistics(networks)
+
+    @classmethod
+    def load(cls, catalog_path: str = CATALOG_FILE, nns_path: str = NEURAL_NETWORKS_FILE, expected_results_path: str = EXPECTED_RESULTS_FILE) -> 'BenchmarkCatalog':
+        '''Loads everything from the catalog if it is up to date, otherwise from the CSV files'''
+        conn = open_catalog(catalog_path, nns_path, expected_results_path) if catalog_path else None
+        if conn is not None:
+            networks = load_networks(conn)
+            network_instances, missing_benchmarks = load_network_instances(conn)
+            expected_results = load_expected_results(conn)
+            property_metrics = load_property_metrics(conn)
+            conn.close()
+            return cls(networks, network_instances, missing_benchmarks, expected_results, nns_path, property_metrics)
+
+        networks = load_nns_file(nns_path)
+        benchmark_networks = {}
+        for net in networks:
+            benchmark_networks.setdefault((net['architecture'], net['benchmark']), []).append(net['onnx'])
+        network_instances, missing_benchmarks = {}, set()
+        for (architecture, benchmark), names in benchmark_networks.items():
+            i_path = os.path.join(BENCHMARKS_VNNCOMP_DIR, get_benchmark_dir(architecture, benchmark), 'instances.csv')
+            if not os.path.isfile(i_path):
+                missing_benchmarks.add((architecture, benchmark))
+                continue
+            for name, instances in read_instances_file(i_path, names).items():
+                network_instances[(architecture, benchmark, name)] = instances
+        return cls(networks, network_instances, missing_benchmarks, read_expected_results(expected_results_path), nns_path)
+
+    def select_networks(self, query: dict, explain: bool = False) -> list:
+        '''Returns the networks matching the filters of the query'''
+        return filter_networks(self.networks, normalize_query(query), self.stats, explain)
+
+    def instances_of(self, networks: list, outdir: str = BENCHMARKS_VNNCOMP_DIR) -> list:
+        '''Returns all the instances of the networks, in the same format of get_network_tuples'''
+        return list(self.iter_instances_of(networks, outdir))
+
+    def iter_instances_of(self, networks: list, outdir: str = BENCHMARKS_VNNCOMP_DIR):
+        '''Same as instances_of, but the instances are yielded one at a time'''
+        to_benchmarks_dir = os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=outdir)
+        for net in networks:
+            if (net['architecture'], net['benchmark']) in self.missing_benchmarks:
+                raise ValueError(f"Path does not contain instances.csv: {get_benchmark_dir(net['architecture'], net['benchmark'])}")
+            benchmark_dir = get_benchmark_dir(net['architecture'], net['benchmark'])
+            for onnx, vnnlib, timeout in self.network_instances.get((net['architecture'], net['benchmark'], net['onnx']), []):
+                yield make_network_tuple(to_benchmarks_dir, benchmark_dir, net['benchmark'], onnx, vnnlib, timeout, net)
+
+    def select_instances(self, query: dict, outdir: str = BENCHMARKS_VNNCOMP_DIR) -> list:
+        '''Returns the instances matching all the filters of the query, including the bounds on the properties, the expected 'result', the 'maxprop' sampling
+        (with 'seed' and 'stratify') and the time 'budget' in seconds (instances without a timeout count as 'default_timeout'), in the order of 'sort' if given'''
+        return list(self.iter_instances(query, outdir))
+
+    def iter_instances(self, query: dict, outdir: str = BENCHMARKS_VNNCOMP_DIR):
+        '''Same as select_instances, but the instances are yielded one at a time'''
+        query = normalize_query(query)
+        network_tuples = self.iter_instances_of(filter_networks(self.networks, query, self.stats), outdir)
+        if uses_property_metrics(query):
+            network_tuples = list(network_tuples)
+            complete_property_metrics(network_tuples, self.property_metrics)
+            network_tuples = iter(filter_by_properties(network_tuples, query, self.property_metrics))
+        network_tuples = iter_instances_by_result(network_tuples, query['result'], self.expected_results)
+        stratum = functools.partial(get_expected_result, self.expected_results) if query['stratify'] else None
+        network_tuples = iter_sample_instances(network_tuples, query['maxprop'], query['seed'], stratum)
+        if query['budget'] != -1:
+            network_tuples = iter(select_by_budget(network_tuples, query['budget'], query['default_timeout']))
+        return iter(sort_by_property(list(network_tuples), query['sort'], self.property_metrics)) if query['sort'] else network_tuples
+
+    def expected_result(self, instance: Instance):
+        '''Returns the expected result of an instance, None if it is unknown'''
+        return get_expected_result(self.expected_results, instance)
@@ -0,0 +1,104 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from catalog import BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS, EXPECTED_RESULTS_FILE, NEURAL_NETWORKS_FILE, source_fingerprint
+from query import QUERY_DEFAULTS, LIST_FILTERS, Instance, uses_property_metrics
+
+# On-disk cache of the instances selected by the queries of gen_instances.py. An entry is keyed by the normalized filters and by the
+# size and modification time of all the files the instances come from, so any change to the data makes the old entries unreachable.
+QUERY_CACHE_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, '.query_cache')
+QUERY_CACHE_SIZE = 256 # MB
+QUERY_CACHE_VERSION = 1
+
+
+def get_all_source_files(nns_path: str = NEURAL_NETWORKS_FILE, expected_results_path: str = EXPECTED_RESULTS_FILE) -> list:
+    '''Returns the networks file, the expected results file and the instances.csv file of every benchmark directory, without reading any of them'''
+    source_files = [nns_path, expected_results_path]
+    for architecture_dir in sorted(ARCHITECTURE_DIRS.values()):
+        path = os.path.join(BENCHMARKS_VNNCOMP_DIR, architecture_dir)
+        if os.path.isdir(path):
+            source_files += [os.path.join(path, benchmark, 'instances.csv') for benchmark in sorted(os.listdir(path)) if os.path.isdir(os.path.join(path, benchmark))]
+    return source_files
+
+def get_query_cache_key(query: dict, nns_path: str = NEURAL_NETWORKS_FILE, expected_results_path: str = EXPECTED_RESULTS_FILE):
+    '''Returns the cache key of a normalized query, None if the query can not be cached because it samples the instances without a seed,
+    or because it filters or sorts on the complexity of the properties: the key does not cover the properties nor the catalog they are read from'''
+    if (query['maxprop'] != -1 and query['seed'] is None) or uses_property_metrics(query):
+        return None
+    filters = {key: sorted(query[key]) if key in LIST_FILTERS and query[key] else query[key] for key in QUERY_DEFAULTS}
+    payload = json.dumps({'version': QUERY_CACHE_VERSION, 'filters': filters, 'nns_path': os.path.abspath(nns_path),
+                          'fingerprint': source_fingerprint(get_all_source_files(nns_path, expected_results_path))}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def read_cached_instances(key: str, outdir: str, cache_dir: str = QUERY_CACHE_DIR):
+    '''Returns the cached instances of the query with paths relative to outdir, None if they are not in the cache'''
+    path = os.path.join(cache_dir, f'{key}.csv')
+    try:
+        with open(path, newline='') as cache_file:
+            to_benchmarks_dir = os.path.relpath(BENCHMARKS_VNNCOMP_DIR, start=outdir)
+            instances = [Instance(to_benchmarks_dir, benchmark_dir, benchmark, onnx, vnnlib, timeout) for benchmark_dir, benchmark, onnx, vnnlib, timeout in csv.reader(cache_file)]
+    except FileNotFoundError:
+        return None
+    # The modification time of an entry is the time it was last used
+    os.utime(path)
+    return instances
+
+def cache_instances(network_tuples, key: str, cache_dir: str = QUERY_CACHE_DIR, max_size: float = QUERY_CACHE_SIZE):
+    '''Yields the instances while writing them to the cache, the entry is added only once all of them were yielded.
+    The least recently used entries are then removed until the cache takes at most max_size MB'''
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.csv')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w', newline='') as cache_file:
+            writer = csv.writer(cache_file, lineterminator='\n')
+            for instance in network_tuples:
+                writer.writerow([instance.benchmark_dir, instance.benchmark, instance.onnx, instance.vnnlib, instance.timeout or ''])
+                yield instance
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict_cache_entries(cache_dir, max_size)
+
+def evict_cache_entries(cache_dir: str = QUERY_CACHE_DIR, max_size: float = QUERY_CACHE_SIZE) -> int:
+    '''Removes the least recently used entries until the cache takes at most max_size MB, returns the number of removed entries'''
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.csv'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total_size <= max_size * 2**20:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+        removed += 1
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows or clears the cache of the instances selected by the queries of gen_instances.py")
+    parser.add_argument('--cache_dir', '-cd', type=str, required=False, default=QUERY_CACHE_DIR, help="Path to the cache directory, default is '.query_cache' in the repository root")
+    parser.add_argument('--clear', action='store_true', help="Remove all the entries of the cache")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"The cache {args.cache_dir} is empty")
+        return
+    if args.clear:
+        removed = evict_cache_entries(args.cache_dir, 0)
+        print(f"Removed {removed} entries from {args.cache_dir}")
+        return
+    entries = [entry.stat().st_size for entry in os.scandir(args.cache_dir) if entry.name.endswith('.csv')]
+    print(f"The cache {args.cache_dir} has {len(entries)} entries, {sum(entries) / 2**20:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules of the repository are flat scripts in its root, as for the scripts in perf/
+BENCHMARKS_VNNCOMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BENCHMARKS_VNNCOMP_DIR)
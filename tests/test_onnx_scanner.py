@@ -0,0 +1,69 @@
+import gzip
+import pytest
+onnx = pytest.importorskip('onnx')
+np = pytest.importorskip('numpy')
+from onnx import TensorProto, helper, numpy_helper
+from benchmark_io import open_benchmark_file
+from onnx_scanner import read_skeleton, scan_onnx
+
+
+def make_model() -> 'onnx.ModelProto':
+    '''Returns a small model with a symbolic batch dimension, initializers and an If whose branches have node types that are not in the main graph'''
+    then_graph = helper.make_graph([helper.make_node('Relu', ['hidden'], ['then_out'])], 'then', [],
+                                   [helper.make_tensor_value_info('then_out', TensorProto.FLOAT, ['batch', 4])])
+    else_graph = helper.make_graph([helper.make_node('Sigmoid', ['hidden'], ['else_out'])], 'else', [],
+                                   [helper.make_tensor_value_info('else_out', TensorProto.FLOAT, ['batch', 4])])
+    nodes = [
+        helper.make_node('Gemm', ['x', 'weight', 'bias'], ['hidden']),
+        helper.make_node('If', ['flag'], ['y'], then_branch=then_graph, else_branch=else_graph),
+    ]
+    initializers = [numpy_helper.from_array(np.ones((3, 4), dtype=np.float32), 'weight'), numpy_helper.from_array(np.zeros(4, dtype=np.float32), 'bias')]
+    graph = helper.make_graph(nodes, 'test', [helper.make_tensor_value_info('x', TensorProto.FLOAT, ['batch', 3]), helper.make_tensor_value_info('flag', TensorProto.BOOL, [])],
+                              [helper.make_tensor_value_info('y', TensorProto.FLOAT, ['batch', 4])], initializers)
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+
+def get_node_types(graph) -> set:
+    '''Returns the node types of a graph loaded with onnx, including the ones of its subgraphs'''
+    node_types = set()
+    for node in graph.node:
+        node_types.add(node.op_type)
+        for attribute in node.attribute:
+            for subgraph in [attribute.g] if attribute.HasField('g') else list(attribute.graphs):
+                node_types |= get_node_types(subgraph)
+    return node_types
+
+def get_value_infos(value_infos, initializer_names: set = frozenset()) -> list:
+    '''Returns the name, element type and shape of the value infos loaded with onnx, as scan_onnx does'''
+    return [{'name': value_info.name, 'elem_type': value_info.type.tensor_type.elem_type,
+             'shape': [dim.dim_value if dim.HasField('dim_value') else dim.dim_param if dim.HasField('dim_param') else None for dim in value_info.type.tensor_type.shape.dim]}
+            for value_info in value_infos if value_info.name not in initializer_names]
+
+
+@pytest.fixture(params=['.onnx', '.onnx.gz'])
+def model_path(request, tmp_path):
+    path = tmp_path / f'model{request.param}'
+    data = make_model().SerializeToString()
+    with (gzip.open(path, 'wb') if request.param.endswith('.gz') else open(path, 'wb')) as model_file:
+        model_file.write(data)
+    return str(path)
+
+def load_model(path: str) -> 'onnx.ModelProto':
+    with open_benchmark_file(path, 'rb') as model_file:
+        return onnx.load(model_file)
+
+def test_scan_matches_onnx_load(model_path):
+    loaded = load_model(model_path)
+    scanned = scan_onnx(model_path)
+    assert scanned['node_types'] == sorted(get_node_types(loaded.graph)) == ['Gemm', 'If', 'Relu', 'Sigmoid']
+    initializer_names = set(initializer.name for initializer in loaded.graph.initializer)
+    assert scanned['inputs'] == get_value_infos(loaded.graph.input, initializer_names)
+    assert scanned['outputs'] == get_value_infos(loaded.graph.output)
+    assert scanned['initializers'] == [{'name': initializer.name, 'data_type': initializer.data_type, 'dims': list(initializer.dims)} for initializer in loaded.graph.initializer]
+    assert scanned['n_params'] == sum(numpy_helper.to_array(initializer).size for initializer in loaded.graph.initializer)
+
+def test_skeleton_keeps_the_structure_without_the_weights(model_path):
+    skeleton = onnx.load_from_string(read_skeleton(model_path, max_tensor_size=0))
+    loaded = load_model(model_path)
+    assert get_node_types(skeleton.graph) == get_node_types(loaded.graph)
+    assert [(initializer.name, list(initializer.dims)) for initializer in skeleton.graph.initializer] == [(initializer.name, list(initializer.dims)) for initializer in loaded.graph.initializer]
+    assert all(len(initializer.raw_data) == 0 for initializer in skeleton.graph.initializer)
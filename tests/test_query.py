@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+import pytest
+from query import Instance, instance_timeout, iter_sample_instances, select_by_budget, shard_instances
+
+
+def make_instances(n_networks: int, n_properties: int, timeout: str = '60') -> list:
+    '''Returns n_properties instances for each of n_networks networks, interleaved as in an instances.csv shared by the networks'''
+    return [Instance('..', 'Benchmarks_fc/test', 'test', f'onnx/net_{net}.onnx', f'vnnlib/prop_{prop}.vnnlib', timeout)
+            for prop in range(n_properties) for net in range(n_networks)]
+
+def get_names(instances) -> list:
+    return [(instance.onnx, instance.vnnlib) for instance in instances]
+
+
+def test_sample_is_reproducible_with_a_seed():
+    instances = make_instances(5, 40)
+    first = get_names(iter_sample_instances(iter(instances), 3, seed=7))
+    assert first == get_names(iter_sample_instances(iter(instances), 3, seed=7))
+    assert first != get_names(iter_sample_instances(iter(instances), 3, seed=8))
+
+def test_sample_keeps_at_most_maxprop_instances_per_network():
+    # A network with fewer instances than maxprop keeps all of them
+    instances = make_instances(5, 40) + [Instance('..', 'Benchmarks_fc/test', 'test', 'onnx/small.onnx', f'vnnlib/prop_{prop}.vnnlib', '60') for prop in range(2)]
+    sampled = list(iter_sample_instances(iter(instances), 4, seed=1))
+    assert Counter(instance.onnx for instance in sampled) == {**{f'onnx/net_{net}.onnx': 4 for net in range(5)}, 'onnx/small.onnx': 2}
+    # The sample keeps the order of the input
+    positions = {name: i for i, name in enumerate(get_names(instances))}
+    assert [positions[name] for name in get_names(sampled)] == sorted(positions[name] for name in get_names(sampled))
+
+def test_sample_keeps_at_most_maxprop_instances_per_stratum():
+    instances = make_instances(3, 30)
+    sampled = list(iter_sample_instances(iter(instances), 2, seed=3, stratum=lambda instance: int(instance.vnnlib[len('vnnlib/prop_'):-len('.vnnlib')]) % 2))
+    assert Counter(instance.onnx for instance in sampled) == {f'onnx/net_{net}.onnx': 4 for net in range(3)}
+
+def test_sample_without_maxprop_keeps_all_instances():
+    instances = make_instances(2, 5)
+    assert get_names(iter_sample_instances(iter(instances), -1, seed=1)) == get_names(instances)
+
+def make_random_instances(n_networks: int, n_properties: int, seed: int) -> list:
+    '''Returns instances with random timeouts (some missing) of networks with random node types'''
+    rng = random.Random(seed)
+    networks = [{'architecture': rng.choice(['fullyconnected', 'convolutional']), 'node_types': rng.sample(['gemm', 'relu', 'conv', 'add', 'sigmoid'], 2)}
+                for _ in range(n_networks)]
+    return [Instance('..', f'Benchmarks_fc/bench_{net % 3}', f'bench_{net % 3}', f'onnx/net_{net}.onnx', f'vnnlib/prop_{prop}.vnnlib',
+                     rng.choice([None, str(rng.randint(1, 300))]), networks[net])
+            for net in range(n_networks) for prop in range(n_properties)]
+
+@pytest.mark.parametrize('budget', [0, 1, 50, 299.5, 1000, 5000, 10**6])
+def test_budget_is_never_exceeded(budget):
+    for seed in range(5):
+        instances = make_random_instances(8, 10, seed)
+        selected = select_by_budget(iter(instances), budget, default_timeout=120)
+        assert sum(instance_timeout(instance, 120) for instance in selected) <= budget
+        assert len(set(map(id, selected))) == len(selected)
+
+def test_budget_picks_everything_that_fits():
+    instances = make_random_instances(4, 5, seed=0)
+    total = sum(instance_timeout(instance, 120) for instance in instances)
+    assert len(select_by_budget(iter(instances), total, default_timeout=120)) == len(instances)
+
+@pytest.mark.parametrize('keep_models_together', [False, True])
+@pytest.mark.parametrize('n_shards', [1, 2, 3, 7])
+def test_shards_are_within_the_largest_job_of_the_lower_bound(n_shards, keep_models_together):
+    for seed in range(5):
+        instances = make_random_instances(6, 8, seed)
+        shards = shard_instances(iter(instances), n_shards, 120, keep_models_together)
+        assert len(shards) == n_shards
+        jobs = Counter()
+        for instance in instances:
+            jobs[(instance.benchmark_dir, instance.onnx) if keep_models_together else id(instance)] += instance_timeout(instance, 120)
+        lower_bound = sum(jobs.values()) / n_shards
+        for total, shard in shards:
+            assert total == pytest.approx(sum(instance_timeout(instance, 120) for instance in shard))
+            assert total <= lower_bound + max(jobs.values()) + 1e-9
+
+def test_shards_keep_every_instance_once_and_in_order():
+    instances = make_random_instances(6, 8, seed=0)
+    positions = {id(instance): i for i, instance in enumerate(instances)}
+    shards = shard_instances(iter(instances), 4, 120, keep_models_together=True)
+    assert sorted(positions[id(instance)] for _, shard in shards for instance in shard) == list(range(len(instances)))
+    for _, shard in shards:
+        assert [positions[id(instance)] for instance in shard] == sorted(positions[id(instance)] for instance in shard)
+    # Each network is in a single shard
+    shard_of = {}
+    for i, (_, shard) in enumerate(shards):
+        for instance in shard:
+            assert shard_of.setdefault(instance.onnx, i) == i
@@ -0,0 +1,326 @@
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import re
+import numpy as np
+from benchmark_io import exists, get_size, open_benchmark_file, resolve_path
+from catalog import BENCHMARKS_VNNCOMP_DIR, ARCHITECTURE_DIRS
+
+# Streaming parser of the VNN-LIB properties (1.0, with 'declare-const', and 2.0, with tensors declared in 'declare-network').
+# A property is compiled to NumPy arrays in disjunctive normal form: it holds on a network if no input of any disjunct's box (and input constraints)
+# makes the outputs satisfy all the constraints of that disjunct. The compiled arrays are cached by the hash of the file.
+VNNLIB_CACHE_DIR = os.path.join(BENCHMARKS_VNNCOMP_DIR, '.vnnlib_cache')
+# Bump this every time the compiled arrays change, old cache entries are then ignored
+VNNLIB_CACHE_VERSION = 2
+CHUNK_SIZE = 2**20
+TOKEN_RE = re.compile(r';[^\n]*|[()]|[^\s();]+')
+TOKEN_DELIMITERS = ' \t\r\n()'
+COMPARISONS = {'<=', '<', '>=', '>', '='}
+
+
+def find_token_boundary(buffer: str) -> int:
+    '''Returns the position after the last delimiter (space or parenthesis) of the buffer that is not in a comment, so that the text before it can be tokenized
+    without splitting a token or a comment between two chunks'''
+    cut = max(buffer.rfind(delimiter) for delimiter in TOKEN_DELIMITERS) + 1
+    # A ';' always starts a comment, that goes on until the end of the line
+    comment = buffer.find(';', buffer.rfind('\n', 0, cut) + 1, cut)
+    return comment if comment != -1 else cut
+
+def iter_expressions(stream, chunk_size: int = CHUNK_SIZE):
+    '''Yields the top-level S-expressions of the stream as nested lists of strings, one at a time, reading chunk_size characters at a time.
+    Comments are dropped and an index or a shape with spaces (e.g. '[1, 5]') is joined in a single token'''
+    stack, current, pending, buffer = [], None, None, ''
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        cut = find_token_boundary(buffer) if chunk else len(buffer)
+        text, buffer = buffer[:cut], buffer[cut:]
+        for token in TOKEN_RE.findall(text):
+            if token[0] == ';':
+                continue
+            if pending is not None:
+                token, pending = pending + token, None
+            if '[' in token and ']' not in token:
+                pending = token
+                continue
+            if token == '(':
+                stack.append(current)
+                current = []
+            elif token == ')':
+                if not stack:
+                    raise ValueError('Unbalanced parentheses')
+                expression, current = current, stack.pop()
+                if current is None:
+                    yield expression
+                else:
+                    current.append(expression)
+            elif current is not None:
+                current.append(token)
+        if not chunk:
+            break
+    if stack:
+        raise ValueError('Unbalanced parentheses')
+
+def get_variable(name: str, variables: dict):
+    '''Returns the (kind, index) of a variable, kind is 'X' for the inputs and 'Y' for the outputs, index is its position in the flattened inputs or outputs.
+    Names like 'X[0,3]' index a tensor declared in a VNN-LIB 2.0 'declare-network', None if the name is not a variable'''
+    variable = variables['names'].get(name)
+    if variable is None and '[' in name:
+        tensor = variables['tensors'].get(name[:name.index('[')])
+        if tensor is not None:
+            kind, offset, shape = tensor
+            indices = [int(index) for index in name[name.index('[') + 1:name.rindex(']')].split(',')]
+            flat = 0
+            for index, dim in zip(indices, shape if len(indices) == len(shape) else [None]):
+                flat = flat * dim + index if dim is not None else index
+            variable = variables['names'][name] = (kind, offset + flat)
+    return variable
+
+def get_linear_term(expression, variables: dict) -> tuple:
+    '''Returns a linear term as (coefficients by variable, constant)'''
+    if isinstance(expression, str):
+        variable = get_variable(expression, variables)
+        return ({variable: 1.0}, 0.0) if variable is not None else ({}, float(expression))
+    operator, *operands = expression
+    terms = [get_linear_term(operand, variables) for operand in operands]
+    if operator == '+' or (operator == '-' and len(terms) > 1):
+        coefficients, constant = dict(terms[0][0]), terms[0][1]
+        sign = 1.0 if operator == '+' else -1.0
+        for term_coefficients, term_constant in terms[1:]:
+            for variable, coefficient in term_coefficients.items():
+                coefficients[variable] = coefficients.get(variable, 0.0) + sign * coefficient
+            constant += sign * term_constant
+        return coefficients, constant
+    if operator == '-':
+        return {variable: -coefficient for variable, coefficient in terms[0][0].items()}, -terms[0][1]
+    if operator == '*':
+        coefficients, constant = {}, 1.0
+        for term_coefficients, term_constant in terms:
+            if term_coefficients and coefficients:
+                raise ValueError('Only linear constraints are supported')
+            if term_coefficients:
+                coefficients = {variable: coefficient * constant for variable, coefficient in term_coefficients.items()}
+                constant = 0.0
+            else:
+                coefficients = {variable: coefficient * term_constant for variable, coefficient in coefficients.items()}
+                constant *= term_constant
+        return coefficients, constant
+    raise ValueError(f'Unsupported operator {operator}')
+
+def get_atoms(expression, variables: dict) -> list:
+    '''Returns a comparison as a list of (coefficients by variable, right-hand side) meaning sum(coefficient * variable) <= right-hand side'''
+    operator, left, right = expression
+    left_coefficients, left_constant = get_linear_term(left, variables)
+    right_coefficients, right_constant = get_linear_term(right, variables)
+    coefficients = dict(left_coefficients)
+    for variable, coefficient in right_coefficients.items():
+        coefficients[variable] = coefficients.get(variable, 0.0) - coefficient
+    atom = (coefficients, right_constant - left_constant)
+    negated = ({variable: -coefficient for variable, coefficient in coefficients.items()}, left_constant - right_constant)
+    # Strict comparisons are treated as non-strict ones
+    return [atom] if operator in ('<=', '<') else [negated] if operator in ('>=', '>') else [atom, negated]
+
+def to_dnf(expression, variables: dict) -> list:
+    '''Returns a boolean expression in disjunctive normal form, a list of disjuncts that are lists of atoms'''
+    operator = expression[0]
+    if operator in COMPARISONS:
+        return [get_atoms(expression, variables)]
+    if operator == 'or':
+        return [disjunct for operand in expression[1:] for disjunct in to_dnf(operand, variables)]
+    if operator == 'and':
+        disjuncts = [[]]
+        for operand in expression[1:]:
+            disjuncts = [disjunct + operand_disjunct for disjunct in disjuncts for operand_disjunct in to_dnf(operand, variables)]
+        return disjuncts
+    raise ValueError(f'Unsupported operator {operator}')
+
+def declare_network(expression: list, variables: dict) -> None:
+    '''Adds the tensors of a VNN-LIB 2.0 (declare-network name (declare-input X type [shape]) (declare-output Y type [shape]) ...) to the variables'''
+    for declaration in expression[2:]:
+        if not isinstance(declaration, list) or declaration[0] not in ('declare-input', 'declare-output'):
+            continue
+        kind = 'X' if declaration[0] == 'declare-input' else 'Y'
+        shape = [int(dim) for dim in declaration[-1].strip('[]').split(',') if dim] if declaration[-1].startswith('[') else []
+        size = int(np.prod(shape)) if shape else 1
+        variables['tensors'][declaration[1]] = (kind, variables['sizes'][kind], shape)
+        if not shape:
+            variables['names'][declaration[1]] = (kind, variables['sizes'][kind])
+        variables['sizes'][kind] += size
+
+def compile_property(common: list, alternatives: list, n_inputs: int, n_outputs: int) -> dict:
+    '''Returns the arrays of a property from the atoms of all disjuncts (common) and the atoms of each disjunct (alternatives), see parse_vnnlib'''
+    lower, upper, input_rows, output_rows = [], [], [], []
+    base = None
+    for atoms in [common] + alternatives:
+        disjunct_lower = np.full(n_inputs, -np.inf) if base is None else base[0].copy()
+        disjunct_upper = np.full(n_inputs, np.inf) if base is None else base[1].copy()
+        disjunct_input_rows, disjunct_output_rows = ([], []) if base is None else (list(base[2]), list(base[3]))
+        # The atoms of all disjuncts are merged into each disjunct, so a contradictory common atom makes every disjunct infeasible
+        feasible = True if base is None else base[4]
+        for coefficients, rhs in atoms:
+            kinds = set(kind for kind, _ in coefficients)
+            if not kinds:
+                feasible = feasible and 0.0 <= rhs
+            elif kinds == {'X'} and len(coefficients) == 1:
+                ((_, index), coefficient), = coefficients.items()
+                if coefficient > 0:
+                    disjunct_upper[index] = min(disjunct_upper[index], rhs / coefficient)
+                elif coefficient < 0:
+                    disjunct_lower[index] = max(disjunct_lower[index], rhs / coefficient)
+            elif len(kinds) > 1:
+                raise ValueError('Constraints mixing inputs and outputs are not supported')
+            else:
+                (disjunct_input_rows if kinds == {'X'} else disjunct_output_rows).append((coefficients, rhs))
+        if base is None:
+            base = (disjunct_lower, disjunct_upper, disjunct_input_rows, disjunct_output_rows, feasible)
+            continue
+        if feasible:
+            lower.append(disjunct_lower)
+            upper.append(disjunct_upper)
+            input_rows.append(disjunct_input_rows)
+            output_rows.append(disjunct_output_rows)
+
+    property_arrays = {'lower': np.array(lower).reshape(len(lower), n_inputs), 'upper': np.array(upper).reshape(len(upper), n_inputs)}
+    for prefix, rows_by_disjunct, size in [('in', input_rows, n_inputs), ('out', output_rows, n_outputs)]:
+        n_rows = sum(len(rows) for rows in rows_by_disjunct)
+        matrix, rhs = np.zeros((n_rows, size)), np.zeros(n_rows)
+        row = 0
+        for rows in rows_by_disjunct:
+            for coefficients, constant in rows:
+                for (_, index), coefficient in coefficients.items():
+                    matrix[row, index] += coefficient
+                rhs[row] = constant
+                row += 1
+        property_arrays[f'{prefix}_mat'], property_arrays[f'{prefix}_rhs'] = matrix, rhs
+        property_arrays[f'{prefix}_offsets'] = np.cumsum([0] + [len(rows) for rows in rows_by_disjunct])
+    return property_arrays
+
+def parse_vnnlib_stream(stream) -> dict:
+    '''Parses a VNN-LIB property from a text stream, see parse_vnnlib'''
+    variables = {'names': {}, 'tensors': {}, 'sizes': {'X': 0, 'Y': 0}}
+    declared = {'X': [], 'Y': []}
+    common, alternatives = [], [[]]
+    for expression in iter_expressions(stream):
+        command = expression[0]
+        if command == 'declare-const':
+            name = expression[1]
+            if name[0] not in declared:
+                raise ValueError(f'Variable {name} is neither an input (X_) nor an output (Y_)')
+            declared[name[0]].append((int(name.rsplit('_', 1)[-1]), name))
+        elif command == 'declare-network':
+            declare_network(expression, variables)
+        elif command == 'assert':
+            if declared['X'] or declared['Y']:
+                # VNN-LIB 1.0: the inputs and outputs are numbered by the suffix of their name
+                for kind, names in declared.items():
+                    for index, (_, name) in enumerate(sorted(names), start=variables['sizes'][kind]):
+                        variables['names'][name] = (kind, index)
+                    variables['sizes'][kind] += len(names)
+                    names.clear()
+            disjuncts = to_dnf(expression[1], variables)
+            if len(disjuncts) == 1:
+                common += disjuncts[0]
+            else:
+                alternatives = [alternative + disjunct for alternative in alternatives for disjunct in disjuncts]
+    return compile_property(common, alternatives, variables['sizes']['X'], variables['sizes']['Y'])
+
+def parse_vnnlib(path: str) -> dict:
+    '''Parses a VNN-LIB property ('.vnnlib' or '.vnnlib.gz'), returns a dictionary of NumPy arrays for its D disjuncts:
+    'lower' and 'upper' (D x inputs) are the input box of each disjunct, 'in_mat' and 'in_rhs' the other input constraints (in_mat @ x <= in_rhs)
+    and 'out_mat' and 'out_rhs' the output constraints (out_mat @ y <= out_rhs). The rows of disjunct d are in_offsets[d]:in_offsets[d + 1]
+    (out_offsets for the outputs). The property is violated if an input of a disjunct makes the outputs satisfy all its output constraints'''
+    with open_benchmark_file(path, 'rt') as stream:
+        return parse_vnnlib_stream(stream)
+
+def iter_disjuncts(property_arrays: dict):
+    '''Yields (lower, upper, in_mat, in_rhs, out_mat, out_rhs) for each disjunct of a parsed property'''
+    for d in range(len(property_arrays['lower'])):
+        in_rows = slice(property_arrays['in_offsets'][d], property_arrays['in_offsets'][d + 1])
+        out_rows = slice(property_arrays['out_offsets'][d], property_arrays['out_offsets'][d + 1])
+        yield (property_arrays['lower'][d], property_arrays['upper'][d], property_arrays['in_mat'][in_rows], property_arrays['in_rhs'][in_rows],
+               property_arrays['out_mat'][out_rows], property_arrays['out_rhs'][out_rows])
+
+def hash_file(path: str) -> str:
+    '''Returns the sha1 of the content of the file'''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as property_file:
+        for chunk in iter(lambda: property_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_vnnlib(path: str, cache_dir: str = VNNLIB_CACHE_DIR, use_cache: bool = True) -> dict:
+    '''Returns the arrays of a property (see parse_vnnlib), read from the cache if the same file content was already parsed.
+    The cache entries are uncompressed '.npz' files named after the hash of the file, written atomically'''
+    if not use_cache:
+        return parse_vnnlib(path)
+    cache_path = os.path.join(cache_dir, f'{hash_file(resolve_path(path))}_v{VNNLIB_CACHE_VERSION}.npz')
+    try:
+        with np.load(cache_path) as cached:
+            return dict(cached)
+    except (FileNotFoundError, ValueError, OSError):
+        pass
+    property_arrays = parse_vnnlib(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as cache_file:
+        np.savez(cache_file, **property_arrays)
+    os.replace(tmp_path, cache_path)
+    return property_arrays
+
+def get_property_metrics(property_arrays: dict) -> dict:
+    '''Returns the complexity of a parsed property: its number of inputs ('n_inputs'), of disjuncts ('n_disjuncts') and of output constraints ('n_constraints'),
+    the log of the volume of its largest input box ('log_volume', over the inputs that are not fixed) and its largest half-width ('max_radius').
+    The last two are None for a property without disjuncts and inf if an input is unbounded'''
+    n_disjuncts, n_inputs = property_arrays['lower'].shape
+    metrics = {'n_inputs': n_inputs, 'n_disjuncts': n_disjuncts, 'n_constraints': len(property_arrays['out_rhs']), 'log_volume': None, 'max_radius': None}
+    if n_disjuncts > 0:
+        widths = property_arrays['upper'] - property_arrays['lower']
+        metrics['log_volume'] = float(np.max(np.sum(np.log(np.where(widths > 0, widths, 1.0)), axis=1)))
+        metrics['max_radius'] = float(np.max(widths)) / 2 if n_inputs > 0 else 0.0
+    return metrics
+
+def read_property_metrics(path: str) -> dict:
+    '''Returns the complexity of a property file (see get_property_metrics), parsed through the cache'''
+    return get_property_metrics(load_vnnlib(path))
+
+def compute_property_metrics(paths: list, jobs: int = None) -> dict:
+    '''Computes the complexity of the properties in a pool of jobs processes, the largest files first.
+    Returns the metrics of each path, the properties that are missing or could not be parsed are reported and left out'''
+    paths = sorted(set(paths), key=lambda path: get_size(path) if exists(path) else 0, reverse=True)
+    metrics, missing = {}, 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(read_property_metrics, path): path for path in paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                metrics[futures[future]] = future.result()
+            except FileNotFoundError:
+                missing += 1
+            except Exception as error:
+                print(f"Could not parse {futures[future]}: {type(error).__name__}: {error}")
+    if missing > 0:
+        print(f"{missing} properties were not found, are the submodules checked out?")
+    return metrics
+
+def find_properties(benchmarks_dir: str = BENCHMARKS_VNNCOMP_DIR) -> list:
+    '''Returns the paths of all the properties (.vnnlib and .vnnlib.gz) in the benchmark directories, sorted'''
+    paths = []
+    for architecture_dir in sorted(ARCHITECTURE_DIRS.values()):
+        for root, _, files in os.walk(os.path.join(benchmarks_dir, architecture_dir)):
+            paths += [os.path.join(root, file_name) for file_name in files if file_name.endswith(('.vnnlib', '.vnnlib.gz'))]
+    return sorted(paths)
+
+def main():
+    parser = argparse.ArgumentParser(description="Parses VNN-LIB properties (.vnnlib or .vnnlib.gz) and prints their number of inputs, outputs and disjuncts, the compiled arrays are cached in '.vnnlib_cache'")
+    parser.add_argument('properties', nargs='+', help="Paths of the properties")
+    parser.add_argument('--cache_dir', '-cd', type=str, required=False, default=VNNLIB_CACHE_DIR, help="Path to the cache of the compiled properties, default is '.vnnlib_cache' in the repository root")
+    parser.add_argument('--no_cache', '-nc', action='store_true', help="Flag to neither read nor write the cache")
+    args = parser.parse_args()
+    for path in args.properties:
+        property_arrays = load_vnnlib(path, args.cache_dir, not args.no_cache)
+        n_disjuncts, n_inputs = property_arrays['lower'].shape
+        print(f"{path}: {n_inputs} inputs, {property_arrays['out_mat'].shape[1]} outputs, {n_disjuncts} disjuncts, "
+              f"{len(property_arrays['in_rhs'])} input and {len(property_arrays['out_rhs'])} output constraints")
+
+if __name__ == '__main__':
+    main()